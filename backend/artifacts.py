@@ -0,0 +1,202 @@
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+import excel_export
+import storage
+from projection import NON_TEACHING_SLOTS
+
+logger = logging.getLogger('timetable_api')
+
+# Threads running post-save artifact builds; each Excel build also uses the exporter's own pool
+ARTIFACT_WORKERS = int(os.getenv('ARTIFACT_WORKERS', '2'))
+
+# Artifacts prepared for every saved run. Per-entity views need no entry here:
+# they are stored pre-rendered alongside the run when it is saved.
+ARTIFACTS = ("excel", "summary")
+
+TEACHING_SLOTS_PER_WEEK = len(excel_export.DAYS) * len(
+    [slot for slot in excel_export.SLOTS if slot not in NON_TEACHING_SLOTS]
+)
+
+
+def summarize_run(backend: storage.TimetableStorage, schema_name: str) -> Dict:
+    """
+    Weekly load of every class, teacher and venue in a run, from the stored free hours
+    """
+    summary = {}
+    for key, table in [
+        ("classes", "class_timetables"),
+        ("teachers", "teacher_timetables"),
+        ("venues", "venue_timetables")
+    ]:
+        hours = []
+        for row in backend.iter_timetables(schema_name, table):
+            free_hours = row['free_hours'] or {}
+            if isinstance(free_hours, (str, bytes, bytearray)):
+                free_hours = json.loads(free_hours)
+            hours.append(TEACHING_SLOTS_PER_WEEK - sum(len(slots) for slots in free_hours.values()))
+
+        summary[key] = {
+            "count": len(hours),
+            "scheduled_hours": sum(hours),
+            "min_hours": min(hours, default=0),
+            "max_hours": max(hours, default=0),
+            "avg_hours": round(sum(hours) / len(hours), 2) if hours else 0.0,
+            "utilization": round(sum(hours) / (len(hours) * TEACHING_SLOTS_PER_WEEK), 4) if hours else 0.0
+        }
+    return summary
+
+
+class ArtifactPipeline:
+    """
+    Builds the artifacts of a newly saved run in the background, so the first
+    download or summary request finds them ready, and tracks their status
+    """
+    def __init__(self, backend: storage.TimetableStorage, cache_dir: str = excel_export.EXPORT_CACHE_DIR,
+                 workers: int = ARTIFACT_WORKERS):
+        self.backend = backend
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='artifacts')
+        self._lock = threading.Lock()
+        self._jobs: Dict[Tuple[str, str], Dict] = {}
+
+    def summary_path(self, schema_name: str) -> str:
+        return os.path.join(self.cache_dir, f"{storage.validate_run_id(schema_name)}.summary.json")
+
+    def ready(self, schema_name: str, artifact: str) -> bool:
+        if artifact == "excel":
+            return excel_export.get_exporter().cached(schema_name)
+        return os.path.exists(self.summary_path(schema_name))
+
+    def _build(self, schema_name: str, artifact: str):
+        if artifact == "excel":
+            excel_export.get_exporter().archive(schema_name)
+        else:
+            self._write_summary(schema_name)
+
+    def _write_summary(self, schema_name: str) -> Dict:
+        summary = summarize_run(self.backend, schema_name)
+        with tempfile.NamedTemporaryFile('w', dir=self.cache_dir, suffix='.tmp', delete=False) as f:
+            json.dump(summary, f)
+        os.replace(f.name, self.summary_path(schema_name))
+        return summary
+
+    def _set(self, schema_name: str, artifact: str, **fields):
+        with self._lock:
+            self._jobs.setdefault((schema_name, artifact), {}).update(fields)
+
+    def _run(self, schema_name: str, artifact: str):
+        started = time.perf_counter()
+        self._set(schema_name, artifact, status="building")
+        try:
+            self._build(schema_name, artifact)
+            self._set(schema_name, artifact, status="ready", seconds=round(time.perf_counter() - started, 3))
+            logger.info(f"Built {artifact} artifact for {schema_name}")
+        except Exception as e:
+            self._set(schema_name, artifact, status="failed", error=str(e))
+            logger.error(f"Building {artifact} artifact for {schema_name} failed: {e}")
+
+    def schedule(self, schema_name: str):
+        """
+        Queue every artifact of a run that is not already on disk
+        """
+        for artifact in ARTIFACTS:
+            if self.ready(schema_name, artifact):
+                continue
+            with self._lock:
+                self._jobs[(schema_name, artifact)] = {"status": "queued"}
+            self._executor.submit(self._run, schema_name, artifact)
+
+    def status(self, schema_name: str) -> Dict:
+        """
+        Per artifact: queued, building, ready, failed, or missing when never built
+        """
+        with self._lock:
+            jobs = {artifact: dict(self._jobs.get((schema_name, artifact), {})) for artifact in ARTIFACTS}
+        for artifact, job in jobs.items():
+            if self.ready(schema_name, artifact):
+                job["status"] = "ready"
+                job.pop("error", None)
+                memory = excel_export.get_exporter().memory_report(schema_name) if artifact == "excel" else None
+                if memory:
+                    job["memory"] = memory
+            elif job.get("status") == "ready":
+                # Removed from disk since it was built
+                job = jobs[artifact] = {}
+            job.setdefault("status", "missing")
+        return jobs
+
+    def metrics(self) -> Dict:
+        """
+        Number of tracked artifact jobs in each status
+        """
+        counts = {"queued": 0, "building": 0, "ready": 0, "failed": 0}
+        with self._lock:
+            for job in self._jobs.values():
+                counts[job["status"]] += 1
+        return counts
+
+    def summary(self, schema_name: str) -> Dict:
+        """
+        Stored summary of a run, computed now if the pipeline has not produced it
+        """
+        try:
+            with open(self.summary_path(schema_name)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return self._write_summary(schema_name)
+
+    def invalidate(self, schema_name: str):
+        try:
+            os.unlink(self.summary_path(schema_name))
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            for artifact in ARTIFACTS:
+                self._jobs.pop((schema_name, artifact), None)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pipeline: Optional[ArtifactPipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_pipeline() -> ArtifactPipeline:
+    """
+    Process-wide artifact pipeline over the configured storage backend
+    """
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                _pipeline = ArtifactPipeline(storage.get_storage())
+    return _pipeline
+
+
+def schedule_artifacts(schema_name: str):
+    get_pipeline().schedule(schema_name)
+
+
+def pipeline_metrics() -> Optional[Dict]:
+    return _pipeline.metrics() if _pipeline is not None else None
+
+
+def invalidate_artifacts(schema_name: str):
+    get_pipeline().invalidate(schema_name)
+
+
+def shutdown_pipeline():
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is not None:
+            _pipeline.shutdown()
+            _pipeline = None
@@ -0,0 +1,271 @@
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+import logging
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, Optional
+
+import bcrypt
+from fastapi import HTTPException, Security
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+logger = logging.getLogger('timetable_api')
+
+# bcrypt releases the GIL, so these threads hash in parallel; keep them below the core count
+BCRYPT_WORKERS = int(os.getenv('BCRYPT_WORKERS', str(max(1, (os.cpu_count() or 2) // 2))))
+
+# Requests allowed to wait for a hashing thread before new ones are turned away
+BCRYPT_MAX_PENDING = int(os.getenv('BCRYPT_MAX_PENDING', '16'))
+
+# Seconds a request waits for its hash (queueing included) before giving up
+BCRYPT_TIMEOUT = float(os.getenv('BCRYPT_TIMEOUT', '10'))
+
+# HMAC key for session tokens; without one, tokens only survive until the process restarts
+AUTH_TOKEN_SECRET = os.getenv('AUTH_TOKEN_SECRET') or secrets.token_urlsafe(32)
+
+# Session token lifetime in seconds
+AUTH_TOKEN_TTL = int(os.getenv('AUTH_TOKEN_TTL', str(8 * 60 * 60)))
+
+
+class PasswordHasherBusy(RuntimeError):
+    """
+    Raised when the hashing queue is full or a hash did not finish in time
+    """
+
+
+def check_password(plain_password: str, hashed_password: str) -> bool:
+    """
+    Verify password against hashed version
+    """
+    try:
+        return bcrypt.checkpw(
+            plain_password.encode('utf-8'),
+            hashed_password.encode('utf-8')
+        )
+    except Exception as e:
+        logger.error(f"Password verification error: {e}")
+        return False
+
+
+def hash_password(password: str) -> str:
+    """
+    Hash password using bcrypt
+    """
+    return bcrypt.hashpw(
+        password.encode('utf-8'),
+        bcrypt.gensalt()
+    ).decode('utf-8')
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a small dedicated thread pool with a bounded queue, so a
+    burst of logins cannot take over the API's worker threads or CPU
+    """
+    def __init__(self, workers: int = BCRYPT_WORKERS, max_pending: int = BCRYPT_MAX_PENDING,
+                 timeout: float = BCRYPT_TIMEOUT):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.queue_wait_seconds = 0.0
+        self.max_queue_wait_seconds = 0.0
+        self.hash_seconds = 0.0
+
+    def _run(self, func, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordHasherBusy("Too many password checks in progress")
+            self.pending += 1
+
+        submitted = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            with self._lock:
+                self.running += 1
+                waited = started - submitted
+                self.queue_wait_seconds += waited
+                self.max_queue_wait_seconds = max(self.max_queue_wait_seconds, waited)
+            try:
+                return func(*args)
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.completed += 1
+                    self.hash_seconds += time.perf_counter() - started
+
+        try:
+            future = self._executor.submit(job)
+        except Exception:
+            self._release()
+            raise
+        # The slot is held until the job has run or been cancelled, not just until the caller gives up
+        future.add_done_callback(lambda _: self._release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # Drops the job if it is still queued; a hash already running finishes first
+            future.cancel()
+            with self._lock:
+                self.timeouts += 1
+            raise PasswordHasherBusy("Password check timed out")
+
+    def _release(self):
+        with self._lock:
+            self.pending -= 1
+
+    def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return self._run(check_password, plain_password, hashed_password)
+
+    def hash(self, password: str) -> str:
+        return self._run(hash_password, password)
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "running": self.running,
+                "queued": self.pending - self.running,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "avg_queue_wait_ms": round(self.queue_wait_seconds / self.completed * 1000, 3) if self.completed else 0.0,
+                "max_queue_wait_ms": round(self.max_queue_wait_seconds * 1000, 3),
+                "avg_hash_ms": round(self.hash_seconds / self.completed * 1000, 3) if self.completed else 0.0
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_hasher: Optional[PasswordHasher] = None
+_hasher_lock = threading.Lock()
+
+
+def get_password_hasher() -> PasswordHasher:
+    """
+    Process-wide password hasher, created on first use
+    """
+    global _hasher
+    if _hasher is None:
+        with _hasher_lock:
+            if _hasher is None:
+                _hasher = PasswordHasher()
+                logger.info(f"Password hashing pool: {BCRYPT_WORKERS} workers, {BCRYPT_MAX_PENDING} pending max")
+    return _hasher
+
+
+def hasher_metrics() -> Optional[Dict]:
+    return _hasher.metrics() if _hasher is not None else None
+
+
+def shutdown_password_hasher():
+    global _hasher
+    with _hasher_lock:
+        if _hasher is not None:
+            _hasher.shutdown()
+            _hasher = None
+
+
+class InvalidToken(ValueError):
+    """
+    Raised when a session token is malformed, wrongly signed or expired
+    """
+
+
+_TOKEN_HEADER = {"alg": "HS256", "typ": "JWT"}
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def _sign(signing_input: str, secret: str) -> str:
+    return _b64encode(hmac.new(secret.encode('utf-8'), signing_input.encode('ascii'), hashlib.sha256).digest())
+
+
+def issue_token(username: str, ttl: int = AUTH_TOKEN_TTL, secret: str = AUTH_TOKEN_SECRET) -> Dict:
+    """
+    Issue an HS256 JWT for the user, returning the token and its expiry (epoch seconds)
+    """
+    now = int(time.time())
+    claims = {"sub": username, "iat": now, "exp": now + ttl}
+    signing_input = (
+        f"{_b64encode(json.dumps(_TOKEN_HEADER, separators=(',', ':')).encode('utf-8'))}."
+        f"{_b64encode(json.dumps(claims, separators=(',', ':')).encode('utf-8'))}"
+    )
+    return {
+        "token": f"{signing_input}.{_sign(signing_input, secret)}",
+        "expires_at": claims["exp"]
+    }
+
+
+def verify_token(token: str, secret: str = AUTH_TOKEN_SECRET) -> Dict:
+    """
+    Check the signature and expiry of a session token and return its claims; no database lookup
+    """
+    try:
+        header_b64, claims_b64, signature = token.split('.')
+    except (AttributeError, ValueError):
+        raise InvalidToken("Malformed token")
+    # Tokens are base64url; anything else would fail to encode for signing
+    if not token.isascii():
+        raise InvalidToken("Malformed token")
+
+    expected = _sign(f"{header_b64}.{claims_b64}", secret)
+    if not hmac.compare_digest(signature.encode('ascii'), expected.encode('ascii')):
+        raise InvalidToken("Invalid token signature")
+
+    try:
+        header = json.loads(_b64decode(header_b64))
+        claims = json.loads(_b64decode(claims_b64))
+    except ValueError:
+        raise InvalidToken("Malformed token")
+
+    if header.get('alg') != 'HS256':
+        raise InvalidToken("Unsupported token algorithm")
+    if not isinstance(claims.get('exp'), int) or claims['exp'] <= time.time():
+        raise InvalidToken("Token expired")
+    return claims
+
+
+_bearer_scheme = HTTPBearer(auto_error=False)
+
+
+def require_auth(credentials: Optional[HTTPAuthorizationCredentials] = Security(_bearer_scheme)) -> Dict:
+    """
+    FastAPI dependency that accepts a valid bearer session token and returns its claims
+    """
+    if credentials is None:
+        raise HTTPException(
+            status_code=401,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    try:
+        return verify_token(credentials.credentials)
+    except InvalidToken as e:
+        raise HTTPException(
+            status_code=401,
+            detail=str(e),
+            headers={"WWW-Authenticate": "Bearer"}
+        )
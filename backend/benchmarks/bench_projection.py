@@ -0,0 +1,168 @@
+"""
+Compare the legacy three-pass view building in save_timetables_to_database
+against the single-pass projection engine.
+
+Usage: python benchmarks/bench_projection.py --years 3 --sections 26 --teachers 120 --venues 40
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from projection import project_timetables
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+SLOTS = [
+    "8:00-8:50", "8:50-9:40",
+    "BREAK",
+    "9:50-10:40", "10:40-11:30",
+    "LUNCH",
+    "12:20-1:10", "1:10-2:00", "2:00-2:50", "2:50-3:40"
+]
+
+
+def build_generator(years, sections, teachers, venues, fill, seed):
+    rng = random.Random(seed)
+    teacher_names = [f"Teacher {i}" for i in range(teachers)]
+    venue_map = {f"V{i}": f"Lab {i}" for i in range(venues)}
+    all_timetables = {}
+    for year in range(1, years + 1):
+        for index in range(sections):
+            section = chr(ord('A') + index % 26) + ("" if index < 26 else str(index // 26))
+            timetable = {}
+            for day in DAYS:
+                timetable[day] = {}
+                for slot in SLOTS:
+                    if slot in ("BREAK", "LUNCH"):
+                        timetable[day][slot] = slot
+                    elif rng.random() < fill:
+                        cell = {
+                            'code': f"21CS{rng.randint(100, 999)}T",
+                            'teacher': rng.choice(teacher_names),
+                            'type': rng.choice(['T', 'P', 'J'])
+                        }
+                        if cell['type'] != 'T':
+                            venue_id = rng.choice(list(venue_map))
+                            cell['venue'] = f"{venue_id} - {venue_map[venue_id]}"
+                        timetable[day][slot] = cell
+                    else:
+                        timetable[day][slot] = "FREE"
+            all_timetables[(year, section)] = timetable
+    return SimpleNamespace(days=DAYS, slots=SLOTS, all_timetables=all_timetables), venue_map
+
+
+def legacy_views(generator, venues):
+    """
+    The three passes previously inlined in save_timetables_to_database
+    """
+    classes = []
+    for (year, section), timetable in generator.all_timetables.items():
+        formatted_timetable = {}
+        free_hours = defaultdict(list)
+        for day in generator.days:
+            formatted_timetable[day] = {}
+            for slot in generator.slots:
+                cell = timetable[day][slot]
+                if isinstance(cell, dict):
+                    formatted_timetable[day][slot] = {
+                        'code': cell.get('code', 'N/A'),
+                        'teacher': cell.get('teacher', 'N/A'),
+                        'type': cell.get('type', 'N/A'),
+                        'venue': cell.get('venue', 'N/A')
+                    }
+                else:
+                    formatted_timetable[day][slot] = cell
+                    if cell == "FREE" and slot not in ["BREAK", "LUNCH"]:
+                        free_hours[day].append(slot)
+        classes.append((year, section, formatted_timetable, dict(free_hours)))
+
+    teacher_schedules = defaultdict(lambda: defaultdict(dict))
+    teacher_free_hours = defaultdict(lambda: defaultdict(list))
+    for (year, section), timetable in generator.all_timetables.items():
+        for day in generator.days:
+            for slot in generator.slots:
+                cell = timetable[day][slot]
+                if isinstance(cell, dict):
+                    teacher_schedules[cell['teacher']][day][slot] = {
+                        'year': year,
+                        'section': section,
+                        'code': cell['code'],
+                        'type': cell['type'],
+                        'venue': cell.get('venue', 'N/A')
+                    }
+                elif slot not in ["BREAK", "LUNCH"]:
+                    for teacher in teacher_schedules:
+                        if slot not in teacher_schedules[teacher].get(day, {}):
+                            teacher_free_hours[teacher][day].append(slot)
+
+    venue_schedules = defaultdict(lambda: defaultdict(dict))
+    venue_free_hours = defaultdict(lambda: defaultdict(list))
+    for (year, section), timetable in generator.all_timetables.items():
+        for day in generator.days:
+            for slot in generator.slots:
+                cell = timetable[day][slot]
+                if isinstance(cell, dict) and 'venue' in cell:
+                    venue = cell['venue'].split(' - ')[0]
+                    venue_schedules[venue][day][slot] = {
+                        'year': year,
+                        'section': section,
+                        'code': cell['code'],
+                        'teacher': cell['teacher']
+                    }
+                elif slot not in ["BREAK", "LUNCH"]:
+                    for venue in venues:
+                        if slot not in venue_schedules[venue].get(day, {}):
+                            venue_free_hours[venue][day].append(slot)
+
+    return classes, teacher_schedules, teacher_free_hours, venue_schedules, venue_free_hours
+
+
+def single_pass_views(generator, venues):
+    projection = project_timetables(generator, venues)
+    return (
+        list(projection.class_entries()),
+        list(projection.teacher_entries()),
+        list(projection.venue_entries())
+    )
+
+
+def best_of(func, repeat, *args):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark timetable view projection')
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--sections', type=int, default=26)
+    parser.add_argument('--teachers', type=int, default=120)
+    parser.add_argument('--venues', type=int, default=40)
+    parser.add_argument('--fill', type=float, default=0.75, help='Fraction of teaching cells that are booked')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    generator, venues = build_generator(args.years, args.sections, args.teachers, args.venues, args.fill, args.seed)
+    cells = len(generator.all_timetables) * len(DAYS) * len(SLOTS)
+
+    legacy = best_of(legacy_views, args.repeat, generator, venues)
+    single = best_of(single_pass_views, args.repeat, generator, venues)
+
+    print(f"Sections: {len(generator.all_timetables)}, cells: {cells}, teachers: {args.teachers}, venues: {args.venues}")
+    print(f"Legacy three-pass:  {legacy * 1000:8.2f} ms")
+    print(f"Single-pass:        {single * 1000:8.2f} ms")
+    print(f"Speedup:            {legacy / single:8.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
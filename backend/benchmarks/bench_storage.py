@@ -0,0 +1,162 @@
+"""
+Compare the I/O cost of the storage backends: saving a run, reading the
+three timetable views, building the view response bodies, single-entity
+lookups, and point/range queries against the cells table.
+
+Usage: python benchmarks/bench_storage.py --backends sqlite mysql --runs 5
+The mysql backend uses the DB_* environment variables. --grid-encoding packed
+saves runs with packed grids instead of JSON columns (TIMETABLE_GRID_ENCODING).
+"read views" decodes every row's timetable and free hours whichever the encoding;
+"cold" first drops the backend's cached values tables of packed runs, as a fresh
+API process would have to load them.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage
+from bench_projection import build_generator
+from projection import dump_view_json, project_timetables
+
+
+def make_backend(name, workdir):
+    if name == 'sqlite':
+        return storage.SQLiteStorage(
+            path=os.path.join(workdir, 'timetables.sqlite3'),
+            departments_dir=os.path.join(workdir, 'departments')
+        )
+    return storage.create_storage(name)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def stored_bytes(projection):
+    """
+    Bytes of timetable columns one run stores, before any database overhead
+    """
+    columns = ('timetable_data', 'free_hours', 'rendered_json', 'grid_blob', 'values_blob')
+    rows = storage.TimetableStorage.run_rows(projection, "2025-01-01 00:00:00")
+    return sum(
+        len(row[column]) for table in (*storage.TIMETABLE_TABLES, 'grid_values') for row in rows.get(table, ())
+        for column in columns if row.get(column) is not None
+    )
+
+
+def read_views(backend, run_id):
+    """
+    Rows of all three views with timetable and free hours decoded
+    """
+    for table in storage.TIMETABLE_TABLES:
+        for row in backend.fetch_timetables(run_id, table):
+            for column in ('timetable_data', 'free_hours'):
+                if isinstance(row[column], str):
+                    row[column] = json.loads(row[column])
+
+
+def view_body(backend, projection, run_id, table):
+    """
+    Rows of one view as the API sends them: pre-rendered when the run has them,
+    otherwise rendered from the stored (or unpacked) grids
+    """
+    rendered = backend.fetch_rendered(run_id, table)
+    if rendered is not None:
+        return rendered
+    rendered = []
+    for row in backend.fetch_timetables(run_id, table):
+        timetable, free_hours = row.pop('timetable_data'), row.pop('free_hours')
+        for column in ('id', 'run_id', 'rendered_json'):
+            row.pop(column, None)
+        rendered.append(dump_view_json({
+            **row,
+            'timetable': projection.render(json.loads(timetable) if isinstance(timetable, str) else timetable),
+            'free_hours': json.loads(free_hours) if isinstance(free_hours, str) else free_hours,
+            'generated_at': str(row['generated_at'])
+        }))
+    return rendered
+
+
+def bench_backend(backend, projection, runs, queries):
+    save_times, cold_times, read_times, rendered_times, lookup_times, cell_times = [], [], [], [], [], []
+    run_ids = []
+    teachers = list(projection.teachers)
+
+    for index in range(runs):
+        run_id = f"timetable_bench_{os.getpid()}_{index}"
+        elapsed, _ = timed(backend.save_run, run_id, projection, None, None, {'cells': len(projection.cells)})
+        save_times.append(elapsed)
+        run_ids.append(run_id)
+
+        backend._grid_values_cache.discard_run(run_id)
+        elapsed, _ = timed(read_views, backend, run_id)
+        cold_times.append(elapsed)
+        elapsed, _ = timed(read_views, backend, run_id)
+        read_times.append(elapsed)
+
+        start = time.perf_counter()
+        for table in storage.TIMETABLE_TABLES:
+            view_body(backend, projection, run_id, table)
+        rendered_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for query in range(queries):
+            backend.fetch_timetable(run_id, 'teacher_timetables', {'teacher_name': teachers[query % len(teachers)]})
+        lookup_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for query in range(queries):
+            backend.query_cells(run_id, {'teacher': teachers[query % len(teachers)]}, 1000)
+            backend.query_cells(run_id, {'day_index': query % 5, 'slot_from': 0, 'slot_to': 4}, 1000)
+        cell_times.append(time.perf_counter() - start)
+
+    for run_id in run_ids:
+        backend.delete_run(run_id)
+
+    return (min(save_times), min(cold_times), min(read_times), min(rendered_times), min(lookup_times),
+            min(cell_times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark timetable storage backends')
+    parser.add_argument('--backends', nargs='+', default=['sqlite'], choices=['sqlite', 'mysql'])
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--sections', type=int, default=26)
+    parser.add_argument('--teachers', type=int, default=120)
+    parser.add_argument('--venues', type=int, default=40)
+    parser.add_argument('--fill', type=float, default=0.75)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--queries', type=int, default=50, help='Cell queries of each kind per run')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--grid-encoding', default=storage.GRID_ENCODING, choices=['json', 'packed'])
+    args = parser.parse_args()
+    storage.GRID_ENCODING = args.grid_encoding
+
+    generator, venues = build_generator(args.years, args.sections, args.teachers, args.venues, args.fill, args.seed)
+    projection = project_timetables(generator, venues)
+    print(f"Sections: {len(projection.classes)}, cells: {len(projection.cells)}, "
+          f"teachers: {len(projection.teachers)}, venues: {len(projection.venue_names)}")
+    print(f"Grid encoding: {args.grid_encoding}, timetable columns per run: {stored_bytes(projection) / 1024:.1f} KB")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in args.backends:
+            backend = make_backend(name, workdir)
+            save, cold, read, rendered, lookups, cells = bench_backend(backend, projection, args.runs, args.queries)
+            print(f"{name:<8} save: {save * 1000:8.2f} ms   "
+                  f"read views: {read * 1000:8.2f} ms (cold {cold * 1000:.2f} ms)   "
+                  f"view bodies: {rendered * 1000:8.2f} ms   "
+                  f"{args.queries} teacher lookups: {lookups * 1000:8.2f} ms   "
+                  f"{2 * args.queries} cell queries: {cells * 1000:8.2f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
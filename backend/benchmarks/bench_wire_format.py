@@ -0,0 +1,115 @@
+"""
+Compare response sizes of the default JSON timetable payload and the compact
+columnar encoding, raw and gzipped, for a whole run and for each view.
+
+By default every section repeats a fixed set of subjects, each with one
+teacher and venue, as real timetables do; --random assigns every cell
+independently, which is the worst case for the encoding.
+
+Usage: python benchmarks/bench_wire_format.py --years 3 --sections 26 --subjects 8
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import compact
+from bench_projection import DAYS, SLOTS, build_generator
+from projection import dump_view_json, project_timetables
+
+VIEW_FIELDS = {
+    "classes": ("year", "section"),
+    "teachers": ("employee_id", "teacher_name"),
+    "venues": ("venue_id", "venue_name")
+}
+
+
+def build_repeating_generator(years, sections, teachers, venues, subjects, fill, seed):
+    rng = random.Random(seed)
+    teacher_names = [f"Teacher {i}" for i in range(teachers)]
+    venue_map = {f"V{i}": f"Lab {i}" for i in range(venues)}
+    all_timetables = {}
+    for year in range(1, years + 1):
+        for index in range(sections):
+            section = chr(ord('A') + index % 26) + ("" if index < 26 else str(index // 26))
+            offered = []
+            for _ in range(subjects):
+                subject = {
+                    'code': f"21CS{rng.randint(100, 999)}{rng.choice('TTPJ')}",
+                    'teacher': rng.choice(teacher_names)
+                }
+                subject['type'] = subject['code'][-1]
+                if subject['type'] != 'T':
+                    venue_id = rng.choice(list(venue_map))
+                    subject['venue'] = f"{venue_id} - {venue_map[venue_id]}"
+                offered.append(subject)
+            all_timetables[(year, section)] = {
+                day: {
+                    slot: slot if slot in ("BREAK", "LUNCH")
+                    else (dict(rng.choice(offered)) if rng.random() < fill else "FREE")
+                    for slot in SLOTS
+                }
+                for day in DAYS
+            }
+    return SimpleNamespace(days=DAYS, slots=SLOTS, all_timetables=all_timetables), venue_map
+
+
+def view_rows(projection):
+    generated_at = "2025-01-01 00:00:00"
+    rows = {"classes": [], "teachers": [], "venues": []}
+    for year, section, timetable, free_hours in projection.class_entries():
+        rows["classes"].append({'year': year, 'section': section, 'timetable': projection.render(timetable),
+                                'free_hours': free_hours, 'generated_at': generated_at})
+    for teacher, timetable, free_hours in projection.teacher_entries():
+        rows["teachers"].append({'employee_id': None, 'teacher_name': teacher, 'timetable': projection.render(timetable),
+                                 'free_hours': free_hours, 'generated_at': generated_at})
+    for venue_id, venue_name, timetable, free_hours in projection.venue_entries():
+        rows["venues"].append({'venue_id': venue_id, 'venue_name': venue_name, 'timetable': projection.render(timetable),
+                               'free_hours': free_hours, 'generated_at': generated_at})
+    return rows
+
+
+def report(label, plain, packed, encode_ms):
+    print(f"{label:<10} json: {len(plain):>9} B ({len(gzip.compress(plain)):>7} gz)   "
+          f"compact: {len(packed):>8} B ({len(gzip.compress(packed)):>7} gz)   "
+          f"ratio: {len(plain) / len(packed):5.1f}x   encode: {encode_ms:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the compact timetable wire format')
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--sections', type=int, default=26)
+    parser.add_argument('--teachers', type=int, default=120)
+    parser.add_argument('--venues', type=int, default=40)
+    parser.add_argument('--subjects', type=int, default=8, help='Subjects per section')
+    parser.add_argument('--fill', type=float, default=0.75)
+    parser.add_argument('--random', action='store_true', help='Assign every cell independently')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if args.random:
+        generator, venues = build_generator(args.years, args.sections, args.teachers, args.venues, args.fill, args.seed)
+    else:
+        generator, venues = build_repeating_generator(args.years, args.sections, args.teachers, args.venues,
+                                                      args.subjects, args.fill, args.seed)
+    rows = view_rows(project_timetables(generator, venues))
+
+    for label, keys in [("run", list(rows))] + [(key, [key]) for key in rows]:
+        subset = {key: rows[key] for key in keys}
+        plain = dump_view_json(subset if len(keys) > 1 else subset[keys[0]]).encode('utf-8')
+        start = time.perf_counter()
+        encoded = compact.encode_views(subset, VIEW_FIELDS, DAYS, SLOTS)
+        packed = dump_view_json(encoded).encode('utf-8')
+        report(label, plain, packed, (time.perf_counter() - start) * 1000)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
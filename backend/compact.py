@@ -0,0 +1,134 @@
+from typing import Dict, List, Sequence
+
+from projection import NON_TEACHING_SLOTS
+
+COMPACT_FORMAT = "timetable-compact/1"
+
+COMPACT_MEDIA_TYPE = "application/vnd.timetable.compact+json"
+
+# Cell fields each view leaves implicit because they belong to the entity itself
+# (a class cell never names its own class). They are filled in from the row so a
+# teacher's or venue's cell resolves to the same entry as the class cell it mirrors.
+VIEW_CELL_CONTEXT = {
+    "classes": {"year": "year", "section": "section"},
+    "teachers": {"teacher": "teacher_name"}
+}
+
+
+class _ValueTable:
+    """
+    Distinct scalars (subject codes, teacher names, venue labels, years, ...) referenced by index
+    """
+    def __init__(self):
+        self.values: List = []
+        self._index: Dict = {}
+
+    def ref(self, value) -> int:
+        # Keyed by type as well, so 1, "1" and True stay distinct
+        key = (type(value).__name__, value)
+        index = self._index.get(key)
+        if index is None:
+            index = self._index[key] = len(self.values)
+            self.values.append(value)
+        return index
+
+
+def _ordered_union(groups) -> List[str]:
+    fields: List[str] = []
+    for group in groups:
+        for field in group:
+            if field not in fields:
+                fields.append(field)
+    return fields
+
+
+def encode_views(views: Dict[str, List[Dict]], fields: Dict[str, Sequence[str]],
+                 days: Sequence[str], slots: Sequence[str],
+                 context: Dict[str, Dict[str, str]] = VIEW_CELL_CONTEXT) -> Dict:
+    """
+    Columnar encoding of view rows (as returned by the timetable endpoints).
+
+    Every scalar is stored once in "values". Cells are shared by all views:
+    each is an array of value indexes over "cell_fields" (-1 when absent),
+    and a view reads only its own cell_fields from it. Each entity's
+    timetable is a flat day-major grid of ints: 0 is empty (or BREAK/LUNCH,
+    restored from the slot name), k > 0 is cells[k - 1] and k < 0 is the
+    plain value values[-k - 1]. Free hours are one bitmask per day over the
+    slot indexes.
+    """
+    values = _ValueTable()
+
+    # Fields each view shows, then the fields identifying its cells (shown plus implied)
+    shown = {
+        key: _ordered_union(
+            cell for row in rows for day_cells in (row.get("timetable") or {}).values()
+            for cell in (day_cells or {}).values() if isinstance(cell, dict)
+        )
+        for key, rows in views.items()
+    }
+    identifying = {key: shown[key] + list(context.get(key, {})) for key in views}
+    cell_fields = _ordered_union(identifying.values())
+
+    cells: List[Dict[str, int]] = []
+    # Per view: identifying value indexes -> cell number, for every cell any view has added
+    lookups: Dict[str, Dict] = {key: {} for key in views}
+
+    def cell_number(key: str, cell: Dict, row: Dict) -> int:
+        refs = {field: values.ref(cell[field]) for field in shown[key] if field in cell}
+        for field, row_field in context.get(key, {}).items():
+            refs[field] = values.ref(row.get(row_field))
+        lookup_key = tuple(refs.get(field, -1) for field in identifying[key])
+        number = lookups[key].get(lookup_key)
+        if number is None:
+            cells.append(refs)
+            number = len(cells)
+            for view, view_fields in identifying.items():
+                lookups[view].setdefault(tuple(refs.get(field, -1) for field in view_fields), number)
+        return number
+
+    encoded = {}
+    for key, rows in views.items():
+        row_fields = list(fields[key]) + ["generated_at"]
+        entity_rows, grids, free = [], [], []
+
+        for row in rows:
+            entity_rows.append([values.ref(row.get(field)) for field in row_fields])
+
+            grid = []
+            timetable = row.get("timetable") or {}
+            for day in days:
+                day_cells = timetable.get(day) or {}
+                for slot in slots:
+                    cell = day_cells.get(slot)
+                    if slot in NON_TEACHING_SLOTS or cell is None:
+                        grid.append(0)
+                    elif isinstance(cell, dict):
+                        grid.append(cell_number(key, cell, row))
+                    else:
+                        grid.append(-values.ref(cell) - 1)
+            grids.append(grid)
+
+            free_hours = row.get("free_hours") or {}
+            free.append([
+                sum(1 << slot_index for slot_index, slot in enumerate(slots) if slot in free_hours.get(day, ()))
+                for day in days
+            ])
+
+        encoded[key] = {
+            "fields": row_fields,
+            "cell_fields": shown[key],
+            "rows": entity_rows,
+            "grids": grids,
+            "free": free
+        }
+
+    return {
+        "format": COMPACT_FORMAT,
+        "days": list(days),
+        "slots": list(slots),
+        "fixed_slots": [slot for slot in slots if slot in NON_TEACHING_SLOTS],
+        "values": values.values,
+        "cell_fields": cell_fields,
+        "cells": [[cell.get(field, -1) for field in cell_fields] for cell in cells],
+        "views": encoded
+    }
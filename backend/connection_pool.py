@@ -0,0 +1,139 @@
+import os
+import time
+import logging
+import threading
+from typing import Dict, Optional
+
+from sqlalchemy import create_engine
+
+import server_timing
+
+logger = logging.getLogger('timetable_api')
+
+# Persistent connections kept open, and extra connections allowed under burst load
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_POOL_MAX_OVERFLOW = int(os.getenv('DB_POOL_MAX_OVERFLOW', '10'))
+
+# Seconds to wait for a free connection before failing the request
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+
+# Reconnect connections older than this many seconds, below the server's wait_timeout
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+
+
+def _create_connection():
+    """
+    Open one MySQL connection for the pool; queries are schema-qualified, so no database is switched
+    """
+    import mysql.connector
+
+    return mysql.connector.connect(
+        host=os.getenv('DB_HOST', 'localhost'),
+        user=os.getenv('DB_USER', 'root'),
+        password=os.getenv('DB_PASSWORD', ''),
+        database=os.getenv('DB_NAME'),
+        port=int(os.getenv('DB_PORT', '3306')),
+        ssl_disabled=False
+    )
+
+
+class ConnectionPool:
+    """
+    Shared, size-bounded MySQL connection pool with pre-ping, recycling and checkout metrics
+    """
+    def __init__(self, creator=_create_connection, size: int = DB_POOL_SIZE,
+                 max_overflow: int = DB_POOL_MAX_OVERFLOW, timeout: float = DB_POOL_TIMEOUT,
+                 recycle: int = DB_POOL_RECYCLE):
+        # The engine is only used for its QueuePool and MySQL dialect (needed for pre-ping)
+        self.engine = create_engine(
+            "mysql+mysqlconnector://",
+            creator=creator,
+            pool_size=size,
+            max_overflow=max_overflow,
+            pool_timeout=timeout,
+            pool_recycle=recycle,
+            pool_pre_ping=True
+        )
+        self.max_overflow = max_overflow
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.failures = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def connect(self):
+        """
+        Check out a DB-API connection; close() returns it to the pool
+        """
+        start = time.perf_counter()
+        try:
+            conn = self.engine.raw_connection()
+        except Exception:
+            with self._lock:
+                self.failures += 1
+            raise
+
+        waited = time.perf_counter() - start
+        server_timing.record("db-connect", waited)
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        return conn
+
+    def metrics(self) -> Dict:
+        pool = self.engine.pool
+        checked_out = pool.checkedout()
+        with self._lock:
+            return {
+                "size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "checked_out": checked_out,
+                "overflow": pool.overflow(),
+                "max_overflow": self.max_overflow,
+                # Share of all connections the pool may open that are in use; at 1.0 checkouts wait
+                "saturation": round(checked_out / (pool.size() + self.max_overflow), 3),
+                "checkouts": self.checkouts,
+                "failures": self.failures,
+                "avg_wait_ms": round(self.wait_seconds / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait_seconds * 1000, 3)
+            }
+
+    def dispose(self):
+        self.engine.dispose()
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Process-wide pool, created on first use
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+                logger.info(
+                    f"Created MySQL connection pool (size={DB_POOL_SIZE}, max_overflow={DB_POOL_MAX_OVERFLOW}, "
+                    f"timeout={DB_POOL_TIMEOUT}s, recycle={DB_POOL_RECYCLE}s)"
+                )
+    return _pool
+
+
+def pool_metrics() -> Optional[Dict]:
+    """
+    Metrics for the shared pool, or None if nothing has used it yet
+    """
+    return _pool.metrics() if _pool is not None else None
+
+
+def dispose_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.dispose()
+            _pool = None
+            logger.info("Disposed MySQL connection pool")
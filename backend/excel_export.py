@@ -0,0 +1,225 @@
+import os
+import json
+import shutil
+import zipfile
+import logging
+import tempfile
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from openpyxl import Workbook
+
+import memtrace
+import metrics
+import server_timing
+import storage
+
+logger = logging.getLogger('timetable_api')
+
+# Finished archives, one per timetable run; runs never change, so they are kept until the run is deleted
+EXPORT_CACHE_DIR = os.getenv('EXPORT_CACHE_DIR', os.path.join('data', 'exports'))
+
+# Threads building workbooks; the three workbooks of one archive are built side by side
+EXCEL_WORKERS = int(os.getenv('EXCEL_WORKERS', '3'))
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+
+SLOTS = [
+    "8:00-8:50", "8:50-9:40",
+    "BREAK",
+    "9:50-10:40", "10:40-11:30",
+    "LUNCH",
+    "12:20-1:10", "1:10-2:00", "2:00-2:50", "2:50-3:40"
+]
+
+
+def _class_sheet_name(row: Dict) -> str:
+    return f"Year{row['year']}-{row['section']}"
+
+
+def _class_cell(cell: Dict) -> str:
+    text = f"{cell.get('code', '')}\n{cell.get('teacher', '')}"
+    if cell.get('venue'):
+        text += f"\n{cell['venue']}"
+    return text
+
+
+def _teacher_cell(cell: Dict) -> str:
+    text = f"{cell.get('code', '')}\n{cell.get('year', '')}-{cell.get('section', '')}"
+    if cell.get('venue'):
+        text += f"\n{cell['venue']}"
+    return text
+
+
+def _venue_cell(cell: Dict) -> str:
+    return f"{cell.get('code', '')}\n{cell.get('teacher', '')}\n{cell.get('year', '')}-{cell.get('section', '')}"
+
+
+# Archive member -> (table, sheet name, cell text) for each workbook
+WORKBOOKS = {
+    "class_timetables.xlsx": ("class_timetables", _class_sheet_name, _class_cell),
+    # Excel sheet name length limit
+    "teacher_timetables.xlsx": ("teacher_timetables", lambda row: row['teacher_name'][:31], _teacher_cell),
+    "venue_timetables.xlsx": ("venue_timetables", lambda row: row['venue_name'][:31], _venue_cell)
+}
+
+
+def _timetable(row: Dict) -> Dict:
+    data = row['timetable_data']
+    if not data:
+        return {}
+    if isinstance(data, (str, bytes, bytearray)):
+        return json.loads(data)
+    return data
+
+
+def write_workbook(backend: storage.TimetableStorage, schema_name: str, member: str, path: str):
+    """
+    Write one workbook to disk in write-only mode, one sheet per streamed row,
+    so neither the rows nor the finished sheets are held in memory
+    """
+    table, sheet_name, cell_text = WORKBOOKS[member]
+    wb = Workbook(write_only=True)
+
+    for row in backend.iter_timetables(schema_name, table):
+        ws = wb.create_sheet(sheet_name(row))
+        ws.append(['Time'] + DAYS)
+
+        timetable = _timetable(row)
+        for slot in SLOTS:
+            values = [slot]
+            for day in DAYS:
+                cell = timetable.get(day, {}).get(slot, '')
+                values.append(cell_text(cell) if isinstance(cell, dict) else (cell or 'FREE'))
+            ws.append(values)
+
+    wb.save(path)
+
+
+class ExcelExporter:
+    """
+    Builds the Excel zip of a timetable run on a worker pool and keeps it on
+    disk, so each run is rendered once and later downloads stream the file
+    """
+    def __init__(self, backend: storage.TimetableStorage, cache_dir: str = EXPORT_CACHE_DIR,
+                 workers: int = EXCEL_WORKERS):
+        self.backend = backend
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='excel')
+        self._lock = threading.Lock()
+        self._building: Dict[str, threading.Lock] = {}
+        # Memory trace of each run's last build, when MEMORY_TRACE is on
+        self._memory: Dict[str, Dict] = {}
+
+    def archive_path(self, schema_name: str) -> str:
+        return os.path.join(self.cache_dir, f"{storage.validate_run_id(schema_name)}.zip")
+
+    def cached(self, schema_name: str) -> bool:
+        return os.path.exists(self.archive_path(schema_name))
+
+    def archive(self, schema_name: str) -> str:
+        """
+        Path of the run's archive, building it first if it is not cached.
+        Concurrent callers for the same run wait for a single build.
+        """
+        path = self.archive_path(schema_name)
+        if os.path.exists(path):
+            return path
+
+        with self._lock:
+            build_lock = self._building.setdefault(schema_name, threading.Lock())
+
+        try:
+            with build_lock:
+                if not os.path.exists(path):
+                    with metrics.EXCEL_EXPORT_SECONDS.time(), memtrace.capture("excel_export") as memory:
+                        self._build(schema_name, path)
+                    if memory:
+                        with self._lock:
+                            self._memory[schema_name] = memory
+        finally:
+            # Also after a failed build, so the entry does not outlive its waiters
+            with self._lock:
+                if self._building.get(schema_name) is build_lock:
+                    del self._building[schema_name]
+        return path
+
+    def _build(self, schema_name: str, path: str):
+        workdir = tempfile.mkdtemp(dir=self.cache_dir)
+        try:
+            # Workbooks run in the caller's context, so a download request's timings and profile cover them
+            futures = {
+                member: self._executor.submit(
+                    contextvars.copy_context().run, server_timing.bound(write_workbook),
+                    self.backend, schema_name, member, os.path.join(workdir, member)
+                )
+                for member in WORKBOOKS
+            }
+            for future in futures.values():
+                future.result()
+
+            # Members are copied into the archive in chunks, never read whole
+            partial = os.path.join(workdir, 'archive.zip')
+            with zipfile.ZipFile(partial, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+                for member in WORKBOOKS:
+                    zip_file.write(os.path.join(workdir, member), member)
+
+            os.replace(partial, path)
+            logger.info(f"Built Excel export for {schema_name}: {os.path.getsize(path)} bytes")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def memory_report(self, schema_name: str) -> Optional[Dict]:
+        with self._lock:
+            return self._memory.get(schema_name)
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            return {"building": len(self._building)}
+
+    def invalidate(self, schema_name: str):
+        try:
+            os.unlink(self.archive_path(schema_name))
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self._memory.pop(schema_name, None)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_exporter: Optional[ExcelExporter] = None
+_exporter_lock = threading.Lock()
+
+
+def get_exporter() -> ExcelExporter:
+    """
+    Process-wide Excel exporter over the configured storage backend
+    """
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                _exporter = ExcelExporter(storage.get_storage())
+    return _exporter
+
+
+def exporter_metrics() -> Optional[Dict]:
+    return _exporter.metrics() if _exporter is not None else None
+
+
+def invalidate_export(schema_name: str):
+    # Archives outlive the process, so this also clears ones built before a restart
+    get_exporter().invalidate(schema_name)
+
+
+def shutdown_exporter():
+    global _exporter
+    with _exporter_lock:
+        if _exporter is not None:
+            _exporter.shutdown()
+            _exporter = None
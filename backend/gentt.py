@@ -1,8 +1,7 @@
 import os
 import json
+import hashlib
 import random
-import sqlalchemy
-from sqlalchemy import create_engine, text
 from datetime import datetime
 import pandas as pd
 from typing import Dict, List
@@ -11,8 +10,13 @@ import traceback
 import logging
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
 
+import artifacts
+import catalog
+import storage
+from projection import project_timetables
+
 class GlobalTimeTableGenerator:
-    def __init__(self, section_config=None):
+    def __init__(self, section_config=None, seed=None):
         self.days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
         self.slots = [
             "8:00-8:50", "8:50-9:40", 
@@ -25,6 +29,12 @@ class GlobalTimeTableGenerator:
         self.afternoon_slots = ["12:20-1:10", "1:10-2:00", "2:00-2:50", "2:50-3:40"]
         self.all_teaching_slots = self.morning_slots + self.afternoon_slots
         
+        # Seeded generator so a run can be reproduced from its recorded seed
+        self.seed = seed if seed is not None else random.randrange(2**32)
+        self.rng = random.Random(self.seed)
+        self.input_hash = None
+        self.attempts_used = 0
+
         self.all_timetables = {}
         self.global_teacher_schedule = defaultdict(lambda: defaultdict(set))
         self.global_venue_schedule = defaultdict(lambda: defaultdict(set))
@@ -133,7 +143,7 @@ class GlobalTimeTableGenerator:
 
         consecutive_scheduled = False
         available_days = self.days.copy()
-        random.shuffle(available_days)
+        self.rng.shuffle(available_days)
 
         morning_pairs = [
             ("8:00-8:50", "8:50-9:40"),
@@ -175,7 +185,7 @@ class GlobalTimeTableGenerator:
         # If morning scheduling failed, try early afternoon slots
         if not consecutive_scheduled:
             # Reshuffle days for the next attempt
-            random.shuffle(available_days)
+            self.rng.shuffle(available_days)
             
             for day in available_days.copy():
                 for slot1, slot2 in early_afternoon_pair:
@@ -209,7 +219,7 @@ class GlobalTimeTableGenerator:
         # Only try late afternoon as a last resort
         if not consecutive_scheduled:
             # Reshuffle days for the final attempt
-            random.shuffle(available_days)
+            self.rng.shuffle(available_days)
             
             for day in available_days.copy():
                 for slot1, slot2 in late_afternoon_pair:
@@ -255,7 +265,7 @@ class GlobalTimeTableGenerator:
                         if self.check_global_constraints(year, section, subject, day, slot)]
             
             if morning_slots:  # If morning slots available, use them
-                slot = random.choice(morning_slots)
+                slot = self.rng.choice(morning_slots)
                 self.all_timetables[(year, section)][day][slot] = {
                     'code': subject['code'],
                     'teacher': subject['teacher'],
@@ -270,7 +280,7 @@ class GlobalTimeTableGenerator:
         # If we still have hours to schedule, try afternoon slots
         if remaining_hours > 0:
             # Reshuffle days to avoid bias
-            random.shuffle(available_days)
+            self.rng.shuffle(available_days)
             
             for day in available_days:
                 if remaining_hours <= 0:
@@ -283,7 +293,7 @@ class GlobalTimeTableGenerator:
                                     self.check_global_constraints(year, section, subject, day, slot)]
                 
                 if available_early_slots:
-                    slot = random.choice(available_early_slots)
+                    slot = self.rng.choice(available_early_slots)
                     self.all_timetables[(year, section)][day][slot] = {
                         'code': subject['code'],
                         'teacher': subject['teacher'],
@@ -300,7 +310,7 @@ class GlobalTimeTableGenerator:
                                     self.check_global_constraints(year, section, subject, day, slot)]
                 
                 if available_late_slots:
-                    slot = random.choice(available_late_slots)
+                    slot = self.rng.choice(available_late_slots)
                     self.all_timetables[(year, section)][day][slot] = {
                         'code': subject['code'],
                         'teacher': subject['teacher'],
@@ -316,7 +326,7 @@ class GlobalTimeTableGenerator:
         if subject['code'] == 'CDC':
             # Find a single 2-hour slot for CDC
             available_days = self.days.copy()
-            random.shuffle(available_days)
+            self.rng.shuffle(available_days)
 
             # Prioritize morning pairs first
             morning_pairs = [
@@ -377,7 +387,7 @@ class GlobalTimeTableGenerator:
                             if self.check_global_constraints(year, section, subject, day, slot)]
             
             while morning_slots and hours_remaining > 0:
-                slot = random.choice(morning_slots)
+                slot = self.rng.choice(morning_slots)
                 morning_slots.remove(slot)  # Remove used slot
                 
                 self.all_timetables[(year, section)][day][slot] = {
@@ -391,7 +401,7 @@ class GlobalTimeTableGenerator:
         # Only if we still have hours to schedule, try afternoon slots
         if hours_remaining > 0:
             # Shuffle days again to avoid bias in afternoon scheduling
-            random.shuffle(available_days)
+            self.rng.shuffle(available_days)
             
             for day in available_days:
                 if hours_remaining <= 0:
@@ -407,7 +417,7 @@ class GlobalTimeTableGenerator:
                                     self.check_global_constraints(year, section, subject, day, slot)]
                 
                 while available_early_slots and hours_remaining > 0:
-                    slot = random.choice(available_early_slots)
+                    slot = self.rng.choice(available_early_slots)
                     available_early_slots.remove(slot)  # Remove used slot
                     
                     self.all_timetables[(year, section)][day][slot] = {
@@ -425,7 +435,7 @@ class GlobalTimeTableGenerator:
                                         self.check_global_constraints(year, section, subject, day, slot)]
                     
                     while available_late_slots and hours_remaining > 0:
-                        slot = random.choice(available_late_slots)
+                        slot = self.rng.choice(available_late_slots)
                         available_late_slots.remove(slot)  # Remove used slot
                         
                         self.all_timetables[(year, section)][day][slot] = {
@@ -532,6 +542,7 @@ class GlobalTimeTableGenerator:
         print("Generating timetables with sections:", self.sections)
         for attempt in range(max_attempts):
             print(f"Attempt {attempt + 1} of {max_attempts}")
+            self.attempts_used = attempt + 1
             
             self.initialize_empty_timetables()
             self.global_teacher_schedule.clear()
@@ -545,7 +556,7 @@ class GlobalTimeTableGenerator:
                     if (year, section) in all_sections_data:
                         subjects = all_sections_data[(year, section)]
                         jp_subjects = [s for s in subjects if s['type'] in ['J', 'P']]
-                        random.shuffle(jp_subjects)
+                        self.rng.shuffle(jp_subjects)
                         
                         for subject in jp_subjects:
                             if not self.schedule_jp_subject(year, section, subject, venues):
@@ -560,7 +571,7 @@ class GlobalTimeTableGenerator:
                         if (year, section) in all_sections_data:
                             subjects = all_sections_data[(year, section)]
                             theory_subjects = [s for s in subjects if s['type'] == 'T']
-                            random.shuffle(theory_subjects)
+                            self.rng.shuffle(theory_subjects)
                             
                             for subject in theory_subjects:
                                 if not self.schedule_theory_subject(year, section, subject):
@@ -688,168 +699,56 @@ def get_cdc_subjects_for_section(year: int, section: str, cdc_df: pd.DataFrame,
     
     return cdc_subjects
 
+def faculty_employee_ids(faculty_df: pd.DataFrame) -> Dict[str, str]:
+    """
+    Map each faculty Name to its Employee_ID, skipping rows without one
+    """
+    if faculty_df is None or 'Employee_ID' not in faculty_df.columns:
+        return {}
+
+    employee_ids = {}
+    for name, employee_id in zip(faculty_df['Name'], faculty_df['Employee_ID']):
+        if pd.isna(name) or pd.isna(employee_id):
+            continue
+        # Numeric IDs read from a column with blanks come back as floats
+        if isinstance(employee_id, float) and employee_id.is_integer():
+            employee_id = int(employee_id)
+        employee_ids[name] = str(employee_id).strip()
+    return employee_ids
+
 #Database Storage Functions
-def save_timetables_to_database(generator, all_sections_data, faculty_df, cdc_df, venues, connection_uri):
+def save_timetables_to_database(generator, all_sections_data, faculty_df, cdc_df, venues):
     try:
-        logger.info(f"Attempting to save timetables to database using URI:")
-        # Create SQLAlchemy engine
-        engine = create_engine(connection_uri)
-
-        logger.info("Database engine created successfully.")
-
-        # Create a connection
-        logger.info("Attempting to establish database connection.")
-        with engine.connect() as connection:
-            # Start a transaction
-            with connection.begin():
-                # Create a unique schema for this timetable generation
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                schema_name = f"timetable_{timestamp}"
-
-                logger.info(f"Creating schema: {schema_name}")
-                # Create schema
-                connection.execute(text(f"CREATE SCHEMA {schema_name}"))
-
-                logger.info(f"Creating tables within schema: {schema_name}")
-                # Create tables within the schema
-                connection.execute(text(f"""
-                CREATE TABLE {schema_name}.class_timetables (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    year INT,
-                    section VARCHAR(10),
-                    timetable_data JSON,
-                    free_hours JSON,
-                    generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-                """))
-
-                connection.execute(text(f"""
-                CREATE TABLE {schema_name}.teacher_timetables (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    employee_id VARCHAR(20),
-                    teacher_name VARCHAR(100),
-                    timetable_data JSON,
-                    free_hours JSON,
-                    generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-                """))
-
-                connection.execute(text(f"""
-                CREATE TABLE {schema_name}.venue_timetables (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    venue_id VARCHAR(20),
-                    venue_name VARCHAR(100),
-                    timetable_data JSON,
-                    free_hours JSON,
-                    generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-                """))
-
-                # Save Class Timetables with explicit venue information
-                logger.info("Starting to save class timetables.")
-                for (year, section), timetable in generator.all_timetables.items():
-                    formatted_timetable = {}
-                    free_hours = defaultdict(list)
-                    
-                    for day in generator.days:
-                        formatted_timetable[day] = {}
-                        for slot in generator.slots:
-                            cell = timetable[day][slot]
-                            if isinstance(cell, dict):
-                                formatted_timetable[day][slot] = {
-                                    'code': cell.get('code', 'N/A'),
-                                    'teacher': cell.get('teacher', 'N/A'),
-                                    'type': cell.get('type', 'N/A'),
-                                    'venue': cell.get('venue', 'N/A')  # Ensure venue is included
-                                }
-                            else:
-                                formatted_timetable[day][slot] = cell
-                                if cell == "FREE" and slot not in ["BREAK", "LUNCH"]:
-                                    free_hours[day].append(slot)
-
-                    # Insert class timetable
-                    connection.execute(text(f"""
-                    INSERT INTO {schema_name}.class_timetables 
-                    (year, section, timetable_data, free_hours)
-                    VALUES (:year, :section, :timetable_data, :free_hours)
-                    """), {
-                        'year': year,
-                        'section': section,
-                        'timetable_data': json.dumps(formatted_timetable),
-                        'free_hours': json.dumps(dict(free_hours))
-                    })
-
-                # Save Teacher Timetables with venue information
-                logger.info("Starting to save teacher timetables.")
-                teacher_schedules = defaultdict(lambda: defaultdict(dict))
-                teacher_free_hours = defaultdict(lambda: defaultdict(list))
-
-                for (year, section), timetable in generator.all_timetables.items():
-                    for day in generator.days:
-                        for slot in generator.slots:
-                            cell = timetable[day][slot]
-                            if isinstance(cell, dict):
-                                teacher = cell['teacher']
-                                teacher_schedules[teacher][day][slot] = {
-                                    'year': year,
-                                    'section': section,
-                                    'code': cell['code'],
-                                    'type': cell['type'],
-                                    'venue': cell.get('venue', 'N/A')  # Include venue
-                                }
-                            elif slot not in ["BREAK", "LUNCH"]:
-                                for teacher in teacher_schedules:
-                                    if slot not in teacher_schedules[teacher].get(day, {}):
-                                        teacher_free_hours[teacher][day].append(slot)
-
-                # Save teacher timetables
-                for teacher in teacher_schedules:
-                    connection.execute(text(f"""
-                    INSERT INTO {schema_name}.teacher_timetables 
-                    (teacher_name, timetable_data, free_hours)
-                    VALUES (:teacher_name, :timetable_data, :free_hours)
-                    """), {
-                        'teacher_name': teacher,
-                        'timetable_data': json.dumps(dict(teacher_schedules[teacher])),
-                        'free_hours': json.dumps(dict(teacher_free_hours[teacher]))
-                    })
-
-                # Save Venue Timetables
-                venue_schedules = defaultdict(lambda: defaultdict(dict))
-                venue_free_hours = defaultdict(lambda: defaultdict(list))
-
-                for (year, section), timetable in generator.all_timetables.items():
-                    for day in generator.days:
-                        for slot in generator.slots:
-                            cell = timetable[day][slot]
-                            if isinstance(cell, dict) and 'venue' in cell:
-                                venue = cell['venue'].split(' - ')[0]  # Get venue number
-                                venue_schedules[venue][day][slot] = {
-                                    'year': year,
-                                    'section': section,
-                                    'code': cell['code'],
-                                    'teacher': cell['teacher']
-                                }
-                            elif slot not in ["BREAK", "LUNCH"]:
-                                for venue in venues:
-                                    if slot not in venue_schedules[venue].get(day, {}):
-                                        venue_free_hours[venue][day].append(slot)
-
-                # Save venue timetables
-                for venue_id, venue_name in venues.items():
-                    connection.execute(text(f"""
-                    INSERT INTO {schema_name}.venue_timetables 
-                    (venue_id, venue_name, timetable_data, free_hours)
-                    VALUES (:venue_id, :venue_name, :timetable_data, :free_hours)
-                    """), {
-                        'venue_id': venue_id,
-                        'venue_name': venue_name,
-                        'timetable_data': json.dumps(dict(venue_schedules[str(venue_id)])),
-                        'free_hours': json.dumps(dict(venue_free_hours[str(venue_id)]))
-                    })
-
-                logger.info(f"Timetables successfully saved in schema: {schema_name}")
-                return True
+        backend = storage.get_storage()
+        logger.info(f"Attempting to save timetables using the {backend.name} storage backend")
+
+        # Name this timetable generation; in versioned layouts this is the run_id
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        schema_name = f"timetable_{timestamp}"
+
+        projection = project_timetables(generator, venues)
+        projection.employee_ids = faculty_employee_ids(faculty_df)
+
+        backend.save_run(
+            schema_name,
+            projection,
+            seed=generator.seed,
+            input_hash=generator.input_hash,
+            stats={
+                'classes': len(projection.classes),
+                'teachers': len(projection.teachers),
+                'venues': len(projection.venue_names),
+                'cells': len(projection.cells),
+                'attempts': generator.attempts_used
+            }
+        )
+
+        catalog.invalidate_catalog()
+        logger.info(f"Timetables successfully saved as: {schema_name}")
+
+        # Excel export and summary are built in the background, ready before the first request
+        artifacts.schedule_artifacts(schema_name)
+        return True
 
     except Exception as e:
         logger.error(f"Database save error: {str(e)}", exc_info=True)
@@ -879,18 +778,22 @@ def prepare_timetable_data(form: dict, files: dict):
         os.makedirs(upload_dir, exist_ok=True)
 
         file_paths = {}
+        input_digest = hashlib.sha256(json.dumps(section_config, sort_keys=True).encode())
         for key in ['faculty', 'subjects', 'venues', 'cdc']:
             if key not in files:
                 raise ValueError(f"Missing required file: {key}")
             content = files[key]
             if hasattr(content, "read"):
                 content = content.read() if not callable(content.read) else content.read()
+            content = content if isinstance(content, bytes) else content.encode()
+            input_digest.update(content)
             file_path = os.path.join(upload_dir, f"{key}.csv")
             with open(file_path, "wb") as f:
-                f.write(content if isinstance(content, bytes) else content.encode())
+                f.write(content)
             file_paths[key] = file_path
 
         generator = GlobalTimeTableGenerator(section_config=section_config)
+        generator.input_hash = input_digest.hexdigest()
         generator.initialize_empty_timetables()
 
         faculty_df = pd.read_csv(file_paths['faculty'])
@@ -934,8 +837,7 @@ async def generate_timetable_fastapi(
             return {"status": "error", "message": "Failed to generate timetable after multiple attempts"}
 
         logger.info("Saving timetables to database")
-        connection_uri = os.getenv("DATABASE_URI")
-        saved = save_timetables_to_database(generator, all_sections_data, faculty_df, cdc_df, venues, connection_uri)
+        saved = save_timetables_to_database(generator, all_sections_data, faculty_df, cdc_df, venues)
 
         if not saved:
             return {"status": "error", "message": "Timetable generation succeeded but saving to DB failed"}
@@ -961,8 +863,7 @@ async def save_timetable_to_db_fastapi(
         generator, all_sections_data, faculty_df, cdc_df, venues = prepare_timetable_data(form, files)
 
         logger.info("Saving timetables to database")
-        connection_uri = os.getenv("DATABASE_URI")
-        saved = save_timetables_to_database(generator, all_sections_data, faculty_df, cdc_df, venues, connection_uri)
+        saved = save_timetables_to_database(generator, all_sections_data, faculty_df, cdc_df, venues)
 
         if not saved:
             return {"status": "error", "message": "Saving to DB failed"}
@@ -1039,8 +940,8 @@ async def fetch_venue_schedule(
         files = {"faculty": faculty, "subjects": subjects, "venues": venues, "cdc": cdc}
         form = {"sectionConfig": sectionConfig}
         files = {k: await v.read() for k, v in files.items()}
-        generator, *_ = prepare_timetable_data(form, files)
-        return get_venue_schedule(generator)
+        generator, _, _, _, venues = prepare_timetable_data(form, files)
+        return get_venue_schedule(generator, venues)
     except Exception as e:
         logger.error(f"Venue schedule fetch error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1057,10 +958,22 @@ def validate_timetable(generator: GlobalTimeTableGenerator, all_sections_data: D
     }
 
 def get_class_schedule(generator: GlobalTimeTableGenerator) -> Dict:
-    return generator.all_timetables
+    projection = project_timetables(generator, {})
+    return {
+        f"{year}-{section}": {"timetable": timetable, "free_hours": free_hours}
+        for year, section, timetable, free_hours in projection.class_entries()
+    }
 
 def get_teacher_schedule(generator: GlobalTimeTableGenerator) -> Dict:
-    return generator.global_teacher_schedule
+    projection = project_timetables(generator, {})
+    return {
+        teacher: {"timetable": timetable, "free_hours": free_hours}
+        for teacher, timetable, free_hours in projection.teacher_entries()
+    }
 
-def get_venue_schedule(generator: GlobalTimeTableGenerator) -> Dict:
-    return generator.global_venue_schedule
+def get_venue_schedule(generator: GlobalTimeTableGenerator, venues: Dict = None) -> Dict:
+    projection = project_timetables(generator, venues or current_venues or {})
+    return {
+        venue_id: {"venue_name": venue_name, "timetable": timetable, "free_hours": free_hours}
+        for venue_id, venue_name, timetable, free_hours in projection.venue_entries()
+    }
@@ -0,0 +1,116 @@
+import sys
+import json
+from array import array
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+# Leading byte of every packed grid and values table, bumped if the layout changes
+GRID_FORMAT_VERSION = 2
+
+# Bitmasks are 16-bit, one bit per slot
+_MAX_SLOTS = 16
+
+
+def _masks_to_bytes(masks: array) -> bytes:
+    # Stored little-endian whatever the host order
+    if sys.byteorder == 'big':
+        masks = array('H', masks)
+        masks.byteswap()
+    return masks.tobytes()
+
+
+def _masks_from_bytes(data: bytes) -> array:
+    masks = array('H')
+    masks.frombytes(data)
+    if sys.byteorder == 'big':
+        masks.byteswap()
+    return masks
+
+
+class GridValues(NamedTuple):
+    """
+    Decoded values table of one view of a run: the day and slot order, the
+    cells that packed grids index into, and the slot lists of each bitmask
+    decoded so far
+    """
+    days: List[str]
+    slots: List[str]
+    values: List
+    mask_slots: Dict[int, List[str]]
+
+
+class GridPacker:
+    """
+    Codes the timetables of one view of a run against a values table shared
+    by the whole view, holding each entity's cells in day and slot order.
+    A grid is then the offset of its first cell in that table, followed by a
+    bitmask per day of the slots that have a cell and one of the free hours.
+    Cells are coded by position rather than deduplicated: nearly every cell
+    of a view is distinct, so a dictionary would save nothing but cost a
+    lookup per cell.
+    """
+    def __init__(self, days: Sequence[str], slots: Sequence[str]):
+        if len(slots) > _MAX_SLOTS:
+            raise ValueError(f"Packed grids hold at most {_MAX_SLOTS} slots per day")
+        self.days = list(days)
+        self.slots = list(slots)
+        self.values: List = []
+        self._bits = {slot: 1 << slot_index for slot_index, slot in enumerate(self.slots)}
+
+    def pack(self, timetable: Dict, free_hours: Dict) -> bytes:
+        bits = self._bits
+        offset = len(self.values)
+        masks = array('H')
+        for day in self.days:
+            day_cells = timetable.get(day)
+            if not day_cells:
+                masks.append(0)
+                continue
+            self.values.extend([day_cells[slot] for slot in self.slots if slot in day_cells])
+            masks.append(sum(map(bits.__getitem__, day_cells)))
+        masks.extend(sum(map(bits.__getitem__, free_hours.get(day, ()))) for day in self.days)
+        return bytes([GRID_FORMAT_VERSION]) + offset.to_bytes(4, 'little') + _masks_to_bytes(masks)
+
+    def values_blob(self) -> bytes:
+        # Left uncompressed: it would cost more time on every save and cold read than it saves in bytes
+        body = json.dumps([self.days, self.slots, self.values], separators=(',', ':')).encode('utf-8')
+        return bytes([GRID_FORMAT_VERSION]) + body
+
+    def grid_values(self) -> GridValues:
+        return GridValues(self.days, self.slots, self.values, {})
+
+
+def unpack_values(blob: bytes) -> GridValues:
+    if blob[0] != GRID_FORMAT_VERSION:
+        raise ValueError(f"Unsupported packed values version: {blob[0]}")
+    days, slots, values = json.loads(blob[1:])
+    return GridValues(days, slots, values, {})
+
+
+def unpack_grid(blob: bytes, grid_values: GridValues) -> Tuple[Dict, Dict]:
+    """
+    Timetable and free hours from a packed grid, in the shapes stored as JSON.
+    Cell dicts are shared with the values table, so callers must not mutate them.
+    """
+    if blob[0] != GRID_FORMAT_VERSION:
+        raise ValueError(f"Unsupported packed grid version: {blob[0]}")
+    offset = int.from_bytes(blob[1:5], 'little')
+    masks = _masks_from_bytes(blob[5:])
+    days, slots, values, mask_slots = grid_values
+
+    def slots_of(mask):
+        day_slots = mask_slots.get(mask)
+        if day_slots is None:
+            day_slots = mask_slots[mask] = [slot for slot_index, slot in enumerate(slots) if mask >> slot_index & 1]
+        return day_slots
+
+    timetable = {}
+    free_hours = {}
+    for day, present, free in zip(days, masks, masks[len(days):]):
+        # Days without entries are absent, as in the JSON form
+        if present:
+            day_slots = slots_of(present)
+            timetable[day] = dict(zip(day_slots, values[offset:offset + len(day_slots)]))
+            offset += len(day_slots)
+        if free:
+            free_hours[day] = list(slots_of(free))
+    return timetable, free_hours
@@ -0,0 +1,117 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Optional
+
+import metrics
+import storage
+
+logger = logging.getLogger('timetable_api')
+
+# Seconds a database probe result is reused; probes in between answer from memory
+HEALTH_CHECK_INTERVAL = float(os.getenv('HEALTH_CHECK_INTERVAL', '15'))
+
+
+class HealthMonitor:
+    """
+    Last database probe and generator activity, so /health answers from
+    memory and the database sees at most one SELECT 1 per interval
+    """
+    def __init__(self, backend: storage.TimetableStorage, interval: float = HEALTH_CHECK_INTERVAL):
+        self.backend = backend
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._probe_lock = threading.Lock()
+        self._database: Dict = {"status": "unknown"}
+        self._probed_at: Optional[float] = None
+        self._generations = {"running": 0, "started": 0, "succeeded": 0, "failed": 0}
+        self._last_generation: Dict = {}
+
+    def due(self) -> bool:
+        with self._lock:
+            return self._probed_at is None or time.monotonic() - self._probed_at >= self.interval
+
+    def probe(self):
+        """
+        Ping the database through the pool unless the last result is still
+        fresh. Concurrent callers do not wait; they keep the cached result.
+        """
+        if not self._probe_lock.acquire(blocking=False):
+            return
+        try:
+            if not self.due():
+                return
+            started = time.perf_counter()
+            try:
+                self.backend.ping()
+                database = {"status": "connected"}
+            except Exception as e:
+                logger.error(f"Health check database probe failed: {e}")
+                database = {"status": "unreachable", "error": str(e)}
+            database["latency_ms"] = round((time.perf_counter() - started) * 1000, 3)
+            database["checked_at"] = datetime.now().isoformat()
+            with self._lock:
+                self._database = database
+                self._probed_at = time.monotonic()
+        finally:
+            self._probe_lock.release()
+
+    def refresh(self):
+        """
+        Start a probe on a background thread if one is due. Never waits for
+        it, since a ping can block for the pool's checkout timeout.
+        """
+        if self.due() and not self._probe_lock.locked():
+            threading.Thread(target=self.probe, name='health-probe', daemon=True).start()
+
+    def database(self) -> Dict:
+        with self._lock:
+            return dict(self._database)
+
+    @contextmanager
+    def track_generation(self):
+        """
+        Count a timetable generation as running until the block exits; it
+        succeeded if no exception escaped
+        """
+        started = time.perf_counter()
+        with self._lock:
+            self._generations["running"] += 1
+            self._generations["started"] += 1
+        outcome = "failed"
+        try:
+            yield
+            outcome = "succeeded"
+        finally:
+            metrics.GENERATIONS.inc(outcome=outcome)
+            with self._lock:
+                self._generations["running"] -= 1
+                self._generations[outcome] += 1
+                self._last_generation = {
+                    "outcome": outcome,
+                    "seconds": round(time.perf_counter() - started, 3),
+                    "finished_at": datetime.now().isoformat()
+                }
+
+    def generator_metrics(self) -> Dict:
+        with self._lock:
+            return {**self._generations, "last": dict(self._last_generation) or None}
+
+
+_monitor: Optional[HealthMonitor] = None
+_monitor_lock = threading.Lock()
+
+
+def get_monitor() -> HealthMonitor:
+    """
+    Process-wide health monitor over the configured storage backend
+    """
+    global _monitor
+    if _monitor is None:
+        with _monitor_lock:
+            if _monitor is None:
+                _monitor = HealthMonitor(storage.get_storage())
+    return _monitor
@@ -0,0 +1,54 @@
+import hashlib
+import threading
+from typing import Dict, Optional, Tuple
+
+# Named timetable schemas never change once written
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+# The "latest" views move when a new timetable is generated, so clients revalidate each time
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(schema_name: str, body: bytes) -> str:
+    """
+    Strong ETag over the schema name and the exact response bytes
+    """
+    digest = hashlib.sha256(schema_name.encode('utf-8') + b'\0' + body).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Whether an If-None-Match header value matches the given ETag
+    """
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(',')]
+    # If-None-Match uses weak comparison, so W/"x" matches "x"
+    return '*' in candidates or any(candidate.removeprefix('W/') == etag for candidate in candidates)
+
+
+class ETagCache:
+    """
+    ETags of rendered timetable resources keyed by (schema, resource), so a
+    conditional GET can be answered with 304 without reading the database
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._etags: Dict[Tuple[str, str], str] = {}
+
+    def get(self, schema_name: str, resource: str) -> Optional[str]:
+        with self._lock:
+            return self._etags.get((schema_name, resource))
+
+    def set(self, schema_name: str, resource: str, etag: str):
+        with self._lock:
+            self._etags[(schema_name, resource)] = etag
+
+    def invalidate_schema(self, schema_name: str):
+        with self._lock:
+            for key in [key for key in self._etags if key[0] == schema_name]:
+                del self._etags[key]
+
+
+etag_cache = ETagCache()
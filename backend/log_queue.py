@@ -0,0 +1,169 @@
+import os
+import copy
+import sys
+import json
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Optional
+
+# Log file, rotated at LOG_FILE_MAX_BYTES with LOG_FILE_BACKUPS old files kept
+LOG_FILE = os.getenv('LOG_FILE', 'timetable_api.log')
+LOG_FILE_MAX_BYTES = int(os.getenv('LOG_FILE_MAX_BYTES', str(10 * 1024 * 1024)))
+LOG_FILE_BACKUPS = int(os.getenv('LOG_FILE_BACKUPS', '5'))
+
+# "json" writes one JSON object per line; "text" keeps the plain format
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json').lower()
+
+# Messages (and tracebacks) longer than this many characters are cut, e.g. full subprocess output
+LOG_MAX_MESSAGE = int(os.getenv('LOG_MAX_MESSAGE', '4096'))
+
+# Records waiting for the writer thread; once full, new records are dropped rather than waited on
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+
+# Seconds shutdown waits for the writer to make room in a full queue for its stop signal
+LOG_STOP_TIMEOUT = float(os.getenv('LOG_STOP_TIMEOUT', '5'))
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+def truncate(text: str, limit: int = LOG_MAX_MESSAGE) -> str:
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [{len(text) - limit} more characters]"
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per record. Structured data passed as extra={"fields": {...}}
+    is merged into the object instead of being flattened into the message.
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName
+        }
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        fields = getattr(record, 'fields', None)
+        if isinstance(fields, dict):
+            entry.update(fields)
+        return json.dumps(entry, default=str)
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread without blocking. Messages are
+    rendered and capped here, since their arguments may change once the
+    caller returns; a full queue drops the record and counts it.
+    """
+    def __init__(self, log_queue: queue.Queue, max_message: int = LOG_MAX_MESSAGE):
+        super().__init__(log_queue)
+        self.max_message = max_message
+        self._lock = threading.Lock()
+        self.dropped = 0
+        self.truncated = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        message = record.getMessage()
+        exc_text = record.exc_text
+        if record.exc_info and not exc_text:
+            exc_text = logging.Formatter().formatException(record.exc_info)
+        if len(message) > self.max_message or (exc_text and len(exc_text) > self.max_message):
+            with self._lock:
+                self.truncated += 1
+        record = copy.copy(record)
+        record.msg = truncate(message, self.max_message)
+        record.args = None
+        record.exc_info = None
+        record.exc_text = truncate(exc_text, self.max_message) if exc_text else None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            return {
+                "queued": self.queue.qsize(),
+                "capacity": self.queue.maxsize,
+                "dropped": self.dropped,
+                "truncated": self.truncated
+            }
+
+
+class DrainingQueueListener(QueueListener):
+    """
+    Waits for room for its stop sentinel. The stock listener uses put_nowait,
+    which raises queue.Full when shutdown finds the queue full.
+    """
+    def __init__(self, log_queue: queue.Queue, *handlers, stop_timeout: float = LOG_STOP_TIMEOUT, **kwargs):
+        super().__init__(log_queue, *handlers, **kwargs)
+        self.stop_timeout = stop_timeout
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel, timeout=self.stop_timeout)
+
+
+_handler: Optional[BoundedQueueHandler] = None
+_listener: Optional[DrainingQueueListener] = None
+_setup_lock = threading.Lock()
+
+
+def configure(name: str = 'timetable_api') -> logging.Logger:
+    """
+    Route the logger through a bounded queue to a background thread that
+    owns the rotating file and console handlers, so file writes and
+    rotation never happen on the request path
+    """
+    global _handler, _listener
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+
+    with _setup_lock:
+        if _handler is not None:
+            return logger
+
+        formatter = JsonFormatter() if LOG_FORMAT == 'json' else logging.Formatter(TEXT_FORMAT)
+        file_handler = RotatingFileHandler(LOG_FILE, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS)
+        console_handler = logging.StreamHandler()
+        file_handler.setFormatter(formatter)
+        console_handler.setFormatter(formatter)
+
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        _handler = BoundedQueueHandler(log_queue)
+        _listener = DrainingQueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+        _listener.start()
+        logger.addHandler(_handler)
+        # Records still queued at exit are written before the process ends
+        atexit.register(stop)
+    return logger
+
+
+def queue_metrics() -> Optional[Dict]:
+    return _handler.metrics() if _handler is not None else None
+
+
+def stop():
+    """
+    Write out queued records and stop the writer thread
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            try:
+                _listener.stop()
+            except queue.Full:
+                # The writer is stuck; it is a daemon thread, so exit without it
+                sys.stderr.write(f"Log writer did not drain within {_listener.stop_timeout}s, stopping without it\n")
+            _listener = None
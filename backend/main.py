@@ -1,60 +1,57 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Query, Depends, Response
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Query, Depends, Request, Response
+from fastapi.routing import APIRoute
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Optional
-import mysql.connector
-from mysql.connector import Error as MySQLError
+from typing import Iterator, List, Optional
 import os
 import re
+import time
+import asyncio
+import random
+import base64
 import traceback    
-import logging
-from logging.handlers import RotatingFileHandler
 from dotenv import load_dotenv
 import subprocess
 import json
 from datetime import datetime
-import bcrypt
 from pydantic import BaseModel, Field, field_validator
-from fastapi.responses import FileResponse, Response
-from openpyxl import Workbook
-from io import BytesIO
-import zipfile
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from contextlib import asynccontextmanager
+from starlette.concurrency import run_in_threadpool
+from anyio import to_thread
+
+# Load environment variables before the local modules read their settings
+load_dotenv()
 
 from gentt import (
     GlobalTimeTableGenerator,
     prepare_timetable_data,
     validate_timetable,
     save_timetables_to_database)
-
-# Load environment variables
-load_dotenv()
+import artifacts
+import auth
+import catalog
+import compact
+import connection_pool
+import excel_export
+import health
+import http_cache
+import log_queue
+import memtrace
+import metrics
+import profiling
+import server_timing
+import storage
+from storage import RunNotFoundError
+from projection import dump_view_json
 
 # Configure logging
 def setup_logging():
-    logger = logging.getLogger('timetable_api')
-    logger.setLevel(logging.INFO)
-    
-    # File handler with log rotation
-    file_handler = RotatingFileHandler(
-        'timetable_api.log', 
-        maxBytes=10*1024*1024,  # 10MB
-        backupCount=5
-    )
-    # Console handler
-    console_handler = logging.StreamHandler()
-    
-    # Formatter
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-    
-    file_handler.setFormatter(formatter)
-    console_handler.setFormatter(formatter)
-    
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-    
-    return logger
+    """
+    Queue-backed logging: requests only enqueue records, and a background
+    thread formats them (JSON by default) and writes the rotating file
+    """
+    return log_queue.configure('timetable_api')
 
 # Initialize logger
 logger = setup_logging()
@@ -72,6 +69,9 @@ PREDEFINED_DAYS = [
     "Monday", "Tuesday", "Wednesday", "Thursday", "Friday"
 ]
 
+# Worker threads for sync handlers and offloaded blocking calls (database, Excel, subprocess waits)
+API_WORKER_THREADS = int(os.getenv('API_WORKER_THREADS', '40'))
+
 # Add lifespan function before app creation
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -83,6 +83,19 @@ async def lifespan(app: FastAPI):
     logger.info(f"Predefined Slots: {PREDEFINED_SLOTS}")
     logger.info(f"Predefined Days: {PREDEFINED_DAYS}")
 
+    # Blocking work never runs on the event loop; size the worker pool it is offloaded to
+    to_thread.current_default_thread_limiter().total_tokens = API_WORKER_THREADS
+    logger.info(f"Worker threads for blocking calls: {API_WORKER_THREADS}")
+
+    if not os.getenv('AUTH_TOKEN_SECRET'):
+        logger.warning("AUTH_TOKEN_SECRET is not set; using a per-process key, sessions end on restart")
+
+    # Create the backend's tables and apply pending column and index migrations
+    try:
+        await run_in_threadpool(storage.get_storage().initialize)
+    except Exception as e:
+        logger.error(f"Storage initialization failed, retrying on first use: {e}")
+
     uploads_dir = "uploads"
     os.makedirs(uploads_dir, exist_ok=True)
 
@@ -101,6 +114,21 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Error during shutdown cleanup: {e}")
 
+    connection_pool.dispose_pool()
+    auth.shutdown_password_hasher()
+    artifacts.shutdown_pipeline()
+    excel_export.shutdown_exporter()
+
+class BoundRoute(APIRoute):
+    """
+    Route whose sync endpoint marks the worker thread running it as working
+    for the request, so a profile of the request samples that thread
+    """
+    def __init__(self, path: str, endpoint, **kwargs):
+        if not asyncio.iscoroutinefunction(endpoint):
+            endpoint = server_timing.bound(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
 # Create FastAPI app with lifespan
 app = FastAPI(
     title="Timetable and Allocator API",
@@ -108,6 +136,7 @@ app = FastAPI(
     version="1.0.0",
     lifespan=lifespan
 )
+app.router.route_class = BoundRoute
 
 # CORS Middleware
 app.add_middleware(
@@ -123,6 +152,103 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def observe_request(request: Request, call_next):
+    """
+    Latency per route template, so /api/timetable/{schema_name} is one series however
+    many schemas exist, a Server-Timing breakdown of where the request spent its time,
+    and a sampling profile when a PROFILE_ADMINS user asks for one (X-Profile or ?profile=1)
+    """
+    timings = server_timing.start()
+    profile_status, profile = profiling.start(request, timings)
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        # Streamed bodies are still being written; the breakdown covers the time to headers
+        if server_timing.SERVER_TIMING_ENABLED:
+            response.headers["Server-Timing"] = timings.header()
+        if profile_status:
+            response.headers["X-Profile-Status"] = profile_status
+        if profile:
+            response.headers["X-Profile-Id"] = await run_in_threadpool(profile.finish, status)
+            profile = None
+        return response
+    finally:
+        if profile:
+            await run_in_threadpool(profile.finish, status)
+        # Set by the router once a route matched
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        elapsed_ms = timings.elapsed_ms()
+        metrics.REQUEST_SECONDS.observe(elapsed_ms / 1000, method=request.method, route=route, status=status)
+        if elapsed_ms >= server_timing.SERVER_TIMING_SLOW_MS or random.random() < server_timing.SERVER_TIMING_LOG_SAMPLE:
+            logger.info(f"{request.method} {request.url.path} {status} in {elapsed_ms:.1f} ms", extra={"fields": {
+                "event": "request_timing",
+                "method": request.method,
+                "route": route,
+                "path": request.url.path,
+                "status": status,
+                "total_ms": round(elapsed_ms, 3),
+                "steps": timings.steps()
+            }})
+
+def pool_sample(field: str):
+    pool = connection_pool.pool_metrics()
+    return pool[field] if pool else None
+
+def pool_connections():
+    pool = connection_pool.pool_metrics()
+    return {state: pool[state] for state in ("checked_out", "checked_in", "overflow")} if pool else None
+
+# Read from the components when /metrics is scraped; omitted until a component is first used
+metrics.REGISTRY.callback(
+    "timetable_db_pool_connections", "MySQL pool connections by state", pool_connections, ("state",)
+)
+metrics.REGISTRY.callback(
+    "timetable_db_pool_saturation", "Share of the pool's maximum connections checked out",
+    lambda: pool_sample("saturation")
+)
+metrics.REGISTRY.callback(
+    "timetable_db_pool_checkouts_total", "Connections checked out of the MySQL pool",
+    lambda: pool_sample("checkouts"), kind="counter"
+)
+metrics.REGISTRY.callback(
+    "timetable_db_pool_checkout_failures_total", "Checkouts that failed or timed out",
+    lambda: pool_sample("failures"), kind="counter"
+)
+metrics.REGISTRY.callback(
+    "timetable_worker_threads_busy", "API worker threads running blocking calls",
+    lambda: to_thread.current_default_thread_limiter().borrowed_tokens
+)
+metrics.REGISTRY.callback(
+    "timetable_password_hasher_queued", "Password checks waiting for a bcrypt worker",
+    lambda: (auth.hasher_metrics() or {}).get("queued")
+)
+metrics.REGISTRY.callback(
+    "timetable_artifact_jobs", "Post-save artifact jobs by status",
+    artifacts.pipeline_metrics, ("status",)
+)
+metrics.REGISTRY.callback(
+    "timetable_memory_peak_bytes", "Peak traced memory of the last generate, save and Excel export (MEMORY_TRACE)",
+    lambda: memtrace.last_peaks() or None, ("section",)
+)
+metrics.REGISTRY.callback(
+    "timetable_log_queue_records", "Log records waiting for the writer thread",
+    lambda: (log_queue.queue_metrics() or {}).get("queued")
+)
+metrics.REGISTRY.callback(
+    "timetable_log_records_dropped_total", "Log records dropped because the log queue was full",
+    lambda: (log_queue.queue_metrics() or {}).get("dropped"), kind="counter"
+)
+metrics.REGISTRY.callback(
+    "timetable_log_records_truncated_total", "Log records cut to LOG_MAX_MESSAGE characters",
+    lambda: (log_queue.queue_metrics() or {}).get("truncated"), kind="counter"
+)
+metrics.REGISTRY.callback(
+    "timetable_generations_running", "Timetable generations in progress",
+    lambda: health.get_monitor().generator_metrics()["running"]
+)
+
 # Pydantic Models
 class LoginRequest(BaseModel):
     username: str = Field(..., min_length=1)
@@ -157,124 +283,26 @@ class ChangePasswordRequest(BaseModel):
         
         return v
 
-# Database Connection Functions
-def get_db_connection():
-    """
-    Establish database connection
-    """
-    try:
-        conn = mysql.connector.connect(
-            host=os.getenv('DB_HOST'),
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD'),
-            database=os.getenv('DB_NAME'),
-            port=int(os.getenv('DB_PORT'))
-        )
-        return conn
-    except MySQLError as err:
-        logger.error(f"Database connection error: {err}")
-        raise HTTPException(
-            status_code=500, 
-            detail=f"Database connection error: {str(err)}"
-        )
-
-def get_login_db_connection():
-    """
-    Establish connection to login database with better error handling
-    """
-    try:
-        # Try to get port from environment, default to 20721 if not set
-        port = os.getenv('DB_PORT', '20721')
-        
-        # Validate port
-        try:
-            port = int(port)
-        except ValueError:
-            logger.error(f"Invalid DB_PORT value: {port}")
-            port = 20721  # Use default port if invalid
-        
-        # Get other connection parameters with defaults
-        host = os.getenv('DB_HOST', 'localhost')
-        user = os.getenv('DB_USER', 'root')
-        password = os.getenv('DB_PASSWORD', '')
-        
-        conn = mysql.connector.connect(
-            host=host,
-            user=user,
-            password=password,
-            database='login_details',
-            port=port,
-            ssl_disabled=False
-        )
-        return conn
-    except MySQLError as err:
-        logger.error(f"Login database connection error: {err}")
-        raise HTTPException(
-            status_code=500,
-            detail=f"Database connection error: {str(err)}"
-        )
-    except Exception as e:
-        logger.error(f"Unexpected error in database connection: {e}")
-        raise HTTPException(
-            status_code=500,
-            detail="Internal server error while connecting to database"
-        )
-
 # Helper Functions
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """
-    Verify password against hashed version
-    """
-    try:
-        return bcrypt.checkpw(
-            plain_password.encode('utf-8'),
-            hashed_password.encode('utf-8')
-        )
-    except Exception as e:
-        logger.error(f"Password verification error: {e}")
-        return False
-
-def hash_password(password: str) -> str:
-    """
-    Hash password using bcrypt
-    """
-    try:
-        return bcrypt.hashpw(
-            password.encode('utf-8'),
-            bcrypt.gensalt()
-        ).decode('utf-8')
-    except Exception as e:
-        logger.error(f"Password hashing error: {e}")
-        raise HTTPException(
-            status_code=500,
-            detail="Password hashing failed"
-        )
-
-def find_latest_timetable_schema(cursor):
+def find_latest_timetable_schema():
     """
     Find the most recent timetable schema
     """
     try:
-        cursor.execute("SHOW DATABASES")
-        databases = cursor.fetchall()
-        logger.info(f"Available databases: {databases}")
+        latest_schema = catalog.get_catalog().latest_run()
 
-        timetable_schemas = [
-            db['Database'] for db in databases 
-            if str(db['Database']).startswith('timetable_')
-        ]
-
-        if not timetable_schemas:
+        if not latest_schema:
             raise HTTPException(
                 status_code=404, 
                 detail="No timetable schema found"
             )
 
-        latest_schema = sorted(timetable_schemas, reverse=True)[0]
         logger.info(f"Selected schema: {latest_schema}")
 
         return latest_schema
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error finding timetable schema: {e}")
         raise HTTPException(
@@ -326,23 +354,14 @@ def safe_json_parse(json_data):
 
 # Authentication Endpoints
 @app.post("/api/login")
-async def login(login_data: LoginRequest):
+def login(login_data: LoginRequest):
     """
     Handle user login
     """
-    conn = None
-    cursor = None
     try:
         logger.info(f"Login attempt for user: {login_data.username}")
         
-        conn = get_login_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        cursor.execute(
-            "SELECT * FROM users WHERE username = %s",
-            (login_data.username,)
-        )
-        user = cursor.fetchone()
+        user = storage.get_storage().fetch_user(login_data.username)
 
         if not user:
             logger.warning(f"Login failed: User not found - {login_data.username}")
@@ -351,7 +370,7 @@ async def login(login_data: LoginRequest):
                 detail="Invalid credentials"
             )
 
-        if not verify_password(login_data.password, user['password']):
+        if not auth.get_password_hasher().verify(login_data.password, user['password']):
             logger.warning(f"Login failed: Invalid password - {login_data.username}")
             raise HTTPException(
                 status_code=401,
@@ -359,44 +378,41 @@ async def login(login_data: LoginRequest):
             )
 
         logger.info(f"Successful login: {login_data.username}")
+        session = auth.issue_token(user['username'])
         return {
             "success": True,
             "message": "Login successful",
-            "username": user['username']
+            "username": user['username'],
+            "token": session['token'],
+            "token_type": "bearer",
+            "expires_at": session['expires_at']
         }
 
     except HTTPException:
         raise
+    except auth.PasswordHasherBusy as e:
+        logger.warning(f"Login rejected, password hashing saturated: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="Too many login attempts in progress, please retry shortly",
+            headers={"Retry-After": "1"}
+        )
     except Exception as e:
         logger.error(f"Login error: {str(e)}\n{traceback.format_exc()}")
         raise HTTPException(
             status_code=500,
             detail="Server error"
         )
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 @app.post("/api/change-password")
-async def change_password(change_pwd_data: ChangePasswordRequest):
+def change_password(change_pwd_data: ChangePasswordRequest):
     """
     Handle password change
     """
-    conn = None
-    cursor = None
     try:
         logger.info(f"Password change attempt for user: {change_pwd_data.username}")
         
-        conn = get_login_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        cursor.execute(
-            "SELECT * FROM users WHERE username = %s",
-            (change_pwd_data.username,)
-        )
-        user = cursor.fetchone()
+        user = storage.get_storage().fetch_user(change_pwd_data.username)
 
         if not user:
             logger.warning(f"Password change failed: User not found - {change_pwd_data.username}")
@@ -405,20 +421,15 @@ async def change_password(change_pwd_data: ChangePasswordRequest):
                 detail="User not found"
             )
 
-        if not verify_password(change_pwd_data.oldPassword, user['password']):
+        if not auth.get_password_hasher().verify(change_pwd_data.oldPassword, user['password']):
             logger.warning(f"Password change failed: Invalid current password - {change_pwd_data.username}")
             raise HTTPException(
                 status_code=401,
                 detail="Current password is incorrect"
             )
 
-        hashed_new_password = hash_password(change_pwd_data.newPassword)
-        
-        cursor.execute(
-            "UPDATE users SET password = %s WHERE username = %s",
-            (hashed_new_password, change_pwd_data.username)
-        )
-        conn.commit()
+        hashed_new_password = auth.get_password_hasher().hash(change_pwd_data.newPassword)
+        storage.get_storage().update_password(change_pwd_data.username, hashed_new_password)
 
         logger.info(f"Password changed successfully: {change_pwd_data.username}")
         return {
@@ -428,164 +439,237 @@ async def change_password(change_pwd_data: ChangePasswordRequest):
 
     except HTTPException:
         raise
+    except auth.PasswordHasherBusy as e:
+        logger.warning(f"Password change rejected, password hashing saturated: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="Too many password requests in progress, please retry shortly",
+            headers={"Retry-After": "1"}
+        )
     except Exception as e:
         logger.error(f"Password change error: {str(e)}\n{traceback.format_exc()}")
         raise HTTPException(
             status_code=500,
             detail="Server error"
         )
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
-# Timetable Management Endpoints
-@app.get("/api/timetables/classes")
-def get_class_timetables():
+def format_timetable_rows(rows, fields):
     """
-    Retrieve class timetables
+    Shape stored timetable rows for the API, keeping the given identifying fields
     """
-    conn = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        latest_schema = find_latest_timetable_schema(cursor)
-        conn.database = latest_schema
-        cursor = conn.cursor(dictionary=True)
-        
-        cursor.execute("""
-            SELECT 
-                year, 
-                section, 
-                timetable_data, 
-                free_hours, 
-                generated_at
-            FROM class_timetables
-            ORDER BY year, section
-        """)
-        
-        class_timetables = cursor.fetchall()
-        
-        formatted_timetables = [
+    with server_timing.step("transform"):
+        return [
             {
-                "year": row['year'],
-                "section": row['section'],
+                **{field: row[field] for field in fields},
                 "timetable": rearrange_timetable_data(safe_json_parse(row['timetable_data'])),
                 "free_hours": safe_json_parse(row['free_hours']),
                 "generated_at": str(row['generated_at']) if row['generated_at'] else None
             }
-            for row in class_timetables
+            for row in rows
         ]
-        
-        return formatted_timetables
+
+def cache_headers(etag: str, cache_control: str) -> dict:
+    """
+    Validator and caching headers of a tagged response, sent alike with its 200 and 304
+    """
+    return {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept"}
+
+def not_modified_response(request: Request, schema_name: str, resource: str, cache_control: str):
+    """
+    304 response if the client already holds the current rendering of this resource
+    """
+    etag = http_cache.etag_cache.get(schema_name, resource)
+    if etag and http_cache.etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=cache_headers(etag, cache_control))
+    return None
+
+def json_body(payload) -> bytes:
+    with server_timing.step("serialize"):
+        return dump_view_json(jsonable_encoder(payload)).encode('utf-8')
+
+def etag_response(request: Request, schema_name: str, resource: str, body: bytes, cache_control: str,
+                  media_type: str = "application/json") -> Response:
+    """
+    Tag a serialized body with a strong ETag and remember the tag for later 304s.
+    The fresh tag is also checked against If-None-Match, so clients revalidate
+    even when another worker process rendered their copy.
+    """
+    with server_timing.step("etag"):
+        etag = http_cache.make_etag(schema_name, body)
+    http_cache.etag_cache.set(schema_name, resource, etag)
+    if http_cache.etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=cache_headers(etag, cache_control))
+    return Response(content=body, media_type=media_type, headers=cache_headers(etag, cache_control))
+
+def timetable_rows_body(backend, schema_name: str, table: str, fields) -> bytes:
+    """
+    JSON array of view rows, joined from the rows pre-rendered at save time when the run has them
+    """
+    rendered = backend.fetch_rendered(schema_name, table)
+    if rendered is None:
+        return json_body(format_timetable_rows(backend.fetch_timetables(schema_name, table), fields))
+    return ('[' + ','.join(rendered) + ']').encode('utf-8')
+
+# View tables making up a timetable run, with the key and identifying fields of each
+TIMETABLE_VIEWS = [
+    ("classes", "class_timetables", ("year", "section")),
+    ("teachers", "teacher_timetables", ("employee_id", "teacher_name")),
+    ("venues", "venue_timetables", ("venue_id", "venue_name"))
+]
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+RESPONSE_FORMATS = ('json', 'ndjson', 'compact')
+
+def response_format(request: Request, output: Optional[str]) -> str:
+    """
+    Representation the client asked for, by ?format= or the Accept header:
+    json (default), ndjson (streamed) or compact (columnar, see compact.py)
+    """
+    if output:
+        if output not in RESPONSE_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Invalid format: {output}. Use one of {', '.join(RESPONSE_FORMATS)}")
+        return output
+    accept = request.headers.get('accept', '')
+    if NDJSON_MEDIA_TYPE in accept:
+        return 'ndjson'
+    if compact.COMPACT_MEDIA_TYPE in accept:
+        return 'compact'
+    return 'json'
+
+def timetable_view_rows(backend, schema_name: str, table: str, fields) -> List[dict]:
+    """
+    View rows as Python objects, parsed from the pre-rendered rows when the run has them
+    """
+    rendered = backend.fetch_rendered(schema_name, table)
+    if rendered is None:
+        return format_timetable_rows(backend.fetch_timetables(schema_name, table), fields)
+    with server_timing.step("parse"):
+        return [json.loads(value) for value in rendered]
+
+def compact_timetables(backend, schema_name: str, views) -> dict:
+    """
+    Compact encoding of the given (key, table, fields) views of a run
+    """
+    rows = {key: timetable_view_rows(backend, schema_name, table, fields) for key, table, fields in views}
+    with server_timing.step("encode"):
+        return compact.encode_views(rows, {key: fields for key, _, fields in views}, PREDEFINED_DAYS, PREDEFINED_SLOTS)
+
+def timetable_row_stream(backend, schema_name: str, table: str, fields) -> Iterator[bytes]:
+    """
+    Encoded view rows one at a time as they are read, never holding the whole table
+    """
+    rendered = backend.stream_rendered(schema_name, table)
+    if rendered is not None:
+        return (value.encode('utf-8') for value in rendered)
+    return (
+        json_body(format_timetable_rows([row], fields)[0])
+        for row in backend.iter_timetables(schema_name, table)
+    )
+
+def ndjson_lines_or_error(lines: Iterator[bytes]) -> Iterator[bytes]:
+    """
+    The lines, then a final {"error": "..."} line in place of the rest if reading
+    fails mid-stream. The 200 status is already sent by then, so clients must
+    treat a line with an "error" key as a truncated response.
+    """
+    try:
+        yield from lines
+    except Exception as e:
+        logger.error(f"NDJSON stream failed: {e}")
+        yield json_body({"error": f"Stream interrupted: {e}"}) + b'\n'
+
+def ndjson_response(lines: Iterator[bytes]) -> StreamingResponse:
+    """
+    Chunked response written line by line; not ETagged, since the body is never held in full
+    """
+    return StreamingResponse(
+        ndjson_lines_or_error(lines),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={"Cache-Control": "private, no-store"}
+    )
+
+def timetable_listing_response(request: Request, output: Optional[str], key: str):
+    """
+    One view of the latest run, as a tagged JSON array, a streamed NDJSON listing or compact
+    """
+    view = next(view for view in TIMETABLE_VIEWS if view[0] == key)
+    _, table, fields = view
+    schema_name = find_latest_timetable_schema()
+    output = response_format(request, output)
+    
+    if output == 'ndjson':
+        rows = timetable_row_stream(storage.get_storage(), schema_name, table, fields)
+        return ndjson_response(row + b'\n' for row in rows)
+    
+    resource = table if output == 'json' else f"{table}:compact"
+    not_modified = not_modified_response(request, schema_name, resource, http_cache.REVALIDATE_CACHE_CONTROL)
+    if not_modified:
+        return not_modified
+    
+    if output == 'compact':
+        body = json_body(compact_timetables(storage.get_storage(), schema_name, [view]))
+        return etag_response(request, schema_name, resource, body, http_cache.REVALIDATE_CACHE_CONTROL, compact.COMPACT_MEDIA_TYPE)
+    
+    body = timetable_rows_body(storage.get_storage(), schema_name, table, fields)
+    
+    return etag_response(request, schema_name, resource, body, http_cache.REVALIDATE_CACHE_CONTROL)
+
+# Timetable Management Endpoints
+@app.get("/api/timetables/classes", dependencies=[Depends(auth.require_auth)])
+def get_class_timetables(request: Request, output: Optional[str] = Query(default=None, alias="format")):
+    """
+    Retrieve class timetables; format=ndjson streams one class per line, format=compact is columnar
+    """
+    try:
+        return timetable_listing_response(request, output, 'classes')
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error retrieving class timetables: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
-    
-    finally:
-        if conn:
-            conn.close()
 
-@app.get("/api/timetables/teachers")
-def get_teacher_timetables():
+@app.get("/api/timetables/teachers", dependencies=[Depends(auth.require_auth)])
+def get_teacher_timetables(request: Request, output: Optional[str] = Query(default=None, alias="format")):
     """
-    Retrieve teacher timetables
+    Retrieve teacher timetables; format=ndjson streams one teacher per line, format=compact is columnar
     """
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        latest_schema = find_latest_timetable_schema(cursor)
-        conn.database = latest_schema
-        cursor = conn.cursor(dictionary=True)
-        
-        cursor.execute("""
-            SELECT 
-                employee_id, 
-                teacher_name, 
-                timetable_data, 
-                free_hours, 
-                generated_at
-            FROM teacher_timetables
-            ORDER BY teacher_name
-        """)
-        
-        teacher_timetables = cursor.fetchall()
-        
-        formatted_timetables = [
-            {
-                "employee_id": row['employee_id'],
-                "teacher_name": row['teacher_name'],
-                "timetable": rearrange_timetable_data(safe_json_parse(row['timetable_data'])),
-                "free_hours": safe_json_parse(row['free_hours']),
-                "generated_at": str(row['generated_at']) if row['generated_at'] else None
-            }
-            for row in teacher_timetables
-        ]
-        
-        return formatted_timetables
+        return timetable_listing_response(request, output, 'teachers')
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error retrieving teacher timetables: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
-    
-    finally:
-        if conn:
-            conn.close()
 
-@app.get("/api/timetables/venues")
-def get_venue_timetables():
+@app.get("/api/timetables/venues", dependencies=[Depends(auth.require_auth)])
+def get_venue_timetables(request: Request, output: Optional[str] = Query(default=None, alias="format")):
     """
-    Retrieve venue timetables
+    Retrieve venue timetables; format=ndjson streams one venue per line, format=compact is columnar
     """
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        latest_schema = find_latest_timetable_schema(cursor)
-        conn.database = latest_schema
-        cursor = conn.cursor(dictionary=True)
-        
-        cursor.execute("""
-            SELECT 
-                venue_id, 
-                venue_name, 
-                timetable_data, 
-                free_hours, 
-                generated_at
-            FROM venue_timetables
-            ORDER BY venue_name
-        """)
-        
-        venue_timetables = cursor.fetchall()
-        
-        formatted_timetables = [
-            {
-                "venue_id": row['venue_id'],
-                "venue_name": row['venue_name'],
-                "timetable": rearrange_timetable_data(safe_json_parse(row['timetable_data'])),
-                "free_hours": safe_json_parse(row['free_hours']),
-                "generated_at": str(row['generated_at']) if row['generated_at'] else None
-            }
-            for row in venue_timetables
-        ]
-        
-        return formatted_timetables
+        return timetable_listing_response(request, output, 'venues')
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error retrieving venue timetables: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
-    
-    finally:
-        if conn:
-            conn.close()
 
 # File Processing Endpoints
+def require_allocation_pipeline():
+    """
+    The allocation scripts write MySQL-specific SQL and need a MySQL backend
+    """
+    backend = storage.get_storage()
+    if not backend.supports_allocation_pipeline():
+        raise HTTPException(
+            status_code=501,
+            detail=f"Department file processing is not available with the {backend.name} storage backend"
+        )
+
 @app.post("/api/process-year-files")
 async def process_year_files(
     department_name: str = Form(...),
@@ -594,6 +678,8 @@ async def process_year_files(
     """
     Process year files for a specific department
     """
+    require_allocation_pipeline()
+    
     try:
         upload_dir = "uploads"
         os.makedirs(upload_dir, exist_ok=True)
@@ -610,6 +696,7 @@ async def process_year_files(
             
             file_paths.append(file_path)
         
+        started = time.perf_counter()
         process = subprocess.Popen([
             'python', 
             'process_year_files.py',
@@ -621,7 +708,15 @@ async def process_year_files(
             text=True
         )
         
-        stdout, stderr = process.communicate()
+        stdout, stderr = await run_in_threadpool(process.communicate)
+        metrics.ALLOCATION_SECONDS.observe(
+            time.perf_counter() - started,
+            script="process_year_files", outcome="succeeded" if process.returncode == 0 else "failed"
+        )
+        
+        # The script may have created the department schema or rewritten its tables
+        catalog.invalidate_catalog()
+        catalog.invalidate_department(department_name)
         
         for file_path in file_paths:
             try:
@@ -665,6 +760,8 @@ async def process_faculty_files(
     """
     Process faculty files for a specific department
     """
+    require_allocation_pipeline()
+    
     try:
         upload_dir = "uploads"
         os.makedirs(upload_dir, exist_ok=True)
@@ -688,6 +785,7 @@ async def process_faculty_files(
             buffer.write(content)
             logger.info(f"Faculty preferences file saved. Size: {len(content)} bytes")
         
+        started = time.perf_counter()
         process = subprocess.Popen([
             'python', 
             'process_faculty_files.py',
@@ -701,10 +799,13 @@ async def process_faculty_files(
         )
 
         try:
-            stdout, stderr = process.communicate(timeout=600)  # 10-minute timeout
+            stdout, stderr = await run_in_threadpool(process.communicate, timeout=600)  # 10-minute timeout
         except subprocess.TimeoutExpired:
             process.kill()
             stdout, stderr = process.communicate()
+            metrics.ALLOCATION_SECONDS.observe(
+                time.perf_counter() - started, script="process_faculty_files", outcome="timeout"
+            )
             logger.error("Faculty files processing timed out")
             return {
                 "success": False,
@@ -715,9 +816,16 @@ async def process_faculty_files(
                 }
             }
         
+        metrics.ALLOCATION_SECONDS.observe(
+            time.perf_counter() - started,
+            script="process_faculty_files", outcome="succeeded" if process.returncode == 0 else "failed"
+        )
         logger.info(f"STDOUT: {stdout}")
         logger.error(f"STDERR: {stderr}")
         
+        catalog.invalidate_catalog()
+        catalog.invalidate_department(department_name)
+        
         try:
             os.unlink(faculty_list_path)
             os.unlink(faculty_pref_path)
@@ -762,44 +870,20 @@ async def process_faculty_files(
         )
 
 @app.get("/api/schemas")
-async def get_schemas():
+def get_schemas():
     """
     Retrieve all available database schemas
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        filtered_schemas = catalog.get_catalog().departments()
         
-        cursor.execute('SHOW DATABASES')
-        databases = cursor.fetchall()
-        
-        logger.info(f"Available databases: {databases}")
-        
-        system_schemas = [
-            'defaultdb', 'information_schema', 
-            'mysql', 'performance_schema', 'sys', 'login_details'
-        ]
-        
-        filtered_schemas = [
-            db['Database'] for db in databases 
-            if db['Database'].lower() not in system_schemas 
-            and not db['Database'].lower().startswith('timetable')
-        ]
-        
-        cursor.close()
-        conn.close()
+        logger.info(f"Available departments: {filtered_schemas}")
         
         return {
             "success": True,
             "schemas": filtered_schemas
         }
     
-    except mysql.connector.Error as err:
-        logger.error(f"Database error: {err}")
-        raise HTTPException(
-            status_code=500, 
-            detail=f"Database connection error: {str(err)}"
-        )
     except Exception as e:
         logger.error(f"Unexpected error: {e}")
         raise HTTPException(
@@ -808,12 +892,10 @@ async def get_schemas():
         )
 
 @app.delete("/api/department/{department_name}")
-async def delete_department(department_name: str):
+def delete_department(department_name: str):
     """
     Delete a department (schema) from the database
     """
-    conn = None
-    cursor = None
     try:
         # Validate department name
         if not department_name:
@@ -823,10 +905,7 @@ async def delete_department(department_name: str):
             )
         
         # System schemas that should not be deleted
-        protected_schemas = [
-            'defaultdb', 'information_schema', 'mysql', 
-            'performance_schema', 'sys', 'login_details'
-        ]
+        protected_schemas = storage.SYSTEM_SCHEMAS + [storage.STORE_SCHEMA.lower()]
         
         if department_name.lower() in protected_schemas:
             raise HTTPException(
@@ -834,20 +913,6 @@ async def delete_department(department_name: str):
                 detail=f"Cannot delete protected schema: {department_name}"
             )
         
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        # Check if schema exists
-        cursor.execute('SHOW DATABASES')
-        databases = cursor.fetchall()
-        available_schemas = [db['Database'] for db in databases]
-        
-        if department_name not in available_schemas:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Department '{department_name}' not found"
-            )
-        
         # Check if it's a timetable schema (don't delete those from this endpoint)
         if department_name.startswith('timetable_'):
             raise HTTPException(
@@ -855,12 +920,21 @@ async def delete_department(department_name: str):
                 detail="Use the timetable deletion endpoint for timetable schemas"
             )
         
+        # Check if department exists
+        if department_name not in catalog.get_catalog().departments():
+            raise HTTPException(
+                status_code=404,
+                detail=f"Department '{department_name}' not found"
+            )
+        
         # Log the deletion attempt
         logger.info(f"Attempting to delete department: {department_name}")
         
-        # Drop the database
-        cursor.execute(f"DROP DATABASE `{department_name}`")
-        conn.commit()
+        try:
+            storage.get_storage().delete_department(department_name)
+        finally:
+            catalog.invalidate_catalog()
+            catalog.invalidate_department(department_name)
         
         logger.info(f"Successfully deleted department: {department_name}")
         
@@ -878,92 +952,149 @@ async def delete_department(department_name: str):
             status_code=500,
             detail=f"Failed to delete department: {str(e)}"
         )
+
+def find_department(schema_name: str) -> str:
+    """
+    Resolve a department name case-insensitively, preserving its original case
+    """
+    available_schemas = catalog.get_catalog().departments()
     
-    finally:
+    matching_schemas = [
+        schema for schema in available_schemas 
+        if schema.lower() == schema_name.lower()
+    ]
+    
+    if not matching_schemas:
+        raise HTTPException(
+            status_code=404, 
+            detail=f"Schema '{schema_name}' not found. Available schemas: {available_schemas}",
+            headers={"X-Available-Schemas": json.dumps(available_schemas)}
+        )
+    
+    return matching_schemas[0]
+
+def find_department_table(department: str, possible_table_names: List[str], label: str,
+                          allow_partial: bool = True) -> str:
+    """
+    Find the first department table matching one of the known name variations
+    """
+    tables = catalog.get_catalog().tables(department)
+    
+    matching_tables = [
+        table for table in tables 
+        for possible_name in possible_table_names 
+        if table.lower() == possible_name.lower()
+        or (allow_partial and possible_name.lower() in table.lower())
+    ]
+    
+    if not matching_tables:
+        raise HTTPException(
+            status_code=404, 
+            detail=f"{label} table not found in schema '{department}'. Available tables: {tables}",
+            headers={"X-Available-Tables": json.dumps(tables)}
+        )
+    
+    return matching_tables[0]
+
+def encode_page_token(state: dict) -> str:
+    return base64.urlsafe_b64encode(
+        json.dumps(state, separators=(',', ':'), default=str).encode('utf-8')
+    ).decode('ascii').rstrip('=')
+
+def decode_page_token(token: str) -> dict:
+    try:
+        return json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def keyset_column(columns, sort_column: str) -> Optional[str]:
+    """
+    Column a department table can be paged through by key: the id primary key,
+    or an indexed NOT NULL sort column. None means the page needs an OFFSET.
+    """
+    by_name = {col['Field'].lower(): col for col in columns}
+    id_column = by_name.get('id')
+    if not id_column or id_column['Field'] != 'id' or id_column['Key'] != 'PRI':
+        return None
+    
+    column = by_name.get(sort_column.lower())
+    if column is None:
+        return None
+    if column['Field'] == 'id' or (column['Key'] and column['Null'] == 'NO'):
+        return column['Field']
+    return None
+
+def department_page(backend, department: str, table: str, limit: int, offset: int, cursor: Optional[str],
+                    sort_column: Optional[str] = None, order: str = 'ASC'):
+    """
+    One page of a department table and its pagination block. Pages after the
+    first are fetched by key from the opaque nextCursor of the previous page;
+    offset paging remains for unindexed sort columns and explicit offsets.
+    """
+    key = keyset_column(catalog.get_catalog().columns(department, table), sort_column or 'id')
+    total_rows = catalog.get_catalog().row_count(department, table)
+    
+    if key is None or (offset and not cursor):
         if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+            raise HTTPException(status_code=400, detail=f"Cursor paging is not available when sorting by {sort_column}")
+        rows = backend.fetch_rows(department, table, limit, offset, order_by=sort_column, direction=order)
+        has_more = offset + len(rows) < total_rows
+        next_cursor = None
+    else:
+        after = None
+        if cursor:
+            state = decode_page_token(cursor)
+            if not isinstance(state, dict) or [state.get('t'), state.get('k'), state.get('d')] != [table, key, order]:
+                raise HTTPException(status_code=400, detail="Cursor does not belong to this table and sort order")
+            value, last_id = state.get('v'), state.get('i')
+            if (not isinstance(last_id, int) or isinstance(last_id, bool)
+                    or not (value is None or (isinstance(value, (str, int, float)) and not isinstance(value, bool)))):
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            after = (value, last_id)
+        
+        # One extra row tells whether another page follows
+        rows = backend.fetch_rows_after(department, table, limit + 1, key, after, order)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = encode_page_token({
+            't': table, 'k': key, 'd': order, 'v': rows[-1][key], 'i': rows[-1]['id']
+        }) if has_more else None
+    
+    return rows, {
+        "total": total_rows,
+        "limit": limit,
+        "offset": offset,
+        "hasMore": has_more,
+        "nextCursor": next_cursor
+    }
 
 @app.get("/api/schema/{schema_name}/sortedtable")
-async def get_sorted_table(
+def get_sorted_table(
     schema_name: str,
     limit: Optional[int] = Query(default=100, ge=1, le=1000),
     offset: Optional[int] = Query(default=0, ge=0),
     sort_by: Optional[str] = Query(default=None),
-    order: Optional[str] = Query(default='ASC', pattern='^(ASC|DESC)$')  # Changed from regex to pattern
+    order: Optional[str] = Query(default='ASC', pattern='^(ASC|DESC)$'),  # Changed from regex to pattern
+    cursor: Optional[str] = Query(default=None)
 ):
     """
-    Retrieve SortedTable data
+    Retrieve SortedTable data; pass pagination.nextCursor as cursor for the next page
     """
-    conn = None
     try:
-        # Establish database connection
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        # Query to get all schemas
-        cursor.execute('SHOW DATABASES')
-        databases = cursor.fetchall()
-        
-        # Convert to list of database names
-        available_schemas = [
-            db['Database'] for db in databases 
-            if db['Database'].lower() not in ['information_schema', 'mysql', 'performance_schema', 'sys', 'defaultdb']
-        ]
-        
-        # Check if schema exists (case-insensitive)
-        matching_schemas = [
-            schema for schema in available_schemas 
-            if schema.lower() == schema_name.lower()
-        ]
-        
-        if not matching_schemas:
-            raise HTTPException(
-                status_code=404, 
-                detail=f"Schema '{schema_name}' not found. Available schemas: {available_schemas}",
-                headers={"X-Available-Schemas": json.dumps(available_schemas)}
-            )
-        
-        # Use the matched schema (preserving original case)
-        actual_schema = matching_schemas[0]
-        
-        # Switch to the specific database
-        conn.database = actual_schema
-        cursor = conn.cursor(dictionary=True)
-        
-        # Check if table exists
-        cursor.execute('SHOW TABLES')
-        tables = [table['Tables_in_' + actual_schema] for table in cursor.fetchall()]
+        backend = storage.get_storage()
+        actual_schema = find_department(schema_name)
         
         # Check for possible table variations
-        possible_table_names = [
+        table_name = find_department_table(actual_schema, [
             'SortedTable_SortedTable_xlsx',
             'SortedTable_SortedTable', 
             'sorted_table', 
             'sorted_tables', 
             'sortedtable'
-        ]
-        
-        matching_tables = [
-            table for table in tables 
-            for possible_name in possible_table_names 
-            if table.lower() == possible_name.lower()
-        ]
-        
-        if not matching_tables:
-            raise HTTPException(
-                status_code=404, 
-                detail=f"No sorted table found in schema '{actual_schema}'. Available tables: {tables}",
-                headers={"X-Available-Tables": json.dumps(tables)}
-            )
-        
-        # Use the first matching table
-        table_name = matching_tables[0]
+        ], "Sorted", allow_partial=False)
         
         # Get table columns
-        cursor.execute(f'DESCRIBE `{table_name}`')
-        columns = cursor.fetchall()
+        columns = catalog.get_catalog().columns(actual_schema, table_name)
         
         # Determine sort column
         sort_column = sort_by or columns[0]['Field']
@@ -972,19 +1103,9 @@ async def get_sorted_table(
         if not any(col['Field'].lower() == sort_column.lower() for col in columns):
             sort_column = columns[0]['Field']
         
-        # Count total rows
-        cursor.execute(f'SELECT COUNT(*) as total FROM `{table_name}`')
-        total_rows = cursor.fetchone()['total']
-        
-        # Construct dynamic query
-        query = f"""
-        SELECT * FROM `{table_name}`
-        ORDER BY `{sort_column}` {order}
-        LIMIT %s OFFSET %s
-        """
-        
-        cursor.execute(query, (limit, offset))
-        rows = cursor.fetchall()
+        rows, pagination = department_page(
+            backend, actual_schema, table_name, limit, offset, cursor, sort_column=sort_column, order=order
+        )
         
         return {
             "success": True,
@@ -998,12 +1119,7 @@ async def get_sorted_table(
                     "key": col['Key']
                 } for col in columns
             ],
-            "pagination": {
-                "total": total_rows,
-                "limit": limit,
-                "offset": offset,
-                "hasMore": offset + len(rows) < total_rows
-            },
+            "pagination": pagination,
             "data": rows
         }
     
@@ -1016,99 +1132,38 @@ async def get_sorted_table(
             status_code=500, 
             detail=f"Database error: {str(e)}"
         )
-    
-    finally:
-        if conn:
-            conn.close()
 
 @app.get("/api/schema/{schema_name}/sortedtableformatted")
-async def get_sorted_table_formatted(
+def get_sorted_table_formatted(
     schema_name: str,
     limit: Optional[int] = Query(default=1000, ge=1, le=5000),
-    offset: Optional[int] = Query(default=0, ge=0)
+    offset: Optional[int] = Query(default=0, ge=0),
+    cursor: Optional[str] = Query(default=None)
 ):
     """
     Retrieve SortedTableFormatted data from a specific schema
     """
-    conn = None
     try:
-        # Establish database connection
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        # Verify schema exists
-        cursor.execute('SHOW DATABASES')
-        databases = cursor.fetchall()
-        available_schemas = [
-            db['Database'] for db in databases 
-            if db['Database'].lower() not in ['information_schema', 'mysql', 'performance_schema', 'sys', 'defaultdb']
-        ]
-        
-        matching_schemas = [
-            schema for schema in available_schemas 
-            if schema.lower() == schema_name.lower()
-        ]
-        
-        if not matching_schemas:
-            raise HTTPException(
-                status_code=404, 
-                detail=f"Schema '{schema_name}' not found."
-            )
-        
-        # Use the matched schema
-        actual_schema = matching_schemas[0]
-        
-        # Switch to the specific database
-        conn.database = actual_schema
-        cursor = conn.cursor(dictionary=True)
-        
-        # Check if the SortedTableFormatted table exists (check variations of the name)
-        cursor.execute('SHOW TABLES')
-        tables = [table['Tables_in_' + actual_schema] for table in cursor.fetchall()]
+        backend = storage.get_storage()
+        actual_schema = find_department(schema_name)
         
         # Look for variations of SortedTableFormatted
-        possible_table_names = [
+        table_name = find_department_table(actual_schema, [
             'SortedTableFormatted',
             'SortedTable_Formatted',
             'sortedtableformatted',
             'Formatted_SortedTable',
             'SortedTableFormatted_SortedTableFormatted',
             'SortedTableFormatted_SortedTableFormatted_xlsx'
-        ]
-        
-        matching_tables = [
-            table for table in tables 
-            for possible_name in possible_table_names 
-            if table.lower() == possible_name.lower() or possible_name.lower() in table.lower()
-        ]
+        ], "SortedTableFormatted")
         
-        if not matching_tables:
-            raise HTTPException(
-                status_code=404, 
-                detail=f"SortedTableFormatted table not found in schema '{actual_schema}'. Available tables: {tables}"
-            )
-        
-        # Use the first matching table
-        table_name = matching_tables[0]
-        
-        # Count total rows
-        cursor.execute(f'SELECT COUNT(*) as total FROM `{table_name}`')
-        total_rows = cursor.fetchone()['total']
-        
-        # Fetch data
-        cursor.execute(f'SELECT * FROM `{table_name}` LIMIT %s OFFSET %s', (limit, offset))
-        rows = cursor.fetchall()
+        rows, pagination = department_page(backend, actual_schema, table_name, limit, offset, cursor)
         
         return {
             "success": True,
             "database": actual_schema,
             "tableName": table_name,
-            "pagination": {
-                "total": total_rows,
-                "limit": limit,
-                "offset": offset,
-                "hasMore": offset + len(rows) < total_rows
-            },
+            "pagination": pagination,
             "data": rows
         }
     
@@ -1121,99 +1176,38 @@ async def get_sorted_table_formatted(
             status_code=500, 
             detail=f"Database error: {str(e)}"
         )
-    
-    finally:
-        if conn:
-            conn.close()
 
 @app.get("/api/schema/{schema_name}/uniquesubjects")
-async def get_unique_subjects(
+def get_unique_subjects(
     schema_name: str,
     limit: Optional[int] = Query(default=1000, ge=1, le=5000),
-    offset: Optional[int] = Query(default=0, ge=0)
+    offset: Optional[int] = Query(default=0, ge=0),
+    cursor: Optional[str] = Query(default=None)
 ):
     """
     Retrieve UniqueSubjects data from a specific schema
     """
-    conn = None
     try:
-        # Establish database connection
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        # Verify schema exists
-        cursor.execute('SHOW DATABASES')
-        databases = cursor.fetchall()
-        available_schemas = [
-            db['Database'] for db in databases 
-            if db['Database'].lower() not in ['information_schema', 'mysql', 'performance_schema', 'sys', 'defaultdb']
-        ]
-        
-        matching_schemas = [
-            schema for schema in available_schemas 
-            if schema.lower() == schema_name.lower()
-        ]
-        
-        if not matching_schemas:
-            raise HTTPException(
-                status_code=404, 
-                detail=f"Schema '{schema_name}' not found."
-            )
-        
-        # Use the matched schema
-        actual_schema = matching_schemas[0]
-        
-        # Switch to the specific database
-        conn.database = actual_schema
-        cursor = conn.cursor(dictionary=True)
-        
-        # Check if the UniqueSubjects table exists (check variations of the name)
-        cursor.execute('SHOW TABLES')
-        tables = [table['Tables_in_' + actual_schema] for table in cursor.fetchall()]
+        backend = storage.get_storage()
+        actual_schema = find_department(schema_name)
         
         # Look for variations of UniqueSubjects
-        possible_table_names = [
+        table_name = find_department_table(actual_schema, [
             'UniqueSubjects',
             'Unique_Subjects',
             'uniquesubjects',
             'unique_subjects',
             'UniqueSubjects_UniqueSubjects',
             'UniqueSubjects_UniqueSubjects_xlsx'
-        ]
-        
-        matching_tables = [
-            table for table in tables 
-            for possible_name in possible_table_names 
-            if table.lower() == possible_name.lower() or possible_name.lower() in table.lower()
-        ]
-        
-        if not matching_tables:
-            raise HTTPException(
-                status_code=404, 
-                detail=f"UniqueSubjects table not found in schema '{actual_schema}'. Available tables: {tables}"
-            )
+        ], "UniqueSubjects")
         
-        # Use the first matching table
-        table_name = matching_tables[0]
-        
-        # Count total rows
-        cursor.execute(f'SELECT COUNT(*) as total FROM `{table_name}`')
-        total_rows = cursor.fetchone()['total']
-        
-        # Fetch data
-        cursor.execute(f'SELECT * FROM `{table_name}` LIMIT %s OFFSET %s', (limit, offset))
-        rows = cursor.fetchall()
+        rows, pagination = department_page(backend, actual_schema, table_name, limit, offset, cursor)
         
         return {
             "success": True,
             "database": actual_schema,
             "tableName": table_name,
-            "pagination": {
-                "total": total_rows,
-                "limit": limit,
-                "offset": offset,
-                "hasMore": offset + len(rows) < total_rows
-            },
+            "pagination": pagination,
             "data": rows
         }
     
@@ -1226,39 +1220,69 @@ async def get_unique_subjects(
             status_code=500, 
             detail=f"Database error: {str(e)}"
         )
-    
-    finally:
-        if conn:
-            conn.close()
 
 @app.get("/health")
-def health_check():
+async def health_check():
+    """
+    Health from cached state: the database is pinged through the pool at most
+    once per HEALTH_CHECK_INTERVAL, in the background, so probes neither add
+    database load nor wait on a slow database
+    """
+    monitor = health.get_monitor()
+    monitor.refresh()
+
+    database = monitor.database()
+    limiter = to_thread.current_default_thread_limiter()
+    healthy = database["status"] in ("connected", "unknown")
+    body = {
+        "status": "healthy" if healthy else "unhealthy",
+        "database": database,
+        "storage_backend": storage.STORAGE_BACKEND,
+        "db_pool": connection_pool.pool_metrics(),
+        "worker_threads": {"total": int(limiter.total_tokens), "busy": limiter.borrowed_tokens},
+        "password_hasher": auth.hasher_metrics(),
+        "jobs": {
+            "artifacts": artifacts.pipeline_metrics(),
+            "excel_exports": excel_export.exporter_metrics()
+        },
+        "generator": monitor.generator_metrics(),
+        "current_time": datetime.now().isoformat(),
+        "predefined_slots": PREDEFINED_SLOTS,
+        "predefined_days": PREDEFINED_DAYS
+    }
+    return Response(
+        content=json_body(body),
+        status_code=200 if healthy else 503,
+        media_type="application/json",
+        headers={"Cache-Control": "no-store"}
+    )
+
+@app.get("/metrics")
+async def prometheus_metrics():
     """
-    Simple health check endpoint
+    Process metrics in the Prometheus text format
+    """
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/api/profiles", dependencies=[Depends(profiling.require_admin)])
+def list_profiles():
+    """
+    Stored request profiles, newest first
+    """
+    return {"success": True, "profiles": profiling.get_store().list()}
+
+@app.get("/api/profiles/{profile_id}", dependencies=[Depends(profiling.require_admin)])
+def get_profile(profile_id: str):
+    """
+    One stored profile: wall and CPU totals, per-thread samples, top functions and folded stacks
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('SHOW DATABASES')
-        databases = cursor.fetchall()
-        
-        conn.close()
-        return {
-            "status": "healthy", 
-            "database": "connected",
-            "current_time": datetime.now().isoformat(),
-            "predefined_slots": PREDEFINED_SLOTS,
-            "predefined_days": PREDEFINED_DAYS,
-            "available_schemas": [
-                db[0] for db in databases 
-                if not str(db[0]).lower().startswith(('information_schema', 'mysql', 'performance_schema', 'sys', 'login_details'))
-            ]
-        }
-    except Exception as e:
-        return {
-            "status": "unhealthy", 
-            "error": str(e)
-        }
+        profile = profiling.get_store().load(profile_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+    return profile
 
 # Error Handlers
 @app.exception_handler(Exception)
@@ -1273,24 +1297,14 @@ async def global_exception_handler(request, exc):
     )
 
 # Timetable and Allocator API
-@app.get("/api/timetable-schemas")
+@app.get("/api/timetable-schemas", dependencies=[Depends(auth.require_auth)])
 def get_timetable_schemas():
     """
     Retrieve all available timetable schemas
     """
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        cursor.execute('SHOW DATABASES')
-        databases = cursor.fetchall()
-        
-        # Filter for timetable schemas only
-        timetable_schemas = [
-            db['Database'] for db in databases 
-            if str(db['Database']).startswith('timetable_')
-        ]
+        # Timetable runs only (schemas or versioned-store runs)
+        timetable_schemas = catalog.get_catalog().runs()
         
         return {
             "success": True,
@@ -1303,17 +1317,12 @@ def get_timetable_schemas():
             status_code=500, 
             detail=f"Database error: {str(e)}"
         )
-    
-    finally:
-        if conn:
-            conn.close()
 
-@app.delete("/api/timetable-schema/{schema_name}")
+@app.delete("/api/timetable-schema/{schema_name}", dependencies=[Depends(auth.require_auth)])
 def delete_timetable_schema(schema_name: str):
     """
     Delete a specific timetable schema
     """
-    conn = None
     try:
         # Validate schema name for safety
         if not schema_name.startswith('timetable_'):
@@ -1322,23 +1331,21 @@ def delete_timetable_schema(schema_name: str):
                 detail="Invalid timetable schema name. Must start with 'timetable_'"
             )
         
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
         # Check if schema exists
-        cursor.execute('SHOW DATABASES')
-        databases = cursor.fetchall()
-        
-        available_schemas = [db['Database'] for db in databases]
-        
-        if schema_name not in available_schemas:
+        if not catalog.get_catalog().run_exists(schema_name):
             raise HTTPException(
                 status_code=404,
                 detail=f"Timetable schema '{schema_name}' not found"
             )
         
-        # Drop the database
-        cursor.execute(f"DROP DATABASE `{schema_name}`")
+        # Drop the database, or delete the run's rows from the versioned store
+        try:
+            storage.get_storage().delete_run(schema_name)
+        finally:
+            catalog.invalidate_catalog()
+            http_cache.etag_cache.invalidate_schema(schema_name)
+            excel_export.invalidate_export(schema_name)
+            artifacts.invalidate_artifacts(schema_name)
         
         return {
             "success": True,
@@ -1354,17 +1361,25 @@ def delete_timetable_schema(schema_name: str):
             status_code=500,
             detail=f"Database error: {str(e)}"
         )
-    
-    finally:
-        if conn:
-            conn.close()
 
-@app.get("/api/timetable/{schema_name}")
-def get_specific_timetable(schema_name: str):
+def timetable_run_lines(backend, schema_name: str) -> Iterator[bytes]:
+    """
+    NDJSON lines for every view of a run, each table streamed from the database in turn
     """
-    Retrieve timetable data from a specific schema
+    for key, table, fields in TIMETABLE_VIEWS:
+        prefix = b'{"kind":"' + key.encode('ascii') + b'","row":'
+        for row in timetable_row_stream(backend, schema_name, table, fields):
+            yield prefix + row + b'}\n'
+
+@app.get("/api/timetable/{schema_name}", dependencies=[Depends(auth.require_auth)])
+def get_specific_timetable(schema_name: str, request: Request,
+                           output: Optional[str] = Query(default=None, alias="format")):
+    """
+    Retrieve timetable data from a specific schema. format=ndjson streams one
+    {"kind": "classes" | "teachers" | "venues", "row": {...}} object per line,
+    ending with an {"error": "..."} line if the stream fails part way;
+    format=compact returns timetable_data in the columnar encoding of compact.py.
     """
-    conn = None
     try:
         # Validate schema name for safety
         if not schema_name.startswith('timetable_'):
@@ -1373,356 +1388,413 @@ def get_specific_timetable(schema_name: str):
                 detail="Invalid timetable schema name. Must start with 'timetable_'"
             )
         
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        backend = storage.get_storage()
         
         # Check if schema exists
-        cursor.execute('SHOW DATABASES')
-        databases = cursor.fetchall()
-        
-        available_schemas = [db['Database'] for db in databases]
-        
-        if schema_name not in available_schemas:
+        if not catalog.get_catalog().run_exists(schema_name):
             raise HTTPException(
                 status_code=404,
                 detail=f"Timetable schema '{schema_name}' not found"
             )
         
-        # Switch to the specific database
-        conn.database = schema_name
-        cursor = conn.cursor(dictionary=True)
+        output = response_format(request, output)
+        if output == 'ndjson':
+            return ndjson_response(timetable_run_lines(backend, schema_name))
         
-        # Get all timetable data
-        timetable_data = {
-            "classes": [],
-            "teachers": [],
-            "venues": []
-        }
+        # Named schemas are immutable, so a known ETag is answered without the database
+        resource = 'timetable' if output == 'json' else 'timetable:compact'
+        not_modified = not_modified_response(request, schema_name, resource, http_cache.IMMUTABLE_CACHE_CONTROL)
+        if not_modified:
+            return not_modified
         
-        # Get class timetables
-        try:
-            cursor.execute("""
-                SELECT 
-                    year, 
-                    section, 
-                    timetable_data, 
-                    free_hours, 
-                    generated_at
-                FROM class_timetables
-                ORDER BY year, section
-            """)
-            
-            class_timetables = cursor.fetchall()
-            
-            timetable_data["classes"] = [
-                {
-                    "year": row['year'],
-                    "section": row['section'],
-                    "timetable": rearrange_timetable_data(safe_json_parse(row['timetable_data'])),
-                    "free_hours": safe_json_parse(row['free_hours']),
-                    "generated_at": str(row['generated_at']) if row['generated_at'] else None
-                }
-                for row in class_timetables
-            ]
-        except Exception as e:
-            logger.warning(f"Could not fetch class timetables from {schema_name}: {e}")
+        if output == 'compact':
+            body = json_body({
+                "success": True,
+                "schema_name": schema_name,
+                "timetable_data": compact_timetables(backend, schema_name, TIMETABLE_VIEWS)
+            })
+            return etag_response(request, schema_name, resource, body, http_cache.IMMUTABLE_CACHE_CONTROL, compact.COMPACT_MEDIA_TYPE)
         
-        # Get teacher timetables
-        try:
-            cursor.execute("""
-                SELECT 
-                    employee_id, 
-                    teacher_name, 
-                    timetable_data, 
-                    free_hours, 
-                    generated_at
-                FROM teacher_timetables
-                ORDER BY teacher_name
-            """)
-            
-            teacher_timetables = cursor.fetchall()
-            
-            timetable_data["teachers"] = [
-                {
-                    "employee_id": row['employee_id'],
-                    "teacher_name": row['teacher_name'],
-                    "timetable": rearrange_timetable_data(safe_json_parse(row['timetable_data'])),
-                    "free_hours": safe_json_parse(row['free_hours']),
-                    "generated_at": str(row['generated_at']) if row['generated_at'] else None
-                }
-                for row in teacher_timetables
-            ]
-        except Exception as e:
-            logger.warning(f"Could not fetch teacher timetables from {schema_name}: {e}")
+        # Get all timetable data
+        timetable_data = {}
         
-        # Get venue timetables
-        try:
-            cursor.execute("""
-                SELECT 
-                    venue_id, 
-                    venue_name, 
-                    timetable_data, 
-                    free_hours, 
-                    generated_at
-                FROM venue_timetables
-                ORDER BY venue_name
-            """)
-            
-            venue_timetables = cursor.fetchall()
-            
-            timetable_data["venues"] = [
-                {
-                    "venue_id": row['venue_id'],
-                    "venue_name": row['venue_name'],
-                    "timetable": rearrange_timetable_data(safe_json_parse(row['timetable_data'])),
-                    "free_hours": safe_json_parse(row['free_hours']),
-                    "generated_at": str(row['generated_at']) if row['generated_at'] else None
-                }
-                for row in venue_timetables
-            ]
-        except Exception as e:
-            logger.warning(f"Could not fetch venue timetables from {schema_name}: {e}")
+        complete = True
+        for key, table, fields in TIMETABLE_VIEWS:
+            try:
+                timetable_data[key] = timetable_rows_body(backend, schema_name, table, fields)
+            except Exception as e:
+                complete = False
+                timetable_data[key] = b'[]'
+                logger.warning(f"Could not fetch {table} from {schema_name}: {e}")
+        
+        # Assemble the envelope around the stored row bytes without re-parsing them
+        body = b''.join([
+            b'{"success":true,"schema_name":', json_body(schema_name),
+            b',"timetable_data":{"classes":', timetable_data["classes"],
+            b',"teachers":', timetable_data["teachers"],
+            b',"venues":', timetable_data["venues"], b'}}'
+        ])
+        
+        # Partial results are returned but not tagged, so they are never cached
+        if not complete:
+            return Response(content=body, media_type="application/json")
+        
+        return etag_response(request, schema_name, 'timetable', body, http_cache.IMMUTABLE_CACHE_CONTROL)
+    
+    except HTTPException:
+        raise
+    
+    except Exception as e:
+        logger.error(f"Error retrieving specific timetable: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Database error: {str(e)}"
+        )
+
+def resolve_timetable_schema(schema_name: str):
+    """
+    Run to read for a lookup and its Cache-Control; "latest" follows the newest run
+    """
+    if schema_name == 'latest':
+        return find_latest_timetable_schema(), http_cache.REVALIDATE_CACHE_CONTROL
+    
+    if not re.fullmatch(r'timetable_\w+', schema_name):
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid timetable schema name. Must start with 'timetable_'"
+        )
+    
+    if not catalog.get_catalog().run_exists(schema_name):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Timetable schema '{schema_name}' not found"
+        )
+    
+    return schema_name, http_cache.IMMUTABLE_CACHE_CONTROL
+
+def timetable_entity_response(request: Request, schema_name: str, key: str, table: str,
+                              matches: List[dict], fields, resource: str):
+    """
+    Single class, teacher or venue timetable through an indexed lookup. Each
+    entry in matches is tried in turn until one finds a row.
+    """
+    schema_name, cache_control = resolve_timetable_schema(schema_name)
+    
+    not_modified = not_modified_response(request, schema_name, resource, cache_control)
+    if not_modified:
+        return not_modified
+    
+    backend = storage.get_storage()
+    row = None
+    for match in matches:
+        row = backend.fetch_timetable(schema_name, table, match)
+        if row:
+            break
+    
+    if not row:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No {key} timetable found for {resource.split('/', 1)[1]} in '{schema_name}'"
+        )
+    
+    rendered = row.get('rendered_json')
+    entity = rendered.encode('utf-8') if rendered else json_body(format_timetable_rows([row], fields)[0])
+    body = b''.join([
+        b'{"success":true,"schema_name":', json_body(schema_name),
+        b',"', key.encode('ascii'), b'":', entity, b'}'
+    ])
+    
+    return etag_response(request, schema_name, resource, body, cache_control)
+
+@app.get("/api/timetable/{schema_name}/class/{year}/{section}", dependencies=[Depends(auth.require_auth)])
+def get_class_timetable(schema_name: str, year: int, section: str, request: Request):
+    """
+    Retrieve the timetable of one section; schema_name may be "latest"
+    """
+    try:
+        return timetable_entity_response(
+            request, schema_name, "class", "class_timetables",
+            [{"year": year, "section": section}],
+            ("year", "section"), f"class/{year}/{section}"
+        )
+    
+    except HTTPException:
+        raise
+    
+    except Exception as e:
+        logger.error(f"Error retrieving class timetable: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Database error: {str(e)}"
+        )
+
+@app.get("/api/timetable/{schema_name}/teacher/{teacher}", dependencies=[Depends(auth.require_auth)])
+def get_teacher_timetable(schema_name: str, teacher: str, request: Request):
+    """
+    Retrieve the timetable of one teacher by employee ID or name; schema_name may be "latest"
+    """
+    try:
+        return timetable_entity_response(
+            request, schema_name, "teacher", "teacher_timetables",
+            [{"employee_id": teacher}, {"teacher_name": teacher}],
+            ("employee_id", "teacher_name"), f"teacher/{teacher}"
+        )
+    
+    except HTTPException:
+        raise
+    
+    except Exception as e:
+        logger.error(f"Error retrieving teacher timetable: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Database error: {str(e)}"
+        )
+
+@app.get("/api/timetable/{schema_name}/venue/{venue_id}", dependencies=[Depends(auth.require_auth)])
+def get_venue_timetable(schema_name: str, venue_id: str, request: Request):
+    """
+    Retrieve the timetable of one venue; schema_name may be "latest"
+    """
+    try:
+        return timetable_entity_response(
+            request, schema_name, "venue", "venue_timetables",
+            [{"venue_id": venue_id}],
+            ("venue_id", "venue_name"), f"venue/{venue_id}"
+        )
+    
+    except HTTPException:
+        raise
+    
+    except Exception as e:
+        logger.error(f"Error retrieving venue timetable: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Database error: {str(e)}"
+        )
+
+@app.get("/api/timetable/{schema_name}/artifacts", dependencies=[Depends(auth.require_auth)])
+def get_timetable_artifacts(schema_name: str):
+    """
+    Whether the Excel export and summary of a run have been built yet
+    """
+    try:
+        if not catalog.get_catalog().run_exists(schema_name):
+            raise HTTPException(
+                status_code=404,
+                detail=f"Timetable schema '{schema_name}' not found"
+            )
         
         return {
             "success": True,
             "schema_name": schema_name,
-            "timetable_data": timetable_data
+            "artifacts": artifacts.get_pipeline().status(schema_name)
         }
     
     except HTTPException:
         raise
     
     except Exception as e:
-        logger.error(f"Error retrieving specific timetable: {e}")
+        logger.error(f"Error retrieving artifact status: {e}")
         raise HTTPException(
             status_code=500,
-            detail=f"Database error: {str(e)}"
+            detail=f"Error retrieving artifact status: {str(e)}"
         )
-    
-    finally:
-        if conn:
-            conn.close()
 
-@app.post("/api/generate-timetable")
-async def generate_timetable_fastapi(
-    sectionConfig: Optional[str] = Form(None),
-    faculty: UploadFile = File(...),
-    subjects: UploadFile = File(...),
-    venues: UploadFile = File(...),
-    cdc: UploadFile = File(...),
-):
+@app.get("/api/timetable/{schema_name}/summary", dependencies=[Depends(auth.require_auth)])
+def get_timetable_summary(schema_name: str):
+    """
+    Weekly load statistics of a run, prepared in the background after it was saved
+    """
     try:
-        # 1. Prepare the data using the function from gentt.py
-        files = {
-            "faculty": faculty,
-            "subjects": subjects,
-            "venues": venues,
-            "cdc": cdc,
+        if not catalog.get_catalog().run_exists(schema_name):
+            raise HTTPException(
+                status_code=404,
+                detail=f"Timetable schema '{schema_name}' not found"
+            )
+        
+        return {
+            "success": True,
+            "schema_name": schema_name,
+            "summary": artifacts.get_pipeline().summary(schema_name)
         }
-        form = {"sectionConfig": sectionConfig}
+    
+    except HTTPException:
+        raise
+    
+    except Exception as e:
+        logger.error(f"Error retrieving timetable summary: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Database error: {str(e)}"
+        )
 
-        # Read file content before passing to prepare_timetable_data
-        files_content = {k: await v.read() for k, v in files.items()}
+@app.get("/api/timetable/{schema_name}/cells", dependencies=[Depends(auth.require_auth)])
+def get_timetable_cells(
+    schema_name: str,
+    year: Optional[int] = Query(default=None),
+    section: Optional[str] = Query(default=None),
+    teacher: Optional[str] = Query(default=None),
+    venue_id: Optional[str] = Query(default=None),
+    day: Optional[str] = Query(default=None),
+    slot_from: Optional[str] = Query(default=None),
+    slot_to: Optional[str] = Query(default=None),
+    limit: Optional[int] = Query(default=1000, ge=1, le=10000)
+):
+    """
+    Query normalized timetable cells using the indexed cells table
+    """
+    try:
+        # Validate schema name for safety
+        if not re.fullmatch(r'timetable_\w+', schema_name):
+            raise HTTPException(
+                status_code=400,
+                detail="Invalid timetable schema name. Must start with 'timetable_'"
+            )
 
-        # Call the prepare_timetable_data function
-        generator, all_sections_data, faculty_df, cdc_df, venues_data = prepare_timetable_data(form, files_content)
+        filters = {
+            "year": year,
+            "section": section or None,
+            "teacher": teacher or None,
+            "venue_id": venue_id or None
+        }
 
-        # 2. Generate timetables using the GlobalTimeTableGenerator instance
-        logger.info("Starting timetable generation process")
-        generation_success = generator.generate_all_timetables(all_sections_data, venues_data)
+        if day:
+            if day not in PREDEFINED_DAYS:
+                raise HTTPException(status_code=400, detail=f"Invalid day: {day}")
+            filters["day_index"] = PREDEFINED_DAYS.index(day)
 
-        if not generation_success:
-            logger.error("Failed to generate timetable after multiple attempts")
-            raise HTTPException(status_code=500, detail="Failed to generate timetable after multiple attempts")
+        for slot in (slot_from, slot_to):
+            if slot and slot not in PREDEFINED_SLOTS:
+                raise HTTPException(status_code=400, detail=f"Invalid slot: {slot}")
+        if slot_from:
+            filters["slot_from"] = PREDEFINED_SLOTS.index(slot_from)
+        if slot_to:
+            filters["slot_to"] = PREDEFINED_SLOTS.index(slot_to)
 
-        # 3. Save timetables to the database
-        logger.info("Saving timetables to database")
-        connection_uri = os.getenv("DATABASE_URI")
-        if not connection_uri:
-            raise HTTPException(status_code=500, detail="Database connection URI not configured.")
+        return {
+            "success": True,
+            "schema_name": schema_name,
+            "cells": storage.get_storage().query_cells(schema_name, filters, limit)
+        }
 
-        save_success = save_timetables_to_database(generator, all_sections_data, faculty_df, cdc_df, venues_data, connection_uri)
+    except HTTPException:
+        raise
 
-        if not save_success:
-            logger.error("Timetable generation succeeded but saving to DB failed")
-            raise HTTPException(status_code=500, detail="Timetable generation succeeded but saving to DB failed.")
+    except RunNotFoundError:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No cell data found for timetable schema '{schema_name}'"
+        )
 
-        # 4. Perform validation and return results
-        validation_results = validate_timetable(generator, all_sections_data)
+    except Exception as e:
+        logger.error(f"Error querying timetable cells: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Database error: {str(e)}"
+        )
 
-        logger.info("Timetable generated and saved successfully")
-        return {
-            "status": "success",
-            "message": "Timetable generated and saved successfully",
-            "validation_summary": {
-                "subject_hours_valid": validation_results.get("structure_valid", False),
-                "venue_clashes": validation_results.get("has_venue_clashes", False)
+@app.post("/api/generate-timetable", dependencies=[Depends(auth.require_auth)])
+async def generate_timetable_fastapi(
+    sectionConfig: Optional[str] = Form(None),
+    faculty: UploadFile = File(...),
+    subjects: UploadFile = File(...),
+    venues: UploadFile = File(...),
+    cdc: UploadFile = File(...),
+):
+    # Reported as generator status by /health
+    with health.get_monitor().track_generation():
+        try:
+            # 1. Prepare the data using the function from gentt.py
+            files = {
+                "faculty": faculty,
+                "subjects": subjects,
+                "venues": venues,
+                "cdc": cdc,
             }
-        }
+            form = {"sectionConfig": sectionConfig}
+
+            # Read file content before passing to prepare_timetable_data
+            files_content = {k: await v.read() for k, v in files.items()}
+
+            # Call the prepare_timetable_data function
+            with metrics.GENERATION_SECONDS.time(stage="prepare"):
+                generator, all_sections_data, faculty_df, cdc_df, venues_data = await run_in_threadpool(
+                    server_timing.bound(prepare_timetable_data), form, files_content
+                )
+
+            # 2. Generate timetables using the GlobalTimeTableGenerator instance
+            logger.info("Starting timetable generation process")
+            # Memory reports stay empty unless MEMORY_TRACE is on
+            with metrics.GENERATION_SECONDS.time(stage="generate"):
+                generation_success, generate_memory = await run_in_threadpool(
+                    server_timing.bound(memtrace.call), "generate", generator.generate_all_timetables, all_sections_data, venues_data
+                )
+            metrics.GENERATION_ATTEMPTS.inc(generator.attempts_used)
+
+            if not generation_success:
+                logger.error("Failed to generate timetable after multiple attempts")
+                raise HTTPException(status_code=500, detail="Failed to generate timetable after multiple attempts")
+
+            # 3. Save timetables to the database
+            logger.info("Saving timetables to database")
+            with metrics.GENERATION_SECONDS.time(stage="save"):
+                save_success, save_memory = await run_in_threadpool(
+                    server_timing.bound(memtrace.call), "save",
+                    save_timetables_to_database, generator, all_sections_data, faculty_df, cdc_df, venues_data
+                )
+
+            if not save_success:
+                logger.error("Timetable generation succeeded but saving to DB failed")
+                raise HTTPException(status_code=500, detail="Timetable generation succeeded but saving to DB failed.")
+
+            # 4. Perform validation and return results
+            validation_results = validate_timetable(generator, all_sections_data)
+
+            logger.info("Timetable generated and saved successfully")
+            result = {
+                "status": "success",
+                "message": "Timetable generated and saved successfully",
+                "validation_summary": {
+                    "subject_hours_valid": validation_results.get("structure_valid", False),
+                    "venue_clashes": validation_results.get("has_venue_clashes", False)
+                }
+            }
+            if generate_memory or save_memory:
+                result["memory"] = {"generate": generate_memory, "save": save_memory}
+            return result
 
-    except HTTPException as he:
-        raise he
-    except Exception as e:
-        logger.error(f"Exception during timetable generation: {str(e)}\n{traceback.format_exc()}")
-        raise HTTPException(status_code=500, detail=f"Timetable generation failed: {str(e)}")
+        except HTTPException as he:
+            raise he
+        except Exception as e:
+            logger.error(f"Exception during timetable generation: {str(e)}\n{traceback.format_exc()}")
+            raise HTTPException(status_code=500, detail=f"Timetable generation failed: {str(e)}")
 
-@app.get("/api/timetable/{schema_name}/excel")
-async def download_timetables_excel(schema_name: str):
+@app.get("/api/timetable/{schema_name}/excel", dependencies=[Depends(auth.require_auth)])
+def download_timetables_excel(schema_name: str):
     """
-    Generate and download Excel files for timetables
+    Download the Excel files of a timetable run as a zip, built once per run and then served from disk
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
         # Check if schema exists
-        cursor.execute('SHOW DATABASES')
-        databases = cursor.fetchall()
-        if schema_name not in [db['Database'] for db in databases]:
+        if not catalog.get_catalog().run_exists(schema_name):
             raise HTTPException(status_code=404, detail=f"Schema {schema_name} not found")
         
-        # Switch to schema
-        conn.database = schema_name
-        cursor = conn.cursor(dictionary=True)
-        
-        # Create Excel files
-        excels = {
-            'class_timetables.xlsx': create_class_timetables_excel(cursor),
-            'teacher_timetables.xlsx': create_teacher_timetables_excel(cursor),
-            'venue_timetables.xlsx': create_venue_timetables_excel(cursor)
-        }
+        # The workbooks are written to disk in parallel and the finished archive is kept
+        path = excel_export.get_exporter().archive(schema_name)
         
-        # Create ZIP file in memory
-        zip_buffer = BytesIO()
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            for filename, excel_data in excels.items():
-                zip_file.writestr(filename, excel_data.getvalue())
-        
-        # Get the ZIP content
-        zip_buffer.seek(0)
-        content = zip_buffer.getvalue()
-        
-        # Create response with proper headers
-        return Response(
-            content=content,
+        # Streamed from the file in chunks
+        return FileResponse(
+            path,
             media_type='application/zip',
-            headers={
-                'Content-Disposition': f'attachment; filename=timetables_{schema_name}.zip'
-            }
+            filename=f'timetables_{schema_name}.zip',
+            headers={'Cache-Control': http_cache.IMMUTABLE_CACHE_CONTROL}
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error creating Excel files: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if conn:
-            conn.close()
-
-def create_class_timetables_excel(cursor):
-    wb = Workbook()
-    cursor.execute("SELECT * FROM class_timetables ORDER BY year, section")
-    class_data = cursor.fetchall()
-    
-    for item in class_data:
-        sheet_name = f"Year{item['year']}-{item['section']}"
-        ws = wb.create_sheet(sheet_name)
-        
-        # Add headers
-        ws.append(['Time'] + PREDEFINED_DAYS)
-        
-        timetable = safe_json_parse(item['timetable_data'])
-        
-        # Add data rows
-        for slot in PREDEFINED_SLOTS:
-            row = [slot]
-            for day in PREDEFINED_DAYS:
-                cell_data = timetable.get(day, {}).get(slot, '')
-                if isinstance(cell_data, dict):
-                    cell_text = f"{cell_data.get('code', '')}\n{cell_data.get('teacher', '')}"
-                    if cell_data.get('venue'):
-                        cell_text += f"\n{cell_data['venue']}"
-                    row.append(cell_text)
-                else:
-                    row.append(cell_data or 'FREE')
-            ws.append(row)
-    
-    # Remove default sheet
-    del wb['Sheet']
-    
-    excel_buffer = BytesIO()
-    wb.save(excel_buffer)
-    excel_buffer.seek(0)
-    return excel_buffer
-
-def create_teacher_timetables_excel(cursor):
-    wb = Workbook()
-    cursor.execute("SELECT * FROM teacher_timetables ORDER BY teacher_name")
-    teacher_data = cursor.fetchall()
-    
-    for item in teacher_data:
-        sheet_name = item['teacher_name'][:31]  # Excel sheet name length limit
-        ws = wb.create_sheet(sheet_name)
-        
-        # Add headers
-        ws.append(['Time'] + PREDEFINED_DAYS)
-        
-        timetable = safe_json_parse(item['timetable_data'])
-        
-        # Add data rows
-        for slot in PREDEFINED_SLOTS:
-            row = [slot]
-            for day in PREDEFINED_DAYS:
-                cell_data = timetable.get(day, {}).get(slot, '')
-                if isinstance(cell_data, dict):
-                    cell_text = f"{cell_data.get('code', '')}\n{cell_data.get('year', '')}-{cell_data.get('section', '')}"
-                    if cell_data.get('venue'):
-                        cell_text += f"\n{cell_data['venue']}"
-                    row.append(cell_text)
-                else:
-                    row.append(cell_data or 'FREE')
-            ws.append(row)
-    
-    # Remove default sheet
-    del wb['Sheet']
-    
-    excel_buffer = BytesIO()
-    wb.save(excel_buffer)
-    excel_buffer.seek(0)
-    return excel_buffer
-
-def create_venue_timetables_excel(cursor):
-    wb = Workbook()
-    cursor.execute("SELECT * FROM venue_timetables ORDER BY venue_name")
-    venue_data = cursor.fetchall()
-    
-    for item in venue_data:
-        sheet_name = item['venue_name'][:31]  # Excel sheet name length limit
-        ws = wb.create_sheet(sheet_name)
-        
-        # Add headers
-        ws.append(['Time'] + PREDEFINED_DAYS)
-        
-        timetable = safe_json_parse(item['timetable_data'])
-        
-        # Add data rows
-        for slot in PREDEFINED_SLOTS:
-            row = [slot]
-            for day in PREDEFINED_DAYS:
-                cell_data = timetable.get(day, {}).get(slot, '')
-                if isinstance(cell_data, dict):
-                    cell_text = f"{cell_data.get('code', '')}\n{cell_data.get('teacher', '')}\n{cell_data.get('year', '')}-{cell_data.get('section', '')}"
-                    row.append(cell_text)
-                else:
-                    row.append(cell_data or 'FREE')
-            ws.append(row)
-    
-    # Remove default sheet
-    del wb['Sheet']
-    
-    excel_buffer = BytesIO()
-    wb.save(excel_buffer)
-    excel_buffer.seek(0)  # Only seek once
-    return excel_buffer
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,33 @@
+import sys
+import getpass
+import argparse
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import auth
+import storage
+
+def main():
+    parser = argparse.ArgumentParser(description='Create a login user or reset their password in the configured storage backend')
+    parser.add_argument('username', help='Username to create or update')
+    args = parser.parse_args()
+
+    password = getpass.getpass(f"Password for {args.username}: ")
+    if password != getpass.getpass("Repeat password: "):
+        print("Passwords do not match")
+        return 1
+
+    backend = storage.get_storage()
+    backend.initialize()
+    password_hash = auth.hash_password(password)
+    if backend.fetch_user(args.username):
+        backend.update_password(args.username, password_hash)
+        print(f"Password updated for {args.username} ({backend.name})")
+    else:
+        backend.create_user(args.username, password_hash)
+        print(f"Created user {args.username} ({backend.name})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+import os
+import logging
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+logger = logging.getLogger('timetable_api')
+
+# Trace memory around generation, save and Excel export ("1" to enable). Tracing
+# slows allocation-heavy code severalfold, so it is meant for diagnosing OOMs.
+MEMORY_TRACE = os.getenv('MEMORY_TRACE', '0') == '1'
+
+# Allocation sites reported per traced section
+MEMORY_TRACE_TOP = int(os.getenv('MEMORY_TRACE_TOP', '10'))
+
+# Seconds between checks for a new high-water mark, when the top sites are snapshotted
+MEMORY_TRACE_INTERVAL = float(os.getenv('MEMORY_TRACE_INTERVAL', '0.05'))
+
+# A snapshot is retaken once traced memory exceeds the last one by this factor
+_SNAPSHOT_GROWTH = 1.1
+
+_EXCLUDE = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>")
+]
+
+# tracemalloc's peak is process-wide, so traced sections run one at a time
+_capture_lock = threading.Lock()
+
+_last_peaks: Dict[str, int] = {}
+_last_peaks_lock = threading.Lock()
+
+
+class _Watcher:
+    """
+    Snapshots the heap whenever traced memory reaches a new high, so the
+    reported sites are those holding memory near the peak, not at the end
+    """
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.snapshot: Optional[tracemalloc.Snapshot] = None
+        self.snapshot_bytes = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='memtrace', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def check(self):
+        current = tracemalloc.get_traced_memory()[0]
+        if current > self.snapshot_bytes * _SNAPSHOT_GROWTH:
+            self.snapshot = tracemalloc.take_snapshot()
+            self.snapshot_bytes = current
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def _top_sites(snapshot: tracemalloc.Snapshot, limit: int) -> List[Dict]:
+    return [
+        {
+            "site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "bytes": stat.size,
+            "count": stat.count
+        }
+        for stat in snapshot.filter_traces(_EXCLUDE).statistics('lineno')[:limit]
+    ]
+
+
+@contextmanager
+def capture(section: str, enabled: Optional[bool] = None):
+    """
+    Trace allocations made by any thread inside the block. Yields a dict that
+    is filled on exit with peak_bytes, retained_bytes and the top allocation
+    sites near the peak; it stays empty when tracing is disabled.
+    """
+    report: Dict = {}
+    if not (MEMORY_TRACE if enabled is None else enabled):
+        yield report
+        return
+
+    with _capture_lock:
+        # Leave tracing running if something else (PYTHONTRACEMALLOC) started it
+        owned = not tracemalloc.is_tracing()
+        if owned:
+            tracemalloc.start()
+        watcher = None
+        try:
+            tracemalloc.reset_peak()
+            watcher = _Watcher(MEMORY_TRACE_INTERVAL)
+            yield report
+        finally:
+            if watcher is not None:
+                watcher.stop()
+                watcher.check()
+            retained, peak = tracemalloc.get_traced_memory()
+            snapshot = watcher.snapshot if watcher and watcher.snapshot else tracemalloc.take_snapshot()
+            report.update({
+                "section": section,
+                "peak_bytes": peak,
+                "retained_bytes": retained,
+                "snapshot_bytes": watcher.snapshot_bytes if watcher else retained,
+                "top": _top_sites(snapshot, MEMORY_TRACE_TOP)
+            })
+            if owned:
+                tracemalloc.stop()
+            with _last_peaks_lock:
+                _last_peaks[section] = peak
+            logger.info(f"Memory trace of {section}: peak {peak / 1024 / 1024:.1f} MiB, "
+                        f"retained {retained / 1024 / 1024:.1f} MiB")
+
+
+def call(section: str, func, *args):
+    """
+    Run func under capture(section), returning its result and the memory report
+    """
+    with capture(section) as report:
+        result = func(*args)
+    return result, report
+
+
+def last_peaks() -> Dict[str, int]:
+    """
+    Peak traced bytes of the most recent capture of each section
+    """
+    with _last_peaks_lock:
+        return dict(_last_peaks)
@@ -0,0 +1,250 @@
+import math
+import time
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import server_timing
+
+# Upper bounds, in seconds, for request and query latencies
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Upper bounds for generation, allocation and export jobs, which take seconds to minutes
+JOB_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in values
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # Per label set: non-cumulative bucket counts, then sum
+        self._series: Dict[Tuple, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._series.setdefault(key, ([0] * len(self.buckets), [0.0]))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            total[0] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, list(counts), total[0]) for key, (counts, total) in self._series.items())
+        lines = self.header()
+        bucket_labels = self.label_names + ("le",)
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(bucket_labels, key + (_format_value(bound),))} {cumulative}"
+                )
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """
+    Gauge or counter read from another component when scraped. The callback
+    returns a number, a {label value(s): number} dict, or None when the
+    component has not been created yet.
+    """
+    def __init__(self, name: str, documentation: str, callback: Callable, labels: Sequence[str] = (),
+                 kind: str = "gauge"):
+        super().__init__(name, documentation, labels)
+        self.kind = kind
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        value = self.callback()
+        if value is None:
+            return []
+        samples = value.items() if isinstance(value, dict) else [((), value)]
+        lines = self.header()
+        for key, sample in samples:
+            key = key if isinstance(key, tuple) else (key,)
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(sample)}")
+        return lines
+
+
+class Registry:
+    """
+    Metrics of this process, rendered in the Prometheus text exposition format
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def callback(self, name: str, documentation: str, callback: Callable, labels: Sequence[str] = (),
+                 kind: str = "gauge") -> CallbackMetric:
+        return self.register(CallbackMetric(name, documentation, callback, labels, kind))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "timetable_http_request_duration_seconds",
+    "Time until response headers are sent, by route template",
+    ("method", "route", "status")
+)
+
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    "timetable_db_query_duration_seconds",
+    "Storage backend statement execution time, by leading SQL keyword",
+    ("backend", "statement")
+)
+
+DB_QUERY_ERRORS = REGISTRY.counter(
+    "timetable_db_query_errors_total",
+    "Storage backend statements that raised",
+    ("backend", "statement")
+)
+
+GENERATIONS = REGISTRY.counter(
+    "timetable_generations_total",
+    "Timetable generation requests by outcome",
+    ("outcome",)
+)
+
+GENERATION_ATTEMPTS = REGISTRY.counter(
+    "timetable_generation_attempts_total",
+    "Scheduling attempts made by the generator"
+)
+
+GENERATION_SECONDS = REGISTRY.histogram(
+    "timetable_generation_duration_seconds",
+    "Time spent in each stage of a timetable generation request",
+    ("stage",),
+    JOB_BUCKETS
+)
+
+ALLOCATION_SECONDS = REGISTRY.histogram(
+    "timetable_allocation_duration_seconds",
+    "Run time of the department file processing scripts",
+    ("script", "outcome"),
+    JOB_BUCKETS
+)
+
+EXCEL_EXPORT_SECONDS = REGISTRY.histogram(
+    "timetable_excel_export_duration_seconds",
+    "Time to build the Excel archive of a timetable run",
+    buckets=JOB_BUCKETS
+)
+
+
+@contextmanager
+def observe_query(backend: str, query: str):
+    """
+    Time one statement and count it under its leading keyword (select, insert, show, ...),
+    also reported as db-<keyword> in the request's Server-Timing header
+    """
+    statement = query.split(None, 1)[0].lower() if query.strip() else "unknown"
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        DB_QUERY_ERRORS.inc(backend=backend, statement=statement)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        DB_QUERY_SECONDS.observe(elapsed, backend=backend, statement=statement)
+        server_timing.record(f"db-{statement}", elapsed)
+
+
+def render() -> str:
+    return REGISTRY.render()
+
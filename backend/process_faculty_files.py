@@ -8,6 +8,8 @@ import traceback
 import argparse
 from dotenv import load_dotenv
 
+import storage
+
 def main():
     # Parse command line arguments
     parser = argparse.ArgumentParser(description='Process faculty files and allocate subjects')
@@ -302,13 +304,7 @@ def connect_to_database(schema_name):
         load_dotenv()
         
         # Connect to Aiven MySQL server using environment variables
-        conn = mysql.connector.connect(
-            host=os.getenv('DB_HOST'),
-            port=int(os.getenv('DB_PORT')),
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD'),
-            database=os.getenv('DB_NAME')
-        )
+        conn = storage.mysql_connect()
         cursor = conn.cursor()
         print("Connected to Aiven MySQL server successfully.")
         
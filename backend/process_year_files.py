@@ -6,6 +6,8 @@ import sys
 import argparse
 from dotenv import load_dotenv
 
+import storage
+
 def main():
     # Parse command line arguments
     parser = argparse.ArgumentParser(description='Process year files and create database tables')
@@ -22,13 +24,7 @@ def main():
         load_dotenv()
         
         # Connect to Aiven MySQL server using environment variables
-        conn = mysql.connector.connect(
-            host=os.getenv('DB_HOST'),
-            port=int(os.getenv('DB_PORT')),
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD'),
-            database=os.getenv('DB_NAME')
-        )
+        conn = storage.mysql_connect()
         cursor = conn.cursor()
         print("Connected to Aiven MySQL server successfully.")
         
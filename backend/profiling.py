@@ -0,0 +1,279 @@
+import os
+import sys
+import json
+import time
+import uuid
+import logging
+import tempfile
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from fastapi import Depends, HTTPException
+
+import auth
+import server_timing
+
+logger = logging.getLogger('timetable_api')
+
+# Users (token subjects) allowed to profile a request; profiling is off while this is empty
+PROFILE_ADMINS = {name.strip() for name in os.getenv('PROFILE_ADMINS', '').split(',') if name.strip()}
+
+# Where finished profiles are written, and how many of the newest are kept
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join('data', 'profiles'))
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', '20'))
+
+# Seconds between stack samples, and the longest a single profile may sample for
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', '0.005'))
+PROFILE_MAX_SECONDS = float(os.getenv('PROFILE_MAX_SECONDS', '600'))
+
+# Request header or query parameter that asks for a profile
+PROFILE_HEADER = "x-profile"
+PROFILE_QUERY = "profile"
+
+# Values of either that ask for a profile; anything else (0, false, ...) does not
+PROFILE_ON_VALUES = {"1", "true", "yes"}
+
+# Functions a thread sits in while it has nothing to do; such samples are dropped
+IDLE_FUNCTIONS = {
+    ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"), ("queue.py", "get"), ("thread.py", "_worker")
+}
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _is_idle(frame) -> bool:
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_FUNCTIONS
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of busy threads at a fixed interval while one request
+    runs: those returned by threads() at each sample, or every thread if it
+    is None. Offloaded work (database calls, generation, exports) runs on
+    worker threads, which a sampler sees and a per-thread tracer would not.
+    Overhead is one stack walk per interval, so it is safe on a live server.
+    """
+    def __init__(self, threads: Optional[Callable[[], Set[int]]] = None, interval: float = PROFILE_INTERVAL,
+                 max_seconds: float = PROFILE_MAX_SECONDS):
+        self.selected = threads
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.stacks: Counter = Counter()
+        self.threads: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+
+    def start(self):
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self._thread.start()
+
+    def _run(self):
+        own = threading.get_ident()
+        deadline = time.perf_counter() + self.max_seconds
+        names = {}
+        while not self._stop.wait(self.interval) and time.perf_counter() < deadline:
+            self.samples += 1
+            selected = self.selected() if self.selected else None
+            for ident, frame in sys._current_frames().items():
+                if ident == own or (selected is not None and ident not in selected) or _is_idle(frame):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if ident not in names:
+                    thread = next((t for t in threading.enumerate() if t.ident == ident), None)
+                    names[ident] = thread.name if thread else str(ident)
+                self.stacks[(names[ident],) + tuple(reversed(stack))] += 1
+                self.threads[names[ident]] += 1
+
+    def stop(self) -> Dict:
+        self._stop.set()
+        self._thread.join()
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        return self.report(wall, cpu)
+
+    def report(self, wall: float, cpu: float, top: int = 40) -> Dict:
+        self_samples: Counter = Counter()
+        total_samples: Counter = Counter()
+        for stack, count in self.stacks.items():
+            self_samples[stack[-1]] += count
+            for label in set(stack[1:]):
+                total_samples[label] += count
+
+        # Samples land further apart than the interval while busy threads hold the GIL
+        per_sample = wall / self.samples if self.samples else self.interval
+
+        def ranked(counter: Counter) -> List[Dict]:
+            return [
+                {"function": label, "samples": count, "seconds": round(count * per_sample, 3)}
+                for label, count in counter.most_common(top)
+            ]
+
+        return {
+            "wall_seconds": round(wall, 3),
+            # Whole process, so it includes any other requests served meanwhile
+            "cpu_seconds": round(cpu, 3),
+            "interval_seconds": self.interval,
+            "samples": self.samples,
+            "threads": dict(self.threads.most_common()),
+            "top_self": ranked(self_samples),
+            "top_total": ranked(total_samples),
+            # Folded stacks (thread;outer;...;inner count), ready for flamegraph tools
+            "folded": [f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common()]
+        }
+
+
+def requested(request) -> bool:
+    values = (request.headers.get(PROFILE_HEADER), request.query_params.get(PROFILE_QUERY))
+    return any(value is not None and value.strip().lower() in PROFILE_ON_VALUES for value in values)
+
+
+def is_admin(request) -> bool:
+    """
+    Whether the request carries a valid session token of a PROFILE_ADMINS user
+    """
+    scheme, _, token = request.headers.get('authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return False
+    try:
+        return auth.verify_token(token).get('sub') in PROFILE_ADMINS
+    except auth.InvalidToken:
+        return False
+
+
+def require_admin(claims: Dict = Depends(auth.require_auth)) -> Dict:
+    """
+    FastAPI dependency for the profile endpoints: a session of a PROFILE_ADMINS user
+    """
+    if claims.get('sub') not in PROFILE_ADMINS:
+        raise HTTPException(status_code=403, detail="Profiling is restricted to PROFILE_ADMINS users")
+    return claims
+
+
+class ProfileStore:
+    """
+    Profiles on disk by id, pruned to the PROFILE_KEEP newest
+    """
+    def __init__(self, directory: str = PROFILE_DIR, keep: int = PROFILE_KEEP):
+        self.directory = directory
+        self.keep = keep
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, profile_id: str) -> str:
+        if not profile_id.isalnum():
+            raise ValueError(f"Invalid profile id: {profile_id}")
+        return os.path.join(self.directory, f"{profile_id}.json")
+
+    def save(self, profile: Dict) -> str:
+        profile_id = uuid.uuid4().hex
+        with tempfile.NamedTemporaryFile('w', dir=self.directory, suffix='.tmp', delete=False) as f:
+            json.dump({"id": profile_id, **profile}, f)
+        os.replace(f.name, self.path(profile_id))
+        self._prune()
+        return profile_id
+
+    def load(self, profile_id: str) -> Optional[Dict]:
+        try:
+            with open(self.path(profile_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def list(self) -> List[Dict]:
+        profiles = []
+        for name in self._files():
+            with open(os.path.join(self.directory, name)) as f:
+                profile = json.load(f)
+            profiles.append({
+                key: profile.get(key)
+                for key in ("id", "method", "path", "status", "started_at", "wall_seconds", "cpu_seconds")
+            })
+        return profiles
+
+    def _files(self) -> List[str]:
+        names = [name for name in os.listdir(self.directory) if name.endswith('.json')]
+        return sorted(names, key=lambda name: os.path.getmtime(os.path.join(self.directory, name)), reverse=True)
+
+    def _prune(self):
+        for name in self._files()[self.keep:]:
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+
+# One profile at a time, so a profiled request never measures another profiler
+_active = threading.Lock()
+
+_store: Optional[ProfileStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> ProfileStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ProfileStore()
+    return _store
+
+
+class ProfileSession:
+    def __init__(self, request, timings: server_timing.RequestTimings):
+        self.method = request.method
+        self.path = request.url.path
+        self.started_at = datetime.now().isoformat()
+        # The event loop thread the request runs on, plus the worker threads running its offloaded calls
+        loop_thread = threading.get_ident()
+        self.profiler = SamplingProfiler(lambda: server_timing.request_threads(timings) | {loop_thread})
+        self.profiler.start()
+
+    def finish(self, status: int) -> str:
+        try:
+            profile = self.profiler.stop()
+        finally:
+            _active.release()
+        profile_id = get_store().save({
+            "method": self.method,
+            "path": self.path,
+            "status": status,
+            "started_at": self.started_at,
+            **profile
+        })
+        logger.info(
+            f"Profiled {self.method} {self.path}: {profile['wall_seconds']}s wall, "
+            f"{profile['cpu_seconds']}s CPU, id {profile_id}"
+        )
+        return profile_id
+
+
+def start(request, timings: server_timing.RequestTimings) -> Tuple[Optional[str], Optional[ProfileSession]]:
+    """
+    Begin profiling the request if it asked to be and is allowed to. Only the
+    threads working for it are sampled: the event loop thread and worker
+    threads running calls wrapped with server_timing.bound. Returns a
+    status for the X-Profile-Status header (None when no profile was asked
+    for) and the session, if one started.
+    """
+    if not requested(request):
+        return None, None
+    if not PROFILE_ADMINS or not is_admin(request):
+        return "forbidden", None
+    if not _active.acquire(blocking=False):
+        return "busy", None
+    try:
+        return "profiled", ProfileSession(request, timings)
+    except Exception:
+        _active.release()
+        raise
@@ -0,0 +1,157 @@
+import json
+import logging
+from collections import defaultdict
+from typing import Dict, List
+
+logger = logging.getLogger('timetable_api')
+
+NON_TEACHING_SLOTS = ("BREAK", "LUNCH")
+
+
+def dump_view_json(value) -> str:
+    """
+    Compact JSON encoding shared by pre-rendered rows and API responses
+    """
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+class TimetableProjection:
+    """
+    Class, teacher and venue views derived from the generator state in one pass
+    """
+    def __init__(self, days: List[str], slots: List[str]):
+        self.days = list(days)
+        self.slots = list(slots)
+        self.teaching_slots = [slot for slot in self.slots if slot not in NON_TEACHING_SLOTS]
+
+        # (year, section) -> {day: {slot: cell}}
+        self.classes: Dict = {}
+        self.class_free_hours: Dict = {}
+
+        # teacher name -> {day: {slot: cell}}
+        self.teachers: Dict = defaultdict(lambda: defaultdict(dict))
+
+        # venue id (str) -> {day: {slot: cell}}
+        self.venues: Dict = defaultdict(lambda: defaultdict(dict))
+        self.venue_names: Dict = {}
+
+        # teacher name -> employee id, when the faculty sheet provides one
+        self.employee_ids: Dict = {}
+
+        # Flat list of every scheduled cell, one record per (section, day, slot)
+        self.cells: List[Dict] = []
+
+    def _free_hours(self, schedule: Dict) -> Dict:
+        free_hours = {}
+        for day in self.days:
+            booked = schedule.get(day, {})
+            free = [slot for slot in self.teaching_slots if slot not in booked]
+            if free:
+                free_hours[day] = free
+        return free_hours
+
+    def render(self, timetable: Dict) -> Dict:
+        """
+        View-ready copy of a timetable with every day and slot present in display order
+        """
+        return {
+            day: {
+                slot: slot if slot in NON_TEACHING_SLOTS else (timetable.get(day, {}).get(slot) or None)
+                for slot in self.slots
+            }
+            for day in self.days
+        }
+
+    def teacher_free_hours(self, teacher: str) -> Dict:
+        return self._free_hours(self.teachers.get(teacher, {}))
+
+    def venue_free_hours(self, venue_id) -> Dict:
+        return self._free_hours(self.venues.get(str(venue_id), {}))
+
+    def class_entries(self):
+        for (year, section), timetable in self.classes.items():
+            yield year, section, timetable, self.class_free_hours[(year, section)]
+
+    def teacher_entries(self):
+        for teacher, schedule in self.teachers.items():
+            yield teacher, {day: dict(slots) for day, slots in schedule.items()}, self.teacher_free_hours(teacher)
+
+    def venue_entries(self):
+        for venue_id, venue_name in self.venue_names.items():
+            schedule = self.venues.get(venue_id, {})
+            yield venue_id, venue_name, {day: dict(slots) for day, slots in schedule.items()}, self.venue_free_hours(venue_id)
+
+
+def project_timetables(generator, venues: Dict) -> TimetableProjection:
+    """
+    Walk every section x day x slot once and build all three views
+    """
+    projection = TimetableProjection(generator.days, generator.slots)
+    projection.venue_names = {str(venue_id): venue_name for venue_id, venue_name in venues.items()}
+
+    for (year, section), timetable in generator.all_timetables.items():
+        formatted_timetable = {}
+        free_hours = {}
+
+        for day_index, day in enumerate(generator.days):
+            day_row = timetable[day]
+            formatted_day = {}
+
+            for slot_index, slot in enumerate(generator.slots):
+                cell = day_row[slot]
+                if not isinstance(cell, dict):
+                    formatted_day[slot] = cell
+                    if cell == "FREE" and slot not in NON_TEACHING_SLOTS:
+                        free_hours.setdefault(day, []).append(slot)
+                    continue
+
+                venue_label = cell.get('venue')
+                formatted_day[slot] = {
+                    'code': cell.get('code', 'N/A'),
+                    'teacher': cell.get('teacher', 'N/A'),
+                    'type': cell.get('type', 'N/A'),
+                    'venue': venue_label or 'N/A'
+                }
+
+                teacher = cell['teacher']
+                projection.teachers[teacher][day][slot] = {
+                    'year': year,
+                    'section': section,
+                    'code': cell['code'],
+                    'type': cell['type'],
+                    'venue': venue_label or 'N/A'
+                }
+
+                venue_id = None
+                if venue_label:
+                    venue_id = venue_label.split(' - ')[0]
+                    projection.venues[venue_id][day][slot] = {
+                        'year': year,
+                        'section': section,
+                        'code': cell['code'],
+                        'teacher': teacher
+                    }
+
+                projection.cells.append({
+                    'year': year,
+                    'section': section,
+                    'day': day,
+                    'day_index': day_index,
+                    'slot': slot,
+                    'slot_index': slot_index,
+                    'subject_code': cell['code'],
+                    'subject_type': cell['type'],
+                    'teacher': teacher,
+                    'venue_id': venue_id
+                })
+
+            formatted_timetable[day] = formatted_day
+
+        projection.classes[(year, section)] = formatted_timetable
+        projection.class_free_hours[(year, section)] = free_hours
+
+    logger.info(
+        f"Projected {len(projection.classes)} classes, {len(projection.teachers)} teachers, "
+        f"{len(projection.venue_names)} venues from {len(projection.cells)} scheduled cells"
+    )
+    return projection
@@ -0,0 +1,120 @@
+import os
+import time
+import functools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Set
+
+# Send a Server-Timing header with each response ("0" to disable)
+SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING', '1') != '0'
+
+# Share of requests whose timing breakdown is also logged as a JSON record
+SERVER_TIMING_LOG_SAMPLE = float(os.getenv('SERVER_TIMING_LOG_SAMPLE', '0.01'))
+
+# Requests slower than this many milliseconds are always logged
+SERVER_TIMING_SLOW_MS = float(os.getenv('SERVER_TIMING_SLOW_MS', '1000'))
+
+
+class RequestTimings:
+    """
+    Time spent per named step (db-connect, db-select, transform, ...) during
+    one request. Shared by the worker threads the request offloads to.
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._steps: Dict[str, List] = {}
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            step = self._steps.setdefault(name, [0.0, 0])
+            step[0] += seconds
+            step[1] += 1
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def steps(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {
+                name: {"ms": round(seconds * 1000, 3), "count": count}
+                for name, (seconds, count) in self._steps.items()
+            }
+
+    def header(self) -> str:
+        """
+        Server-Timing value: one metric per step, with its call count, then the total
+        """
+        entries = [
+            f'{name};dur={step["ms"]};desc="{step["count"]}x"' for name, step in self.steps().items()
+        ]
+        entries.append(f"total;dur={round(self.elapsed_ms(), 3)}")
+        return ", ".join(entries)
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar('server_timing', default=None)
+
+# Worker threads running a call offloaded by a request, by thread ident
+_bound_threads: Dict[int, RequestTimings] = {}
+
+
+def start() -> RequestTimings:
+    """
+    Begin collecting for the current request; offloaded calls inherit it through the context
+    """
+    timings = RequestTimings()
+    _current.set(timings)
+    return timings
+
+
+def record(name: str, seconds: float):
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+@contextmanager
+def step(name: str):
+    """
+    Time a block under the given step name; a no-op outside a request
+    """
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started)
+
+
+def bound(func: Callable) -> Callable:
+    """
+    Wrap func so that, while a worker thread runs it, the thread is recorded as
+    working for the request whose context it runs in (see request_threads)
+    """
+    @functools.wraps(func)
+    def run(*args, **kwargs):
+        timings = _current.get()
+        if timings is None:
+            return func(*args, **kwargs)
+        ident = threading.get_ident()
+        previous = _bound_threads.get(ident)
+        _bound_threads[ident] = timings
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if previous is None:
+                _bound_threads.pop(ident, None)
+            else:
+                _bound_threads[ident] = previous
+    return run
+
+
+def request_threads(timings: RequestTimings) -> Set[int]:
+    """
+    Idents of the threads currently running calls offloaded by this request
+    """
+    return {ident for ident, owner in list(_bound_threads.items()) if owner is timings}
@@ -0,0 +1,1326 @@
+import os
+import re
+import json
+import sqlite3
+import logging
+import itertools
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+import metrics
+from grid_codec import GridPacker, GridValues, unpack_grid, unpack_values
+from projection import dump_view_json
+
+logger = logging.getLogger('timetable_api')
+
+# Which backend persists timetables and department data: "mysql" or "sqlite"
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'mysql').lower()
+
+# MySQL only. "schema" keeps one MySQL schema per generated timetable (timetable_<timestamp>).
+# "versioned" keeps every run in fixed tables keyed by run_id inside STORE_SCHEMA.
+STORAGE_MODE = os.getenv('TIMETABLE_STORAGE_MODE', 'schema').lower()
+
+# Must not start with "timetable_" so it is never mistaken for a per-run schema
+STORE_SCHEMA = os.getenv('TIMETABLE_STORE_SCHEMA', 'timetablestore')
+
+# SQLite only. Timetable runs live in one file; each department is its own file.
+SQLITE_PATH = os.getenv('SQLITE_PATH', os.path.join('data', 'timetables.sqlite3'))
+SQLITE_DEPARTMENTS_DIR = os.getenv('SQLITE_DEPARTMENTS_DIR', os.path.join('data', 'departments'))
+
+# Rows fetched per round trip when streaming a table to the client
+STREAM_BATCH_SIZE = int(os.getenv('STREAM_BATCH_SIZE', '200'))
+
+# How new runs store each timetable: "json" keeps timetable_data and free_hours as JSON;
+# "packed" replaces both with grid_blob, bitmasks and an offset into a table of cell
+# values stored once per run and view (see grid_codec.py). Both keep rendered_json
+# for the API responses.
+# Runs saved either way stay readable.
+GRID_ENCODING = os.getenv('TIMETABLE_GRID_ENCODING', 'json').lower()
+
+# Decoded values tables of packed runs kept in memory, one per run and view; runs never change once saved
+GRID_VALUES_CACHE_SIZE = int(os.getenv('GRID_VALUES_CACHE_SIZE', '48'))
+
+SYSTEM_SCHEMAS = [
+    'defaultdb', 'information_schema',
+    'mysql', 'performance_schema', 'sys', 'login_details'
+]
+
+TIMETABLE_TABLES = {
+    "class_timetables": "year, section",
+    "teacher_timetables": "teacher_name",
+    "venue_timetables": "venue_name"
+}
+
+RUN_SCHEMA_TABLES = {
+    "class_timetables": """
+        CREATE TABLE {schema}.class_timetables (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            year INT,
+            section VARCHAR(10),
+            timetable_data JSON,
+            free_hours JSON,
+            rendered_json LONGTEXT,
+            grid_blob LONGBLOB,
+            generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_class (year, section)
+        )
+    """,
+    "teacher_timetables": """
+        CREATE TABLE {schema}.teacher_timetables (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            employee_id VARCHAR(20),
+            teacher_name VARCHAR(100),
+            timetable_data JSON,
+            free_hours JSON,
+            rendered_json LONGTEXT,
+            grid_blob LONGBLOB,
+            generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_teacher_name (teacher_name),
+            INDEX idx_teacher_employee (employee_id)
+        )
+    """,
+    "venue_timetables": """
+        CREATE TABLE {schema}.venue_timetables (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            venue_id VARCHAR(20),
+            venue_name VARCHAR(100),
+            timetable_data JSON,
+            free_hours JSON,
+            rendered_json LONGTEXT,
+            grid_blob LONGBLOB,
+            generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_venue_id (venue_id)
+        )
+    """,
+    "grid_values": """
+        CREATE TABLE {schema}.grid_values (
+            table_name VARCHAR(64) PRIMARY KEY,
+            values_blob LONGBLOB
+        )
+    """,
+    "cells": """
+        CREATE TABLE {schema}.cells (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            year INT,
+            section VARCHAR(10),
+            teacher VARCHAR(100),
+            venue_id VARCHAR(20),
+            day VARCHAR(10),
+            day_index TINYINT,
+            slot VARCHAR(20),
+            slot_index TINYINT,
+            subject_code VARCHAR(20),
+            subject_type VARCHAR(5),
+            INDEX idx_cells_class (year, section, day_index, slot_index),
+            INDEX idx_cells_teacher (teacher, day_index, slot_index),
+            INDEX idx_cells_venue (venue_id, day_index, slot_index),
+            INDEX idx_cells_day_slot (day_index, slot_index)
+        )
+    """
+}
+
+VERSIONED_STORE_TABLES = {
+    "timetable_runs": """
+        CREATE TABLE IF NOT EXISTS {schema}.timetable_runs (
+            run_id VARCHAR(64) PRIMARY KEY,
+            created_at DATETIME(6) NOT NULL,
+            seed BIGINT,
+            input_hash CHAR(64),
+            stats JSON,
+            INDEX idx_runs_created_at (created_at)
+        )
+    """,
+    "class_timetables": """
+        CREATE TABLE IF NOT EXISTS {schema}.class_timetables (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            run_id VARCHAR(64) NOT NULL,
+            year INT,
+            section VARCHAR(10),
+            timetable_data JSON,
+            free_hours JSON,
+            rendered_json LONGTEXT,
+            grid_blob LONGBLOB,
+            generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_class_run (run_id, year, section)
+        )
+    """,
+    "teacher_timetables": """
+        CREATE TABLE IF NOT EXISTS {schema}.teacher_timetables (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            run_id VARCHAR(64) NOT NULL,
+            employee_id VARCHAR(20),
+            teacher_name VARCHAR(100),
+            timetable_data JSON,
+            free_hours JSON,
+            rendered_json LONGTEXT,
+            grid_blob LONGBLOB,
+            generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_teacher_run (run_id, teacher_name),
+            INDEX idx_teacher_employee (run_id, employee_id)
+        )
+    """,
+    "venue_timetables": """
+        CREATE TABLE IF NOT EXISTS {schema}.venue_timetables (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            run_id VARCHAR(64) NOT NULL,
+            venue_id VARCHAR(20),
+            venue_name VARCHAR(100),
+            timetable_data JSON,
+            free_hours JSON,
+            rendered_json LONGTEXT,
+            grid_blob LONGBLOB,
+            generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_venue_run (run_id, venue_name),
+            INDEX idx_venue_id (run_id, venue_id)
+        )
+    """,
+    "grid_values": """
+        CREATE TABLE IF NOT EXISTS {schema}.grid_values (
+            run_id VARCHAR(64) NOT NULL,
+            table_name VARCHAR(64) NOT NULL,
+            values_blob LONGBLOB,
+            PRIMARY KEY (run_id, table_name)
+        )
+    """,
+    "cells": """
+        CREATE TABLE IF NOT EXISTS {schema}.cells (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            run_id VARCHAR(64) NOT NULL,
+            year INT,
+            section VARCHAR(10),
+            teacher VARCHAR(100),
+            venue_id VARCHAR(20),
+            day VARCHAR(10),
+            day_index TINYINT,
+            slot VARCHAR(20),
+            slot_index TINYINT,
+            subject_code VARCHAR(20),
+            subject_type VARCHAR(5),
+            INDEX idx_cells_class (run_id, year, section, day_index, slot_index),
+            INDEX idx_cells_teacher (run_id, teacher, day_index, slot_index),
+            INDEX idx_cells_venue (run_id, venue_id, day_index, slot_index),
+            INDEX idx_cells_day_slot (run_id, day_index, slot_index)
+        )
+    """
+}
+
+SQLITE_STORE_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS timetable_runs (
+        run_id TEXT PRIMARY KEY,
+        created_at TEXT NOT NULL,
+        seed INTEGER,
+        input_hash TEXT,
+        stats TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_runs_created_at ON timetable_runs (created_at)",
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS class_timetables (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        run_id TEXT NOT NULL,
+        year INTEGER,
+        section TEXT,
+        timetable_data TEXT,
+        free_hours TEXT,
+        rendered_json TEXT,
+        grid_blob BLOB,
+        generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_class_run ON class_timetables (run_id, year, section)",
+    """
+    CREATE TABLE IF NOT EXISTS teacher_timetables (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        run_id TEXT NOT NULL,
+        employee_id TEXT,
+        teacher_name TEXT,
+        timetable_data TEXT,
+        free_hours TEXT,
+        rendered_json TEXT,
+        grid_blob BLOB,
+        generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_teacher_run ON teacher_timetables (run_id, teacher_name)",
+    "CREATE INDEX IF NOT EXISTS idx_teacher_employee ON teacher_timetables (run_id, employee_id)",
+    """
+    CREATE TABLE IF NOT EXISTS venue_timetables (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        run_id TEXT NOT NULL,
+        venue_id TEXT,
+        venue_name TEXT,
+        timetable_data TEXT,
+        free_hours TEXT,
+        rendered_json TEXT,
+        grid_blob BLOB,
+        generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_venue_run ON venue_timetables (run_id, venue_name)",
+    "CREATE INDEX IF NOT EXISTS idx_venue_id ON venue_timetables (run_id, venue_id)",
+    """
+    CREATE TABLE IF NOT EXISTS grid_values (
+        run_id TEXT NOT NULL,
+        table_name TEXT NOT NULL,
+        values_blob BLOB,
+        PRIMARY KEY (run_id, table_name)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS cells (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        run_id TEXT NOT NULL,
+        year INTEGER,
+        section TEXT,
+        teacher TEXT,
+        venue_id TEXT,
+        day TEXT,
+        day_index INTEGER,
+        slot TEXT,
+        slot_index INTEGER,
+        subject_code TEXT,
+        subject_type TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_cells_class ON cells (run_id, year, section, day_index, slot_index)",
+    "CREATE INDEX IF NOT EXISTS idx_cells_teacher ON cells (run_id, teacher, day_index, slot_index)",
+    "CREATE INDEX IF NOT EXISTS idx_cells_venue ON cells (run_id, venue_id, day_index, slot_index)",
+    "CREATE INDEX IF NOT EXISTS idx_cells_day_slot ON cells (run_id, day_index, slot_index)"
+]
+
+# Indexes behind the single-entity lookups (teacher by employee_id, venue by venue_id).
+# VERSIONED_STORE_TABLES creates them; initialize() adds them to stores created without them.
+VERSIONED_STORE_INDEXES = {
+    "idx_teacher_employee": ("teacher_timetables", "run_id, employee_id"),
+    "idx_venue_id": ("venue_timetables", "run_id, venue_id")
+}
+
+# Columns a single timetable row can be looked up by, each backed by an index
+TIMETABLE_LOOKUP_COLUMNS = {
+    "class_timetables": ("year", "section"),
+    "teacher_timetables": ("employee_id", "teacher_name"),
+    "venue_timetables": ("venue_id", "venue_name")
+}
+
+# Data tables holding per-run rows, in the order they are deleted
+RUN_DATA_TABLES = ["cells", "class_timetables", "teacher_timetables", "venue_timetables", "grid_values"]
+
+# Filters accepted by query_cells, with the column and comparison each one uses
+CELL_FILTERS = {
+    "year": ("year", "="),
+    "section": ("section", "="),
+    "teacher": ("teacher", "="),
+    "venue_id": ("venue_id", "="),
+    "day_index": ("day_index", "="),
+    "slot_from": ("slot_index", ">="),
+    "slot_to": ("slot_index", "<=")
+}
+
+CELL_COLUMNS = "year, section, teacher, venue_id, day, slot, subject_code, subject_type"
+
+
+class RunNotFoundError(LookupError):
+    """
+    Raised when a timetable run or one of its tables does not exist
+    """
+
+
+def validate_run_id(run_id: str) -> str:
+    if not re.fullmatch(r'timetable_\w+', run_id or ''):
+        raise ValueError(f"Invalid timetable run name: {run_id}")
+    return run_id
+
+
+def validate_identifier(name: str) -> str:
+    """
+    Guard department, table and column names that are interpolated into SQL
+    """
+    if not re.fullmatch(r'[\w\- ]+', name or ''):
+        raise ValueError(f"Invalid identifier: {name}")
+    return name
+
+
+def _lookup_conditions(table: str, match: Dict, placeholder: str):
+    unknown = set(match) - set(TIMETABLE_LOOKUP_COLUMNS[table])
+    if not match or unknown:
+        raise ValueError(f"Invalid lookup on {table}: {sorted(match)}")
+    return [f"{column} = {placeholder}" for column in match], list(match.values())
+
+
+class GridValuesCache:
+    """
+    Decoded values tables of packed runs by (run_id, table), least recently used evicted
+    """
+    def __init__(self, size: int = GRID_VALUES_CACHE_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, run_id: str, table: str) -> Optional[GridValues]:
+        with self._lock:
+            grid_values = self._entries.get((run_id, table))
+            if grid_values is not None:
+                self._entries.move_to_end((run_id, table))
+            return grid_values
+
+    def put(self, run_id: str, table: str, grid_values: GridValues):
+        with self._lock:
+            self._entries[(run_id, table)] = grid_values
+            self._entries.move_to_end((run_id, table))
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def discard_run(self, run_id: str):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == run_id]:
+                del self._entries[key]
+
+
+def _keyset_clause(order_by: str, after, direction: str, placeholder: str):
+    """
+    WHERE and ORDER BY for a keyset page over (order_by, id), starting after
+    the (value, id) of the previous page's last row
+    """
+    column = f"`{validate_identifier(order_by)}`"
+    operator = '<' if direction == 'DESC' else '>'
+    if order_by == 'id':
+        order_clause = f"ORDER BY id {direction}"
+        if after is None:
+            return "", order_clause, []
+        return f"WHERE id {operator} {placeholder}", order_clause, [after[1]]
+
+    order_clause = f"ORDER BY {column} {direction}, id {direction}"
+    if after is None:
+        return "", order_clause, []
+    value, last_id = after
+    where_clause = (
+        f"WHERE ({column} {operator} {placeholder} "
+        f"OR ({column} = {placeholder} AND id {operator} {placeholder}))"
+    )
+    return where_clause, order_clause, [value, value, last_id]
+
+
+def _cell_conditions(filters: Dict, placeholder: str):
+    conditions = []
+    params = []
+    for key, value in filters.items():
+        if value is None:
+            continue
+        column, operator = CELL_FILTERS[key]
+        conditions.append(f"{column} {operator} {placeholder}")
+        params.append(value)
+    return conditions, params
+
+
+class TimetableStorage:
+    """
+    Persistence interface for timetable runs and department data
+    """
+    name = "base"
+    placeholder = "%s"
+
+    # Timetable runs
+    def save_run(self, run_id: str, projection, seed=None, input_hash=None, stats=None):
+        raise NotImplementedError
+
+    def list_runs(self) -> List[str]:
+        raise NotImplementedError
+
+    def latest_run(self) -> Optional[str]:
+        runs = self.list_runs()
+        return runs[-1] if runs else None
+
+    def run_exists(self, run_id: str) -> bool:
+        raise NotImplementedError
+
+    def delete_run(self, run_id: str):
+        raise NotImplementedError
+
+    def fetch_timetables(self, run_id: str, table: str) -> List[Dict]:
+        raise NotImplementedError
+
+    def fetch_rendered(self, run_id: str, table: str) -> Optional[List[str]]:
+        """
+        Pre-rendered JSON of each row in display order, or None when the run
+        was saved before rendered_json existed
+        """
+        raise NotImplementedError
+
+    def fetch_timetable(self, run_id: str, table: str, match: Dict) -> Optional[Dict]:
+        """
+        One timetable row by its identifying columns (see TIMETABLE_LOOKUP_COLUMNS), or None
+        """
+        raise NotImplementedError
+
+    def iter_timetables(self, run_id: str, table: str) -> Iterator[Dict]:
+        """
+        Like fetch_timetables, but rows are read from an unbuffered cursor in
+        batches of STREAM_BATCH_SIZE; the connection is held until the iterator
+        is exhausted or closed
+        """
+        raise NotImplementedError
+
+    def _iter_rendered(self, run_id: str, table: str) -> Iterator[Optional[str]]:
+        raise NotImplementedError
+
+    def _fetch_grid_values(self, run_id: str) -> Dict[str, bytes]:
+        """
+        Stored values tables of a packed run, keyed by view table
+        """
+        raise NotImplementedError
+
+    def _grid_values(self, run_id: str, table: str) -> GridValues:
+        grid_values = self._grid_values_cache.get(run_id, table)
+        if grid_values is None:
+            # Load every view's table at once; reads of the others usually follow
+            for view_table, blob in self._fetch_grid_values(run_id).items():
+                unpacked = unpack_values(bytes(blob))
+                self._grid_values_cache.put(run_id, view_table, unpacked)
+                if view_table == table:
+                    grid_values = unpacked
+            if grid_values is None:
+                raise ValueError(f"Packed run {run_id} has no values table for {table}")
+        return grid_values
+
+    def _unpack_row(self, run_id: str, table: str, row: Optional[Dict]) -> Optional[Dict]:
+        """
+        Fill timetable_data and free_hours of a row saved with packed grids
+        """
+        if row is None:
+            return None
+        blob = row.pop('grid_blob', None)
+        if blob is not None:
+            row['timetable_data'], row['free_hours'] = unpack_grid(bytes(blob), self._grid_values(run_id, table))
+        return row
+
+    def _unpack_rows(self, run_id: str, table: str, rows: Iterator[Dict]) -> Iterator[Dict]:
+        try:
+            for row in rows:
+                yield self._unpack_row(run_id, table, row)
+        finally:
+            rows.close()
+
+    def stream_rendered(self, run_id: str, table: str) -> Optional[Iterator[str]]:
+        """
+        Streaming counterpart of fetch_rendered. The query runs before this
+        returns, so a missing run fails here rather than mid-stream.
+        """
+        rows = self._iter_rendered(run_id, table)
+        try:
+            first = next(rows)
+        except StopIteration:
+            return iter(())
+        if first is None:
+            rows.close()
+            return None
+        return itertools.chain([first], rows)
+
+    def query_cells(self, run_id: str, filters: Dict, limit: int) -> List[Dict]:
+        raise NotImplementedError
+
+    # Login users
+    def fetch_user(self, username: str) -> Optional[Dict]:
+        """
+        User row with username and bcrypt password hash, or None
+        """
+        raise NotImplementedError
+
+    def create_user(self, username: str, password_hash: str):
+        raise NotImplementedError
+
+    def update_password(self, username: str, password_hash: str):
+        raise NotImplementedError
+
+    # Department (allocation) data
+    def list_departments(self) -> List[str]:
+        raise NotImplementedError
+
+    def delete_department(self, department: str):
+        raise NotImplementedError
+
+    def list_tables(self, department: str) -> List[str]:
+        raise NotImplementedError
+
+    def describe_table(self, department: str, table: str) -> List[Dict]:
+        """
+        Columns as dicts with Field, Type, Null and Key, matching MySQL DESCRIBE
+        """
+        raise NotImplementedError
+
+    def count_rows(self, department: str, table: str) -> int:
+        raise NotImplementedError
+
+    def fetch_rows(self, department: str, table: str, limit: int, offset: int,
+                   order_by: Optional[str] = None, direction: str = 'ASC') -> List[Dict]:
+        raise NotImplementedError
+
+    def fetch_rows_after(self, department: str, table: str, limit: int, order_by: str = 'id',
+                         after=None, direction: str = 'ASC') -> List[Dict]:
+        """
+        Keyset page of a table with an id primary key, ordered by (order_by, id).
+        after is the (value, id) of the previous page's last row; seeking to it
+        through the index makes every page cost the same as the first.
+        """
+        raise NotImplementedError
+
+    def supports_allocation_pipeline(self) -> bool:
+        """
+        Whether the process_*_files upload scripts can write into this backend
+        """
+        return False
+
+    def initialize(self):
+        """
+        Create or migrate the backend's own tables; run once at application startup
+        """
+
+    def ping(self):
+        raise NotImplementedError
+
+    @staticmethod
+    def run_rows(projection, generated_at: str, encoding: Optional[str] = None,
+                 packed_values: Optional[Dict[str, GridValues]] = None) -> Dict[str, List[Dict]]:
+        """
+        Rows to insert for a run, keyed by table name. Each timetable row also
+        carries rendered_json, the exact API representation of that entity.
+        When the encoding (default GRID_ENCODING) is "packed", grid_blob
+        replaces timetable_data and free_hours, and grid_values holds the
+        values table of each view; packed_values, if given, receives them
+        decoded, keyed by table.
+        """
+        encoding = encoding or GRID_ENCODING
+        packers = {table: GridPacker(projection.days, projection.slots) for table in TIMETABLE_TABLES}
+
+        def timetable_row(table, identity, timetable, free_hours):
+            row = {
+                **identity,
+                'timetable_data': None,
+                'free_hours': None,
+                'generated_at': generated_at,
+                'rendered_json': dump_view_json({
+                    **identity,
+                    'timetable': projection.render(timetable),
+                    'free_hours': free_hours,
+                    'generated_at': generated_at
+                })
+            }
+            if encoding == 'packed':
+                row['grid_blob'] = packers[table].pack(timetable, free_hours)
+            else:
+                row['timetable_data'] = json.dumps(timetable)
+                row['free_hours'] = json.dumps(free_hours)
+            return row
+
+        rows = {
+            "class_timetables": [
+                timetable_row('class_timetables', {'year': year, 'section': section}, timetable, free_hours)
+                for year, section, timetable, free_hours in projection.class_entries()
+            ],
+            "teacher_timetables": [
+                timetable_row(
+                    'teacher_timetables',
+                    {'employee_id': projection.employee_ids.get(teacher), 'teacher_name': teacher},
+                    timetable, free_hours
+                )
+                for teacher, timetable, free_hours in projection.teacher_entries()
+            ],
+            "venue_timetables": [
+                timetable_row(
+                    'venue_timetables', {'venue_id': venue_id, 'venue_name': venue_name}, timetable, free_hours
+                )
+                for venue_id, venue_name, timetable, free_hours in projection.venue_entries()
+            ],
+            "cells": list(projection.cells)
+        }
+        if encoding == 'packed':
+            rows["grid_values"] = [
+                {'table_name': table, 'values_blob': packer.values_blob()} for table, packer in packers.items()
+            ]
+            if packed_values is not None:
+                packed_values.update({table: packer.grid_values() for table, packer in packers.items()})
+        return rows
+
+    def _run_statement(self, cursor, query: str, params=(), many: bool = False):
+        """
+        Execute on an open cursor (or SQLite connection) under metrics.observe_query,
+        for statements that share a transaction and so cannot go through _execute
+        """
+        with metrics.observe_query(self.name, query):
+            if many:
+                return cursor.executemany(query, params)
+            return cursor.execute(query, params)
+
+    def _insert_rows(self, cursor, table: str, rows: List[Dict], extra: Dict = None):
+        """
+        Batch insert rows whose keys match the table's column names
+        """
+        if not rows:
+            return
+        extra = extra or {}
+        columns = list(extra) + list(rows[0])
+        placeholders = ", ".join([self.placeholder] * len(columns))
+        self._run_statement(
+            cursor,
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+            [tuple(extra.values()) + tuple(row.values()) for row in rows],
+            many=True
+        )
+
+
+def mysql_connect(database: Optional[str] = None):
+    """
+    Open a MySQL connection from the DB_* environment variables
+    """
+    import mysql.connector
+
+    return mysql.connector.connect(
+        host=os.getenv('DB_HOST'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        database=database or os.getenv('DB_NAME'),
+        port=int(os.getenv('DB_PORT'))
+    )
+
+
+class MySQLStorage(TimetableStorage):
+    """
+    MySQL backend, either one schema per run or the versioned store
+    """
+    name = "mysql"
+
+    def __init__(self, connect=mysql_connect, mode: str = STORAGE_MODE, store_schema: str = STORE_SCHEMA):
+        self.connect = connect
+        self.mode = mode
+        self.store_schema = store_schema
+        self._versioned_store_ready = False
+        self._versioned_store_lock = threading.Lock()
+        self._grid_values_cache = GridValuesCache()
+
+    @property
+    def versioned(self) -> bool:
+        return self.mode == 'versioned'
+
+    def _execute(self, query: str, params=(), fetch: Optional[str] = 'all', dictionary: bool = True):
+        conn = self.connect()
+        cursor = None
+        try:
+            cursor = conn.cursor(dictionary=dictionary)
+            with metrics.observe_query(self.name, query):
+                cursor.execute(query, params)
+                if fetch == 'all':
+                    return cursor.fetchall()
+                if fetch == 'one':
+                    return cursor.fetchone()
+                conn.commit()
+                return None
+        finally:
+            if cursor:
+                cursor.close()
+            conn.close()
+
+    def _stream(self, query: str, params=(), dictionary: bool = True) -> Iterator:
+        conn = self.connect()
+        cursor = None
+        try:
+            cursor = conn.cursor(dictionary=dictionary, buffered=False)
+            # Times the query itself; fetching is paced by the client
+            with metrics.observe_query(self.name, query):
+                cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(STREAM_BATCH_SIZE)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            if cursor:
+                try:
+                    cursor.close()
+                except Exception as e:
+                    # Unread rows when the client went away; the pool discards the connection
+                    logger.warning(f"Closing stream cursor: {e}")
+            conn.close()
+
+    def table(self, run_id: str, name: str) -> str:
+        schema = self.store_schema if self.versioned else validate_run_id(run_id)
+        return f"`{schema}`.{name}"
+
+    def where(self, run_id: str, conditions=(), params=()):
+        """
+        Build a WHERE clause scoped to one run
+        """
+        conditions = list(conditions)
+        params = list(params)
+        if self.versioned:
+            conditions.insert(0, "run_id = %s")
+            params.insert(0, run_id)
+        clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return clause, tuple(params)
+
+    def initialize(self):
+        """
+        Create the versioned store and apply its column and index migrations.
+        Runs at startup; the run queries repeat it (once) if the database
+        was unreachable then.
+        """
+        if not self.versioned or self._versioned_store_ready:
+            return
+        with self._versioned_store_lock:
+            if self._versioned_store_ready:
+                return
+            conn = self.connect()
+            cursor = conn.cursor()
+            try:
+                self._ensure_versioned_store(cursor)
+                conn.commit()
+            finally:
+                cursor.close()
+                conn.close()
+            self._versioned_store_ready = True
+
+    def _ensure_versioned_store(self, cursor):
+        """
+        Create the versioned store tables, columns and indexes that are missing
+        """
+        logger.info(f"Ensuring versioned timetable store in schema: {self.store_schema}")
+        self._run_statement(cursor, f"CREATE SCHEMA IF NOT EXISTS `{self.store_schema}`")
+        for ddl in VERSIONED_STORE_TABLES.values():
+            self._run_statement(cursor, ddl.format(schema=f"`{self.store_schema}`"))
+
+        # Stores created before pre-rendered rows or packed grids existed
+        for table in TIMETABLE_TABLES:
+            for column, column_type in (('rendered_json', 'LONGTEXT'), ('grid_blob', 'LONGBLOB')):
+                self._run_statement(cursor, """
+                    SELECT COUNT(*) FROM information_schema.COLUMNS
+                    WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND COLUMN_NAME = %s
+                """, (self.store_schema, table, column))
+                if cursor.fetchone()[0] == 0:
+                    logger.info(f"Adding {column} to {self.store_schema}.{table}")
+                    self._run_statement(cursor, f"ALTER TABLE `{self.store_schema}`.{table} ADD COLUMN {column} {column_type}")
+
+        for index, (table, columns) in VERSIONED_STORE_INDEXES.items():
+            self._run_statement(cursor, """
+                SELECT COUNT(*) FROM information_schema.STATISTICS
+                WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND INDEX_NAME = %s
+            """, (self.store_schema, table, index))
+            if cursor.fetchone()[0] == 0:
+                logger.info(f"Adding index {index} to {self.store_schema}.{table}")
+                self._run_statement(cursor, f"ALTER TABLE `{self.store_schema}`.{table} ADD INDEX {index} ({columns})")
+
+    def save_run(self, run_id: str, projection, seed=None, input_hash=None, stats=None):
+        validate_run_id(run_id)
+        self.initialize()
+        conn = self.connect()
+        cursor = conn.cursor()
+        try:
+            if self.versioned:
+                # Fixed tables keyed by run_id, no per-run DDL
+                self._run_statement(cursor, f"""
+                INSERT INTO `{self.store_schema}`.timetable_runs
+                (run_id, created_at, seed, input_hash, stats)
+                VALUES (%s, %s, %s, %s, %s)
+                """, (run_id, datetime.now(), seed, input_hash, json.dumps(stats or {})))
+                extra = {'run_id': run_id}
+            else:
+                logger.info(f"Creating schema: {run_id}")
+                self._run_statement(cursor, f"CREATE SCHEMA `{run_id}`")
+                logger.info(f"Creating tables within schema: {run_id}")
+                for ddl in RUN_SCHEMA_TABLES.values():
+                    self._run_statement(cursor, ddl.format(schema=f"`{run_id}`"))
+                extra = {}
+
+            generated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            packed_values = {}
+            for table, rows in self.run_rows(projection, generated_at, packed_values=packed_values).items():
+                logger.info(f"Saving {len(rows)} rows into {table}")
+                self._insert_rows(cursor, self.table(run_id, table), rows, extra)
+
+            conn.commit()
+            for table, grid_values in packed_values.items():
+                self._grid_values_cache.put(run_id, table, grid_values)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+
+    def list_runs(self) -> List[str]:
+        if self.versioned:
+            self.initialize()
+            rows = self._execute(f"SELECT run_id FROM `{self.store_schema}`.timetable_runs ORDER BY created_at")
+            return [row['run_id'] for row in rows]
+
+        rows = self._execute("SHOW DATABASES", dictionary=False)
+        return sorted(row[0] for row in rows if str(row[0]).startswith('timetable_'))
+
+    def latest_run(self) -> Optional[str]:
+        if self.versioned:
+            self.initialize()
+            row = self._execute(f"""
+                SELECT run_id FROM `{self.store_schema}`.timetable_runs
+                ORDER BY created_at DESC
+                LIMIT 1
+            """, fetch='one')
+            return row['run_id'] if row else None
+        return super().latest_run()
+
+    def run_exists(self, run_id: str) -> bool:
+        if self.versioned:
+            self.initialize()
+            row = self._execute(
+                f"SELECT 1 AS found FROM `{self.store_schema}`.timetable_runs WHERE run_id = %s",
+                (run_id,), fetch='one'
+            )
+            return row is not None
+
+        row = self._execute("SHOW DATABASES LIKE %s", (run_id.replace('_', '\\_'),), fetch='one', dictionary=False)
+        return row is not None
+
+    def delete_run(self, run_id: str):
+        conn = self.connect()
+        cursor = conn.cursor()
+        try:
+            if self.versioned:
+                for table in RUN_DATA_TABLES:
+                    self._run_statement(cursor, f"DELETE FROM `{self.store_schema}`.{table} WHERE run_id = %s", (run_id,))
+                self._run_statement(cursor, f"DELETE FROM `{self.store_schema}`.timetable_runs WHERE run_id = %s", (run_id,))
+            else:
+                self._run_statement(cursor, f"DROP DATABASE `{validate_run_id(run_id)}`")
+            conn.commit()
+            self._grid_values_cache.discard_run(run_id)
+        finally:
+            cursor.close()
+            conn.close()
+
+    def fetch_timetables(self, run_id: str, table: str) -> List[Dict]:
+        where_clause, params = self.where(run_id)
+        rows = self._execute(f"""
+            SELECT * FROM {self.table(run_id, table)}
+            {where_clause}
+            ORDER BY {TIMETABLE_TABLES[table]}
+        """, params)
+        return [self._unpack_row(run_id, table, row) for row in rows]
+
+    def _fetch_grid_values(self, run_id: str) -> Dict[str, bytes]:
+        where_clause, params = self.where(run_id)
+        rows = self._execute(f"""
+            SELECT table_name, values_blob FROM {self.table(run_id, 'grid_values')}
+            {where_clause}
+        """, params, fetch='all', dictionary=False)
+        return dict(rows)
+
+    def fetch_rendered(self, run_id: str, table: str) -> Optional[List[str]]:
+        from mysql.connector import Error as MySQLError
+
+        where_clause, params = self.where(run_id)
+        try:
+            rows = self._execute(f"""
+                SELECT rendered_json FROM {self.table(run_id, table)}
+                {where_clause}
+                ORDER BY {TIMETABLE_TABLES[table]}
+            """, params, dictionary=False)
+        except MySQLError as err:
+            # 1054: unknown column, in schemas saved before rendered_json was added
+            if err.errno == 1054:
+                return None
+            raise
+        rendered = [row[0] for row in rows]
+        return None if any(value is None for value in rendered) else rendered
+
+    def iter_timetables(self, run_id: str, table: str) -> Iterator[Dict]:
+        where_clause, params = self.where(run_id)
+        return self._unpack_rows(run_id, table, self._stream(f"""
+            SELECT * FROM {self.table(run_id, table)}
+            {where_clause}
+            ORDER BY {TIMETABLE_TABLES[table]}
+        """, params))
+
+    def _iter_rendered(self, run_id: str, table: str) -> Iterator[Optional[str]]:
+        from mysql.connector import Error as MySQLError
+
+        where_clause, params = self.where(run_id)
+        rows = self._stream(f"""
+            SELECT rendered_json FROM {self.table(run_id, table)}
+            {where_clause}
+            ORDER BY {TIMETABLE_TABLES[table]}
+        """, params, dictionary=False)
+        try:
+            for row in rows:
+                yield row[0]
+        except MySQLError as err:
+            # 1054: unknown column, in schemas saved before rendered_json was added
+            if err.errno != 1054:
+                raise
+            yield None
+        finally:
+            rows.close()
+
+    def fetch_timetable(self, run_id: str, table: str, match: Dict) -> Optional[Dict]:
+        where_clause, params = self.where(run_id, *_lookup_conditions(table, match, self.placeholder))
+        return self._unpack_row(run_id, table, self._execute(f"""
+            SELECT * FROM {self.table(run_id, table)}
+            {where_clause}
+            LIMIT 1
+        """, params, fetch='one'))
+
+    def query_cells(self, run_id: str, filters: Dict, limit: int) -> List[Dict]:
+        from mysql.connector import Error as MySQLError
+
+        where_clause, params = self.where(run_id, *_cell_conditions(filters, self.placeholder))
+        try:
+            return self._execute(f"""
+                SELECT {CELL_COLUMNS}
+                FROM {self.table(run_id, 'cells')}
+                {where_clause}
+                ORDER BY day_index, slot_index, year, section
+                LIMIT %s
+            """, (*params, limit))
+        except MySQLError as err:
+            # 1049: unknown database, 1146: table doesn't exist (schemas saved before cells were added)
+            if err.errno in (1049, 1146):
+                raise RunNotFoundError(run_id) from err
+            raise
+
+    def fetch_user(self, username: str) -> Optional[Dict]:
+        return self._execute("SELECT * FROM login_details.users WHERE username = %s", (username,), fetch='one')
+
+    def create_user(self, username: str, password_hash: str):
+        self._execute(
+            "INSERT INTO login_details.users (username, password) VALUES (%s, %s)",
+            (username, password_hash), fetch=None
+        )
+
+    def update_password(self, username: str, password_hash: str):
+        self._execute(
+            "UPDATE login_details.users SET password = %s WHERE username = %s",
+            (password_hash, username), fetch=None
+        )
+
+    def list_departments(self) -> List[str]:
+        rows = self._execute("SHOW DATABASES", dictionary=False)
+        excluded = SYSTEM_SCHEMAS + [self.store_schema.lower()]
+        return [
+            row[0] for row in rows
+            if row[0].lower() not in excluded
+            and not row[0].lower().startswith('timetable')
+        ]
+
+    def delete_department(self, department: str):
+        self._execute(f"DROP DATABASE `{validate_identifier(department)}`", fetch=None)
+
+    def list_tables(self, department: str) -> List[str]:
+        rows = self._execute(f"SHOW TABLES FROM `{validate_identifier(department)}`", dictionary=False)
+        return [row[0] for row in rows]
+
+    def describe_table(self, department: str, table: str) -> List[Dict]:
+        return self._execute(f"DESCRIBE `{validate_identifier(department)}`.`{validate_identifier(table)}`")
+
+    def count_rows(self, department: str, table: str) -> int:
+        row = self._execute(
+            f"SELECT COUNT(*) AS total FROM `{validate_identifier(department)}`.`{validate_identifier(table)}`",
+            fetch='one'
+        )
+        return row['total']
+
+    def fetch_rows(self, department: str, table: str, limit: int, offset: int,
+                   order_by: Optional[str] = None, direction: str = 'ASC') -> List[Dict]:
+        order_clause = f"ORDER BY `{validate_identifier(order_by)}` {direction}" if order_by else ""
+        return self._execute(f"""
+        SELECT * FROM `{validate_identifier(department)}`.`{validate_identifier(table)}`
+        {order_clause}
+        LIMIT %s OFFSET %s
+        """, (limit, offset))
+
+    def fetch_rows_after(self, department: str, table: str, limit: int, order_by: str = 'id',
+                         after=None, direction: str = 'ASC') -> List[Dict]:
+        where_clause, order_clause, params = _keyset_clause(order_by, after, direction, self.placeholder)
+        return self._execute(f"""
+        SELECT * FROM `{validate_identifier(department)}`.`{validate_identifier(table)}`
+        {where_clause}
+        {order_clause}
+        LIMIT %s
+        """, (*params, limit))
+
+    def supports_allocation_pipeline(self) -> bool:
+        return True
+
+    def ping(self):
+        self._execute("SELECT 1", fetch='one', dictionary=False)
+
+
+class SQLiteStorage(TimetableStorage):
+    """
+    Embedded SQLite backend for benchmarks, CI and single-node deployments
+    """
+    name = "sqlite"
+    placeholder = "?"
+
+    def __init__(self, path: str = SQLITE_PATH, departments_dir: str = SQLITE_DEPARTMENTS_DIR):
+        self.path = path
+        self.departments_dir = departments_dir
+        self._grid_values_cache = GridValuesCache()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.makedirs(departments_dir, exist_ok=True)
+
+        conn = self._connect(self.path)
+        try:
+            # WAL lets readers proceed while a run is being saved
+            self._run_statement(conn, "PRAGMA journal_mode=WAL")
+            for ddl in SQLITE_STORE_TABLES:
+                self._run_statement(conn, ddl)
+            # Databases created before pre-rendered rows or packed grids existed
+            for table in TIMETABLE_TABLES:
+                columns = [row['name'] for row in self._run_statement(conn, f"PRAGMA table_info({table})")]
+                for column, column_type in (('rendered_json', 'TEXT'), ('grid_blob', 'BLOB')):
+                    if column not in columns:
+                        self._run_statement(conn, f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _connect(path: str):
+        conn = sqlite3.connect(path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _stream(self, query: str, params=()) -> Iterator[Dict]:
+        # Streaming responses resume the iterator from different worker threads
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        try:
+            with metrics.observe_query(self.name, query):
+                cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(STREAM_BATCH_SIZE)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(row)
+        finally:
+            conn.close()
+
+    def _department_path(self, department: str) -> str:
+        return os.path.join(self.departments_dir, f"{validate_identifier(department)}.sqlite3")
+
+    def _query(self, path: str, query: str, params=()) -> List[Dict]:
+        conn = self._connect(path)
+        try:
+            with metrics.observe_query(self.name, query):
+                return [dict(row) for row in conn.execute(query, params).fetchall()]
+        finally:
+            conn.close()
+
+    def save_run(self, run_id: str, projection, seed=None, input_hash=None, stats=None):
+        validate_run_id(run_id)
+        conn = self._connect(self.path)
+        try:
+            with conn:
+                self._run_statement(
+                    conn,
+                    "INSERT INTO timetable_runs (run_id, created_at, seed, input_hash, stats) VALUES (?, ?, ?, ?, ?)",
+                    (run_id, datetime.now().isoformat(), seed, input_hash, json.dumps(stats or {}))
+                )
+                generated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                packed_values = {}
+                for table, rows in self.run_rows(projection, generated_at, packed_values=packed_values).items():
+                    logger.info(f"Saving {len(rows)} rows into {table}")
+                    self._insert_rows(conn, table, rows, {'run_id': run_id})
+        finally:
+            conn.close()
+        for table, grid_values in packed_values.items():
+            self._grid_values_cache.put(run_id, table, grid_values)
+
+    def list_runs(self) -> List[str]:
+        rows = self._query(self.path, "SELECT run_id FROM timetable_runs ORDER BY created_at")
+        return [row['run_id'] for row in rows]
+
+    def latest_run(self) -> Optional[str]:
+        rows = self._query(self.path, "SELECT run_id FROM timetable_runs ORDER BY created_at DESC LIMIT 1")
+        return rows[0]['run_id'] if rows else None
+
+    def run_exists(self, run_id: str) -> bool:
+        return bool(self._query(self.path, "SELECT 1 AS found FROM timetable_runs WHERE run_id = ?", (run_id,)))
+
+    def delete_run(self, run_id: str):
+        conn = self._connect(self.path)
+        try:
+            with conn:
+                for table in RUN_DATA_TABLES:
+                    self._run_statement(conn, f"DELETE FROM {table} WHERE run_id = ?", (run_id,))
+                self._run_statement(conn, "DELETE FROM timetable_runs WHERE run_id = ?", (run_id,))
+        finally:
+            conn.close()
+        self._grid_values_cache.discard_run(run_id)
+
+    def fetch_timetables(self, run_id: str, table: str) -> List[Dict]:
+        rows = self._query(
+            self.path,
+            f"SELECT * FROM {table} WHERE run_id = ? ORDER BY {TIMETABLE_TABLES[table]}",
+            (run_id,)
+        )
+        return [self._unpack_row(run_id, table, row) for row in rows]
+
+    def _fetch_grid_values(self, run_id: str) -> Dict[str, bytes]:
+        rows = self._query(self.path, "SELECT table_name, values_blob FROM grid_values WHERE run_id = ?", (run_id,))
+        return {row['table_name']: row['values_blob'] for row in rows}
+
+    def fetch_rendered(self, run_id: str, table: str) -> Optional[List[str]]:
+        query = f"SELECT rendered_json FROM {table} WHERE run_id = ? ORDER BY {TIMETABLE_TABLES[table]}"
+        conn = self._connect(self.path)
+        try:
+            with metrics.observe_query(self.name, query):
+                rendered = [row[0] for row in conn.execute(query, (run_id,))]
+        finally:
+            conn.close()
+        return None if any(value is None for value in rendered) else rendered
+
+    def iter_timetables(self, run_id: str, table: str) -> Iterator[Dict]:
+        return self._unpack_rows(run_id, table, self._stream(
+            f"SELECT * FROM {table} WHERE run_id = ? ORDER BY {TIMETABLE_TABLES[table]}",
+            (run_id,)
+        ))
+
+    def _iter_rendered(self, run_id: str, table: str) -> Iterator[Optional[str]]:
+        rows = self._stream(
+            f"SELECT rendered_json FROM {table} WHERE run_id = ? ORDER BY {TIMETABLE_TABLES[table]}",
+            (run_id,)
+        )
+        try:
+            for row in rows:
+                yield row['rendered_json']
+        finally:
+            rows.close()
+
+    def fetch_timetable(self, run_id: str, table: str, match: Dict) -> Optional[Dict]:
+        conditions, params = _lookup_conditions(table, match, self.placeholder)
+        rows = self._query(
+            self.path,
+            f"SELECT * FROM {table} WHERE run_id = ? AND {' AND '.join(conditions)} LIMIT 1",
+            (run_id, *params)
+        )
+        return self._unpack_row(run_id, table, rows[0]) if rows else None
+
+    def query_cells(self, run_id: str, filters: Dict, limit: int) -> List[Dict]:
+        if not self.run_exists(run_id):
+            raise RunNotFoundError(run_id)
+        conditions, params = _cell_conditions(filters, self.placeholder)
+        conditions.insert(0, "run_id = ?")
+        params.insert(0, run_id)
+        return self._query(self.path, f"""
+            SELECT {CELL_COLUMNS}
+            FROM cells
+            WHERE {' AND '.join(conditions)}
+            ORDER BY day_index, slot_index, year, section
+            LIMIT ?
+        """, (*params, limit))
+
+    def _write(self, query: str, params=()):
+        conn = self._connect(self.path)
+        try:
+            with conn:
+                self._run_statement(conn, query, params)
+        finally:
+            conn.close()
+
+    def fetch_user(self, username: str) -> Optional[Dict]:
+        rows = self._query(self.path, "SELECT * FROM users WHERE username = ?", (username,))
+        return rows[0] if rows else None
+
+    def create_user(self, username: str, password_hash: str):
+        self._write("INSERT INTO users (username, password) VALUES (?, ?)", (username, password_hash))
+
+    def update_password(self, username: str, password_hash: str):
+        self._write("UPDATE users SET password = ? WHERE username = ?", (password_hash, username))
+
+    def list_departments(self) -> List[str]:
+        return sorted(
+            filename[:-len('.sqlite3')] for filename in os.listdir(self.departments_dir)
+            if filename.endswith('.sqlite3')
+        )
+
+    def delete_department(self, department: str):
+        os.unlink(self._department_path(department))
+
+    def list_tables(self, department: str) -> List[str]:
+        rows = self._query(
+            self._department_path(department),
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        )
+        return [row['name'] for row in rows]
+
+    def describe_table(self, department: str, table: str) -> List[Dict]:
+        rows = self._query(self._department_path(department), f"PRAGMA table_info(`{validate_identifier(table)}`)")
+        return [
+            {
+                "Field": row['name'],
+                "Type": row['type'],
+                "Null": 'NO' if row['notnull'] else 'YES',
+                "Key": 'PRI' if row['pk'] else ''
+            }
+            for row in rows
+        ]
+
+    def count_rows(self, department: str, table: str) -> int:
+        rows = self._query(
+            self._department_path(department),
+            f"SELECT COUNT(*) AS total FROM `{validate_identifier(table)}`"
+        )
+        return rows[0]['total']
+
+    def fetch_rows(self, department: str, table: str, limit: int, offset: int,
+                   order_by: Optional[str] = None, direction: str = 'ASC') -> List[Dict]:
+        order_clause = f"ORDER BY `{validate_identifier(order_by)}` {direction}" if order_by else ""
+        return self._query(self._department_path(department), f"""
+        SELECT * FROM `{validate_identifier(table)}`
+        {order_clause}
+        LIMIT ? OFFSET ?
+        """, (limit, offset))
+
+    def fetch_rows_after(self, department: str, table: str, limit: int, order_by: str = 'id',
+                         after=None, direction: str = 'ASC') -> List[Dict]:
+        where_clause, order_clause, params = _keyset_clause(order_by, after, direction, self.placeholder)
+        return self._query(self._department_path(department), f"""
+        SELECT * FROM `{validate_identifier(table)}`
+        {where_clause}
+        {order_clause}
+        LIMIT ?
+        """, (*params, limit))
+
+    def ping(self):
+        self._query(self.path, "SELECT 1 AS ok")
+
+
+_storage: Optional[TimetableStorage] = None
+
+
+def create_storage(backend: str = STORAGE_BACKEND) -> TimetableStorage:
+    if backend == 'sqlite':
+        return SQLiteStorage()
+    if backend == 'mysql':
+        import connection_pool
+
+        return MySQLStorage(connect=connection_pool.get_pool().connect)
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+
+def get_storage() -> TimetableStorage:
+    """
+    Process-wide storage backend selected by STORAGE_BACKEND
+    """
+    global _storage
+    if _storage is None:
+        _storage = create_storage()
+        logger.info(f"Using {_storage.name} storage backend")
+    return _storage
@@ -1,5 +1,6 @@
 import React, { useState, useEffect, Suspense, lazy } from 'react';
 import './App.css';
+import { clearAuthToken } from './utils/authToken';
 
 // Lazy load components
 const LoginPage = lazy(() => import('./LoginPage'));
@@ -62,6 +63,7 @@ function App() {
     setCurrentScreen('login');
     // Optional: Clear any stored session data
     localStorage.removeItem('user');
+    clearAuthToken();
   };
 
   // Add password change handler
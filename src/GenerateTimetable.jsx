@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
+import { authHeaders } from './utils/authToken';
 import './GenerateTimetable.css';
 
 const GenerateTimetable = ({ onBack, isDarkMode, toggleTheme }) => {
@@ -136,7 +137,8 @@ const GenerateTimetable = ({ onBack, isDarkMode, toggleTheme }) => {
     // Update endpoint path to the FastAPI generate endpoint
     const response = await axios.post(`${BACKEND_URL}/api/generate-timetable`, formData, {
       headers: {
-        'Content-Type': 'multipart/form-data'
+        'Content-Type': 'multipart/form-data',
+        ...authHeaders()
       },
       onUploadProgress: (progressEvent) => {
         const percentCompleted = Math.round((progressEvent.loaded * 100) / progressEvent.total);
@@ -1,6 +1,7 @@
 // src/LoginPage.jsx
 import React, { useState } from 'react';
 import './LoginPage.css';
+import { setAuthToken } from './utils/authToken';
 
 const LoginPage = ({ onLoginSuccess }) => {
   const [formData, setFormData] = useState({
@@ -38,6 +39,7 @@ const LoginPage = ({ onLoginSuccess }) => {
         throw new Error(data.message || 'Login failed');
       }
 
+      setAuthToken(data.token, data.expires_at);
       onLoginSuccess();
     } catch (error) {
       setError('Invalid username or password');
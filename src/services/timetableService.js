@@ -2,6 +2,85 @@
 
 import axiosInstance from '../utils/axiosConfig';
 
+const COMPACT_FORMAT = 'timetable-compact/1';
+
+// Ask for the columnar encoding; servers without it answer with plain JSON
+const COMPACT_REQUEST = {
+  headers: { Accept: 'application/vnd.timetable.compact+json, application/json;q=0.9' }
+};
+
+/**
+ * Expand a compact timetable payload into the plain view rows the API returns by default
+ * @param {Object} payload - Compact payload ({ format, days, slots, values, cells, views })
+ * @returns {Object} - Rows per view key, e.g. { classes: [...], teachers: [...] }
+ */
+export const decodeCompactTimetables = (payload) => {
+  const { days, slots, values } = payload;
+  const fixedSlots = new Set(payload.fixed_slots);
+  const decoded = {};
+
+  Object.entries(payload.views).forEach(([key, view]) => {
+    // Cells are shared across views; each view shows only its own fields of them
+    const columns = view.cell_fields.map((field) => [field, payload.cell_fields.indexOf(field)]);
+    const expanded = [];
+    const cellAt = (number) => {
+      if (!expanded[number]) {
+        const refs = payload.cells[number - 1];
+        const cell = {};
+        columns.forEach(([field, column]) => {
+          if (refs[column] >= 0) {
+            cell[field] = values[refs[column]];
+          }
+        });
+        expanded[number] = cell;
+      }
+      return expanded[number];
+    };
+
+    decoded[key] = view.rows.map((refs, entity) => {
+      const row = {};
+      refs.forEach((ref, index) => {
+        row[view.fields[index]] = values[ref];
+      });
+
+      const grid = view.grids[entity];
+      const timetable = {};
+      const freeHours = {};
+      days.forEach((day, dayIndex) => {
+        const daySlots = {};
+        const free = [];
+        slots.forEach((slot, slotIndex) => {
+          const code = grid[dayIndex * slots.length + slotIndex];
+          if (fixedSlots.has(slot)) {
+            daySlots[slot] = slot;
+          } else if (code > 0) {
+            daySlots[slot] = cellAt(code);
+          } else if (code < 0) {
+            daySlots[slot] = values[-code - 1];
+          } else {
+            daySlots[slot] = null;
+          }
+          if (view.free[entity][dayIndex] & (1 << slotIndex)) {
+            free.push(slot);
+          }
+        });
+        timetable[day] = daySlots;
+        if (free.length) {
+          freeHours[day] = free;
+        }
+      });
+
+      row.timetable = timetable;
+      row.free_hours = freeHours;
+      return row;
+    });
+  });
+
+  return decoded;
+};
+
+const isCompact = (payload) => payload?.format === COMPACT_FORMAT;
+
 /**
  * Fetch timetable data - either from a specific schema or using the default endpoints
  * @param {string|null} schemaName - Optional schema name to fetch from
@@ -11,25 +90,28 @@ export const fetchTimetables = async (schemaName = null) => {
   try {
     if (schemaName) {
       // For specific timetable schema
-      const response = await axiosInstance.get(`/timetable/${schemaName}`);
+      const response = await axiosInstance.get(`/timetable/${schemaName}`, COMPACT_REQUEST);
       
       if (response.data && response.data.success) {
-        return response.data.timetable_data;
+        const timetableData = response.data.timetable_data;
+        return isCompact(timetableData) ? decodeCompactTimetables(timetableData) : timetableData;
       } else {
         throw new Error(response.data?.error || 'Failed to fetch timetable data');
       }
     } else {
       // For latest timetable data using separate endpoints
       const [classesResponse, teachersResponse, venuesResponse] = await Promise.all([
-        axiosInstance.get('/timetables/classes'),
-        axiosInstance.get('/timetables/teachers'),
-        axiosInstance.get('/timetables/venues')
+        axiosInstance.get('/timetables/classes', COMPACT_REQUEST),
+        axiosInstance.get('/timetables/teachers', COMPACT_REQUEST),
+        axiosInstance.get('/timetables/venues', COMPACT_REQUEST)
       ]);
       
+      const viewRows = (data, key) => (isCompact(data) ? decodeCompactTimetables(data)[key] : data) || [];
+      
       return {
-        classes: classesResponse.data || [],
-        teachers: teachersResponse.data || [],
-        venues: venuesResponse.data || []
+        classes: viewRows(classesResponse.data, 'classes'),
+        teachers: viewRows(teachersResponse.data, 'teachers'),
+        venues: viewRows(venuesResponse.data, 'venues')
       };
     }
   } catch (error) {
@@ -0,0 +1,41 @@
+// utils/authToken.js
+
+const TOKEN_KEY = 'authToken';
+const EXPIRES_KEY = 'authTokenExpiresAt';
+
+/**
+ * Store the session token issued by /api/login
+ * @param {string} token - Signed session token
+ * @param {number} expiresAt - Expiry as epoch seconds
+ */
+export const setAuthToken = (token, expiresAt) => {
+  sessionStorage.setItem(TOKEN_KEY, token);
+  sessionStorage.setItem(EXPIRES_KEY, String(expiresAt));
+};
+
+/**
+ * Current session token, or null if missing or expired
+ * @returns {string|null}
+ */
+export const getAuthToken = () => {
+  const token = sessionStorage.getItem(TOKEN_KEY);
+  const expiresAt = Number(sessionStorage.getItem(EXPIRES_KEY));
+  if (!token || (expiresAt && expiresAt * 1000 <= Date.now())) {
+    return null;
+  }
+  return token;
+};
+
+export const clearAuthToken = () => {
+  sessionStorage.removeItem(TOKEN_KEY);
+  sessionStorage.removeItem(EXPIRES_KEY);
+};
+
+/**
+ * Authorization header for requests made outside the shared axios instance
+ * @returns {Object}
+ */
+export const authHeaders = () => {
+  const token = getAuthToken();
+  return token ? { Authorization: `Bearer ${token}` } : {};
+};
@@ -1,15 +1,12 @@
 import axios from 'axios';
 import { API_CONFIG } from '../config';
+import { getAuthToken, clearAuthToken } from './authToken';
 
 const axiosInstance = axios.create({
   baseURL: API_CONFIG.BASE_URL || 'https://timetable-backend-tz59.onrender.com/api',
   timeout: 300000, // 5 minutes
   headers: {
     'Content-Type': 'application/json'
-  },
-  auth: {
-    username: API_CONFIG.AUTH.username,
-    password: API_CONFIG.AUTH.password
   }
 });
 
@@ -21,6 +18,12 @@ axiosInstance.interceptors.request.use(
     if (config.data instanceof FormData) {
       delete config.headers['Content-Type'];
     }
+
+    // Send the session token issued at login
+    const token = getAuthToken();
+    if (token) {
+      config.headers['Authorization'] = `Bearer ${token}`;
+    }
     return config;
   },
   error => {
@@ -33,6 +36,11 @@ axiosInstance.interceptors.response.use(
   response => response,
   error => {
     // Check if the error is a timeout error
+    if (error.response?.status === 401) {
+      // Expired or invalid session token; the next login issues a new one
+      clearAuthToken();
+    }
+
     if (error.code === 'ECONNABORTED' && error.message.includes('timeout')) {
       console.error('Request timed out. The operation might still be processing on the server.');
     } else {